@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from django.conf import settings
+
+        if settings.SERVER_TIMING:
+            from .instrumentation import install
+            install()
+        if settings.PROFILING:
+            from .profiling import install
+            install()
@@ -0,0 +1,417 @@
+"""
+Async views for the hot read paths and Google sign-in.
+
+GET  /api/doctors/{id}/available_slots/?date=YYYY-MM-DD
+GET  /api/dashboard/stats/
+POST /api/auth/google/
+GET  /api/doctors/, /api/departments/ (and their detail URLs) through catalog_view()
+
+Under ASGI (django_tutorial/asgi.py, served by gunicorn with uvicorn workers)
+these run on the event loop and use the async ORM, so a slow query waits
+without holding a worker. Under WSGI Django
+runs them through async_to_sync and they behave like any other view.
+
+They are plain Django views rather than DRF ones (DRF has no async views):
+they authenticate like the project's DRF settings (JWT, then the session
+cookie) and answer in the same JSON shapes and status codes as the DRF views
+they replace.
+"""
+import json
+from datetime import date, datetime, timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import AnonymousUser, User
+from django.db.models import Q
+from django.http import HttpResponse
+from django.utils.crypto import get_random_string
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from bookings.models import ACTIVE_STATUSES, BOOKING_WINDOW_DAYS, Booking, DashboardCounter, SlotIndex
+from bookings.slots import aheld_slots, load_slot_index, slot_times
+from core.models import Contact
+from doctors.models import Departments, Doctors
+from .google_auth import GoogleKeysUnavailable, InvalidGoogleToken, verify_id_token
+from .principal import Principal
+from .serializers import UserSerializer, with_role
+from .views import cached_catalog_hit
+
+
+_jwt = JWTAuthentication()
+
+
+def _json(data, status=status.HTTP_200_OK):
+    """JSON response rendered exactly like DRF's JSONRenderer."""
+    return HttpResponse(JSONRenderer().render(data), status=status, content_type='application/json')
+
+
+def _method_not_allowed(request, allowed):
+    response = _json({'detail': f'Method "{request.method}" not allowed.'}, status.HTTP_405_METHOD_NOT_ALLOWED)
+    response['Allow'] = ', '.join(allowed)
+    return response
+
+
+def _unauthorized(detail):
+    response = _json({'detail': detail}, status.HTTP_401_UNAUTHORIZED)
+    response['WWW-Authenticate'] = _jwt.authenticate_header(None)
+    return response
+
+
+def _csrf_exempt(view):
+    """
+    csrf_exempt for async views (Django 4.2's decorator turns them into sync
+    ones). Like DRF's views: token auth needs no CSRF token, and a POST to a
+    read-only endpoint gets a 405 rather than a CSRF failure page.
+    """
+    view.csrf_exempt = True
+    return view
+
+
+async def _authenticate(request):
+    """
+    The active user of the request's Bearer token (or, without one, of its
+    session), AnonymousUser if there is neither, or None if the token is
+    invalid (DRF answers that with a 401 even on public endpoints).
+    """
+    header = _jwt.get_header(request)
+    if header is None:
+        if settings.SESSION_COOKIE_NAME not in request.COOKIES:
+            return AnonymousUser()
+        # Browsable API and Django admin logins
+        user = await sync_to_async(get_user)(request)
+        return user if user.is_active else AnonymousUser()
+    try:
+        raw_token = _jwt.get_raw_token(header)
+        if raw_token is None:
+            return AnonymousUser()
+        user_id = _jwt.get_validated_token(raw_token)[jwt_settings.USER_ID_CLAIM]
+    except (AuthenticationFailed, InvalidToken, KeyError):
+        return None
+    return await User.objects.filter(
+        **{jwt_settings.USER_ID_FIELD: user_id}, is_active=True
+    ).afirst()
+
+
+# ===========================
+# Catalog
+# ===========================
+
+def catalog_view(drf_view):
+    """
+    Wrap a catalog list/detail view so that GETs the shared cache can answer
+    (a stored body or a 304) skip DRF and the worker thread. Misses, writes
+    and the browsable API go to the DRF view as before.
+    """
+    @_csrf_exempt
+    async def view(request, *args, **kwargs):
+        if (
+            request.method == 'GET'
+            and 'format' not in kwargs
+            and 'format' not in request.GET
+            and 'text/html' not in request.headers.get('Accept', '')
+        ):
+            # The file cache is blocking I/O, but no database: any thread will do
+            response = await sync_to_async(cached_catalog_hit, thread_sensitive=False)(request)
+            if response is not None:
+                return response
+        return await sync_to_async(drf_view)(request, *args, **kwargs)
+
+    return view
+
+
+# ===========================
+# Slots
+# ===========================
+
+@_csrf_exempt
+async def available_slots(request, pk):
+    """
+    Get available time slots for a specific date.
+    Query param: ?date=YYYY-MM-DD
+    """
+    if request.method != 'GET':
+        return _method_not_allowed(request, ['GET'])
+    user = await _authenticate(request)
+    if user is None:
+        return _unauthorized('Given token not valid for any token type')
+
+    doctor = await Doctors.objects.only('id', 'doc_name').filter(pk=pk).afirst()
+    if doctor is None:
+        return _json({'detail': 'Not found.'}, status.HTTP_404_NOT_FOUND)
+
+    date_str = request.GET.get('date')
+    if not date_str:
+        return _json(
+            {'error': 'Date parameter  is required (format: YYYY-MM-DD)'},
+            status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        booking_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+    except ValueError:
+        return _json(
+            {'error': 'Invalid date format. Use YYYY-MM-DD'},
+            status.HTTP_400_BAD_REQUEST
+        )
+
+    # Check if date is in the past
+    if booking_date < date.today():
+        return _json({
+            'available': False,
+            'reason': 'Cannot book appointments in the past',
+            'slots': []
+        })
+
+    # Check if date is too far in future
+    if booking_date > date.today() + timedelta(days=BOOKING_WINDOW_DAYS):
+        return _json({
+            'available': False,
+            'reason': 'Cannot book appointments more than 2 months in advance',
+            'slots': []
+        })
+
+    # Leave, working hours and booked slots all come from one slot index row.
+    # Building a missing row reads several tables, so that (rare) path runs
+    # the sync builder in a thread.
+    row = await SlotIndex.objects.filter(doctor_id=doctor.id, date=booking_date).afirst()
+    if row is None:
+        rows = await sync_to_async(load_slot_index)([doctor], booking_date, booking_date)
+        row = rows[(doctor.id, booking_date)]
+
+    # Check if doctor is on leave
+    if row.on_leave:
+        return _json({
+            'available': False,
+            'reason': 'Doctor is on leave',
+            'slots': []
+        })
+
+    # Check if doctor works on that weekday
+    if not row.is_working_day:
+        return _json({
+            'available': False,
+            'reason': f'Doctor is not scheduled on {booking_date.strftime("%A")}',
+            'slots': []
+        })
+
+    # 20-minute slots; bit n of the bitmap is set when slot n is booked.
+    # Slots held by other patients are unavailable for now; the
+    # requester's own hold stays available to them.
+    booked_bits = row.booked_bits
+    holders = await aheld_slots(row)
+    slots = []
+    for number, slot_time in enumerate(slot_times(row.start_time, row.end_time)):
+        if booked_bits >> number & 1:
+            slot_status = 'booked'
+        elif number in holders and holders[number] != user.id:
+            slot_status = 'held'
+        else:
+            slot_status = 'available'
+        slots.append({
+            'time': slot_time.strftime('%H:%M'),
+            'available': slot_status == 'available',
+            'status': slot_status,
+        })
+
+    return _json({
+        'available': True,
+        'date': date_str,
+        'day': booking_date.strftime('%A'),
+        'doctor': doctor.doc_name,
+        'doctor_id': doctor.id,
+        'working_hours': {
+            'start': row.start_time.strftime('%H:%M'),
+            'end': row.end_time.strftime('%H:%M')
+        },
+        'total_slots': len(slots),
+        'available_slots': len([s for s in slots if s['available']]),
+        'held_slots': len([s for s in slots if s['status'] == 'held']),
+        'slots': slots
+    })
+
+
+# ===========================
+# Dashboard Stats
+# ===========================
+
+async def _dashboard_counters(scope, scope_id, today):
+    """
+    Read one scope's materialized counters in a single indexed query: the
+    all-time totals row plus the per-date rows from today on.
+    """
+    rows = DashboardCounter.objects.filter(scope=scope, scope_id=scope_id).filter(
+        Q(date__isnull=True) | Q(date__gte=today)
+    )
+    counters = {'totals': None, 'days': {}}
+    async for row in rows:
+        if row.date is None:
+            counters['totals'] = row
+        else:
+            counters['days'][row.date] = row
+    return counters
+
+
+@_csrf_exempt
+async def dashboard_stats(request):
+    """
+    Get dashboard statistics based on user role.
+    GET /api/dashboard/stats/
+    Booking counts come from the materialized DashboardCounter rows.
+    """
+    if request.method != 'GET':
+        return _method_not_allowed(request, ['GET'])
+    user = await _authenticate(request)
+    if user is None:
+        return _unauthorized('Given token not valid for any token type')
+    if not user.is_authenticated:
+        return _unauthorized('Authentication credentials were not provided.')
+
+    principal = await Principal(user).aload()
+    today = date.today()
+
+    if principal.is_admin:
+        counters = await _dashboard_counters('global', 0, today)
+        totals = counters['totals']
+        today_row = counters['days'].get(today)
+        stats = {
+            'role': 'admin',
+            # is_main_admin is determined entirely by the server using the env variable.
+            # The frontend never knows the actual username — it just gets True/False.
+            'is_main_admin': principal.is_main_admin,
+            'allowed_modules': principal.allowed_modules,
+            'total_doctors': await Doctors.objects.acount(),
+            'total_departments': await Departments.objects.acount(),
+            'total_bookings': totals.total if totals else 0,
+            'pending_bookings': totals.pending if totals else 0,
+            'accepted_bookings': totals.accepted if totals else 0,
+            'total_patients': totals.patients if totals else 0,
+            'unread_contacts': await Contact.objects.filter(is_read=False).acount(),
+            'today_bookings': today_row.active if today_row else 0,
+        }
+    elif principal.is_doctor:
+        # Doctor stats
+        doctor = await Doctors.objects.select_related('dep_name').aget(pk=principal.doctor_id)
+        counters = await _dashboard_counters('doctor', doctor.id, today)
+        totals = counters['totals']
+        today_row = counters['days'].get(today)
+        stats = {
+            'role': 'doctor',
+            'doctor_name': doctor.doc_name,
+            'department': doctor.dep_name.dep_name if doctor.dep_name else 'No Department',
+            'total_appointments': totals.total if totals else 0,
+            'pending_appointments': totals.pending if totals else 0,
+            'accepted_appointments': totals.accepted if totals else 0,
+            'today_appointments': today_row.active if today_row else 0,
+            'upcoming_appointments': sum(
+                row.active for day, row in counters['days'].items() if day > today
+            ),
+        }
+    else:
+        # Patient stats: patients only have an all-time counter row
+        totals = await DashboardCounter.objects.filter(scope='user', scope_id=user.id, date=None).afirst()
+        stats = {
+            'role': 'patient',
+            'total_bookings': totals.total if totals else 0,
+            'pending_bookings': totals.pending if totals else 0,
+            'accepted_bookings': totals.accepted if totals else 0,
+            # Served by the unique_active_booking_per_user_doctor_date partial index
+            'upcoming_bookings': await Booking.objects.filter(
+                user=user, booking_date__gte=today, status__in=ACTIVE_STATUSES
+            ).acount(),
+        }
+
+    return _json(stats)
+
+
+# ===========================
+# Google Auth View
+# ===========================
+
+@_csrf_exempt
+async def google_login(request):
+    """
+    Sign in (or sign up) with a Google ID token.
+    POST /api/auth/google/ {"token": "<Google ID token>"}
+    """
+    if request.method != 'POST':
+        return _method_not_allowed(request, ['POST'])
+    try:
+        if request.content_type == 'application/json':
+            data = json.loads(request.body or b'{}')
+        else:
+            data = request.POST
+        token = data.get('token')
+    except (ValueError, AttributeError):
+        return _json({'detail': 'JSON parse error'}, status.HTTP_400_BAD_REQUEST)
+    if not token:
+        return _json({'error': 'Token is required'}, status.HTTP_400_BAD_REQUEST)
+
+    try:
+        # Verified locally against Google's cached signing keys. Reading
+        # them may touch the file cache (or, on a cold start, Google), so
+        # run it on a thread.
+        try:
+            google_data = await sync_to_async(verify_id_token, thread_sensitive=False)(token)
+        except InvalidGoogleToken:
+            return _json({'error': 'Invalid Google token'}, status.HTTP_400_BAD_REQUEST)
+        except GoogleKeysUnavailable:
+            return _json(
+                {'error': 'Google sign-in is unavailable right now'},
+                status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+
+        email = google_data.get('email')
+
+        if not email:
+            return _json({'error': 'Email not found in Google token'}, status.HTTP_400_BAD_REQUEST)
+        # Accounts are matched by email, so only trust addresses Google verified
+        if not google_data.get('email_verified'):
+            return _json({'error': 'Google account email is not verified'}, status.HTTP_400_BAD_REQUEST)
+
+        # Use filter+first instead of get() to safely handle duplicate emails.
+        # Prefer a regular patient account (not staff/superuser) if duplicates exist.
+        user = await with_role(User.objects.filter(email=email)).order_by('is_superuser', 'is_staff').afirst()
+        if user is None:
+            # Create user
+            username = email.split('@')[0]
+            # Ensure unique username
+            base_username = username
+            counter = 1
+            while await User.objects.filter(username=username).aexists():
+                username = f"{base_username}{counter}"
+                counter += 1
+
+            # Random password for Google OAuth users; hashing it takes a
+            # while, so keep it off the event loop
+            password = await sync_to_async(make_password, thread_sensitive=False)(
+                get_random_string(length=32)
+            )
+            user = await User.objects.acreate(
+                username=username,
+                email=email,
+                first_name=google_data.get('given_name', ''),
+                last_name=google_data.get('family_name', ''),
+                password=password
+            )
+            # UserProfile is created by signal
+            user.is_doctor = False  # a brand-new account can't be linked to a doctor
+
+        # Generate tokens
+        refresh = RefreshToken.for_user(user)
+
+        return _json({
+            'refresh': str(refresh),
+            'access': str(refresh.access_token),
+            'user': UserSerializer(user).data
+        })
+
+    except Exception as e:
+        return _json({'error': str(e)}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
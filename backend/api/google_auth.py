@@ -0,0 +1,199 @@
+"""
+Local verification of Google ID tokens (POST /api/auth/google/).
+
+Tokens are checked here instead of by Google's tokeninfo endpoint: the
+RS256 signature against Google's published signing keys, and the aud
+(settings.GOOGLE_CLIENT_IDS), iss and exp claims. Google rotates its keys
+every few days and says how long each set may be cached, so a login
+normally needs no network call at all.
+
+Where the keys come from is pluggable (settings.GOOGLE_KEY_PROVIDER):
+GoogleKeyProvider fetches and caches Google's keyset, LocalKeyProvider serves
+a keyset from settings.GOOGLE_JWKS for tests and offline development.
+"""
+import logging
+import re
+import threading
+import time
+
+import jwt
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+from jwt import PyJWK
+
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_CERTS_URL = 'https://www.googleapis.com/oauth2/v3/certs'
+GOOGLE_ISSUERS = ('accounts.google.com', 'https://accounts.google.com')
+CLOCK_SKEW_SECONDS = 30
+
+
+class InvalidGoogleToken(Exception):
+    """The token is malformed, badly signed, expired or meant for another app."""
+
+
+class GoogleKeysUnavailable(Exception):
+    """No usable signing keys: Google could not be reached and none are cached."""
+
+
+def _max_age(cache_control):
+    match = re.search(r'max-age=(\d+)', cache_control or '')
+    return int(match.group(1)) if match else None
+
+
+def _parse_keys(jwks):
+    """{kid: PyJWK} of the RSA signing keys in a JWKS document."""
+    return {
+        jwk['kid']: PyJWK(jwk)
+        for jwk in jwks.get('keys', [])
+        if jwk.get('kid') and jwk.get('kty') == 'RSA'
+    }
+
+
+class GoogleKeyProvider:
+    """
+    Google's signing keys, kept in memory and in the shared file cache (so a
+    restarted worker has them at once) for as long as the Cache-Control
+    max-age of Google's response allows.
+
+    Only a cold start (nothing in memory or on disk) makes a login wait for
+    Google. In the last REFRESH_AHEAD seconds of the keys' life a background
+    thread fetches the next set while logins keep using the current one. A
+    token signed with a key id we don't know yet (an early rotation) forces
+    one synchronous fetch, at most every MIN_FETCH_INTERVAL seconds.
+    """
+    url = GOOGLE_CERTS_URL
+    cache_key = 'google:jwks'
+    timeout = 5
+    default_max_age = 3600
+    REFRESH_AHEAD = 300
+    # If Google is unreachable, keep trusting expired keys for this long
+    STALE_GRACE = 86400
+    MIN_FETCH_INTERVAL = 60
+
+    def __init__(self):
+        self._keys = {}
+        self._expires_at = 0
+        self._last_fetch = 0
+        self._fetch_lock = threading.Lock()
+        self._background = threading.Lock()
+
+    def get_key(self, kid):
+        now = time.time()
+        if now > self._expires_at - self.REFRESH_AHEAD:
+            # Another worker may already have stored a newer set
+            self._load_stored()
+        if not self._keys or now > self._expires_at + self.STALE_GRACE:
+            self._refresh()
+        elif now > self._expires_at - self.REFRESH_AHEAD:
+            self._refresh_in_background()
+
+        key = self._keys.get(kid)
+        if key is None and time.time() - self._last_fetch > self.MIN_FETCH_INTERVAL:
+            self._refresh(force=True)
+            key = self._keys.get(kid)
+        if key is None:
+            raise InvalidGoogleToken('Token signed with an unknown key')
+        return key.key
+
+    def _load_stored(self):
+        stored = cache.get(self.cache_key)
+        if stored and stored['expires_at'] > self._expires_at:
+            self._keys = _parse_keys(stored['jwks'])
+            self._expires_at = stored['expires_at']
+
+    def _refresh(self, force=False):
+        with self._fetch_lock:
+            # Someone else may have fetched while we waited for the lock
+            if not force and self._keys and time.time() < self._expires_at - self.REFRESH_AHEAD:
+                return
+            try:
+                response = requests.get(self.url, timeout=self.timeout)
+                response.raise_for_status()
+                jwks = response.json()
+                keys = _parse_keys(jwks)
+            except (requests.RequestException, ValueError, jwt.PyJWKError) as exc:
+                if self._keys and time.time() < self._expires_at + self.STALE_GRACE:
+                    logger.warning('Could not refresh Google signing keys: %s', exc)
+                    return
+                raise GoogleKeysUnavailable(str(exc)) from exc
+            finally:
+                self._last_fetch = time.time()
+
+            max_age = _max_age(response.headers.get('Cache-Control')) or self.default_max_age
+            self._keys = keys
+            self._expires_at = time.time() + max_age
+            cache.set(
+                self.cache_key,
+                {'jwks': jwks, 'expires_at': self._expires_at},
+                timeout=max_age + self.STALE_GRACE,
+            )
+
+    def _refresh_in_background(self):
+        if not self._background.acquire(blocking=False):
+            return  # already refreshing
+
+        def run():
+            try:
+                self._refresh()
+            except GoogleKeysUnavailable as exc:
+                logger.warning('Could not refresh Google signing keys: %s', exc)
+            finally:
+                self._background.release()
+
+        threading.Thread(target=run, daemon=True).start()
+
+
+class LocalKeyProvider:
+    """Keys from settings.GOOGLE_JWKS (a JWKS dict), for tests and offline development."""
+
+    def get_key(self, kid):
+        key = _parse_keys(getattr(settings, 'GOOGLE_JWKS', {})).get(kid)
+        if key is None:
+            raise InvalidGoogleToken('Token signed with an unknown key')
+        return key.key
+
+
+_providers = {}
+
+
+def get_key_provider():
+    """The provider named by settings.GOOGLE_KEY_PROVIDER, one per process."""
+    path = settings.GOOGLE_KEY_PROVIDER
+    if path not in _providers:
+        _providers[path] = import_string(path)()
+    return _providers[path]
+
+
+def verify_id_token(token):
+    """
+    Return the claims of a Google ID token issued to one of our client IDs.
+    Raises InvalidGoogleToken, GoogleKeysUnavailable, or ImproperlyConfigured
+    when GOOGLE_CLIENT_ID is not set.
+    """
+    if not settings.GOOGLE_CLIENT_IDS:
+        raise ImproperlyConfigured('Set GOOGLE_CLIENT_ID to verify Google sign-in tokens.')
+    try:
+        header = jwt.get_unverified_header(token)
+    except jwt.InvalidTokenError as exc:
+        raise InvalidGoogleToken(str(exc)) from exc
+    if header.get('alg') != 'RS256':
+        raise InvalidGoogleToken('Unexpected signing algorithm')
+
+    key = get_key_provider().get_key(header.get('kid'))
+    try:
+        return jwt.decode(
+            token,
+            key,
+            algorithms=['RS256'],
+            audience=settings.GOOGLE_CLIENT_IDS,
+            issuer=GOOGLE_ISSUERS,
+            leeway=CLOCK_SKEW_SECONDS,
+            options={'require': ['exp', 'iat', 'iss', 'aud', 'sub']},
+        )
+    except jwt.InvalidTokenError as exc:
+        raise InvalidGoogleToken(str(exc)) from exc
@@ -0,0 +1,199 @@
+"""
+Per-request query and latency metrics, exposed as a Server-Timing header.
+
+Opt-in with SERVER_TIMING=True (settings.SERVER_TIMING). When it is off
+nothing here is installed: no middleware, no query wrapper, no DRF hooks.
+When it is on, install() (run from ApiConfig.ready) adds:
+
+- a wrapper on every database connection that times each query and records
+  its SQL "shape" (the statement with IN lists collapsed), and
+- timing around DRF's APIView.dispatch (which view ran) and Serializer.data
+  (time spent serializing),
+
+all of which report into the RequestMetrics of the current request, set up
+by api.middleware.ServerTimingMiddleware. The metrics live in a ContextVar,
+so queries run by async views on another thread are counted too.
+
+Requests that repeat one SQL shape SERVER_TIMING_REPEAT_THRESHOLD times
+(usually an N+1) or take longer than SERVER_TIMING_SLOW_MS are logged as one
+JSON line to the "api.timing" logger, with their most repeated queries.
+"""
+import json
+import logging
+import re
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from rest_framework.serializers import BaseSerializer
+from rest_framework.views import APIView
+
+
+logger = logging.getLogger('api.timing')
+
+current_metrics = ContextVar('current_metrics', default=None)
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+_WORST_SHAPES = 3
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.view_seconds = None
+        self.view_name = None
+        self.shapes = Counter()
+        self.shape_seconds = defaultdict(float)
+        # Nested serializers (a .data inside another one) are counted once
+        self._serializing = 0
+
+    def repeated_shapes(self, threshold):
+        """[(shape, count, seconds)] run at least `threshold` times, most repeated first."""
+        return [
+            (shape, count, self.shape_seconds[shape])
+            for shape, count in self.shapes.most_common()
+            if count >= threshold
+        ]
+
+    def server_timing(self, total_seconds):
+        metrics = [
+            f'db;dur={self.db_seconds * 1000:.1f};desc="{self.queries} queries"',
+            f'serialize;dur={self.serialize_seconds * 1000:.1f}',
+        ]
+        if self.view_seconds is not None:
+            metrics.append(f'view;dur={self.view_seconds * 1000:.1f}')
+        metrics.append(f'total;dur={total_seconds * 1000:.1f}')
+        return ', '.join(metrics)
+
+
+def sql_shape(sql):
+    """The statement with its IN (%s, %s, ...) lists collapsed, so batches of any size match."""
+    return _IN_LIST.sub('IN (...)', sql)
+
+
+@contextmanager
+def capture_sql(using='default'):
+    """Collect the SQL (with placeholders) of every query this thread runs on one database."""
+    statements = []
+
+    def record(execute, sql, params, many, context):
+        statements.append(sql)
+        return execute(sql, params, many, context)
+
+    with connections[using].execute_wrapper(record):
+        yield statements
+
+
+def _record_query(execute, sql, params, many, context):
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        shape = sql_shape(sql)
+        metrics.queries += 1
+        metrics.db_seconds += elapsed
+        metrics.shapes[shape] += 1
+        metrics.shape_seconds[shape] += elapsed
+
+
+def _add_query_wrapper(sender, connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def _timed_dispatch(dispatch):
+    def wrapper(self, request, *args, **kwargs):
+        metrics = current_metrics.get()
+        if metrics is None:
+            return dispatch(self, request, *args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return dispatch(self, request, *args, **kwargs)
+        finally:
+            metrics.view_seconds = time.perf_counter() - started
+            action = getattr(self, 'action', None) or request.method.lower()
+            metrics.view_name = f'{type(self).__name__}.{action}'
+    return wrapper
+
+
+def _timed_data(data):
+    def getter(self):
+        metrics = current_metrics.get()
+        if metrics is None or metrics._serializing:
+            return data.fget(self)
+        metrics._serializing += 1
+        started = time.perf_counter()
+        try:
+            return data.fget(self)
+        finally:
+            metrics.serialize_seconds += time.perf_counter() - started
+            metrics._serializing -= 1
+    return property(getter)
+
+
+# DRF's own APIView.dispatch and BaseSerializer.data while installed
+_originals = None
+
+
+def install():
+    """
+    Hook the query wrapper and the DRF timers in (once per process).
+    Returns False if they already were.
+    """
+    global _originals
+    if _originals is not None:
+        return False
+    _originals = (APIView.dispatch, BaseSerializer.data)
+    connection_created.connect(_add_query_wrapper, dispatch_uid='api_timing_query_wrapper')
+    for connection in connections.all(initialized_only=True):
+        _add_query_wrapper(None, connection)
+    APIView.dispatch = _timed_dispatch(APIView.dispatch)
+    # Serializer and ListSerializer both get .data from here
+    BaseSerializer.data = _timed_data(BaseSerializer.data)
+    return True
+
+
+def uninstall():
+    """Take the hooks out again."""
+    global _originals
+    if _originals is None:
+        return
+    APIView.dispatch, BaseSerializer.data = _originals
+    _originals = None
+    connection_created.disconnect(dispatch_uid='api_timing_query_wrapper')
+    for connection in connections.all(initialized_only=True):
+        if _record_query in connection.execute_wrappers:
+            connection.execute_wrappers.remove(_record_query)
+
+
+def report(request, response, metrics, total_seconds):
+    """Log the request if it looks like an N+1 or was slow."""
+    repeated = metrics.repeated_shapes(settings.SERVER_TIMING_REPEAT_THRESHOLD)
+    if not repeated and total_seconds * 1000 < settings.SERVER_TIMING_SLOW_MS:
+        return
+    logger.warning(json.dumps({
+        'event': 'n_plus_one' if repeated else 'slow_request',
+        'method': request.method,
+        'path': request.path,
+        'status': response.status_code,
+        'view': metrics.view_name,
+        'queries': metrics.queries,
+        'db_ms': round(metrics.db_seconds * 1000, 1),
+        'serialize_ms': round(metrics.serialize_seconds * 1000, 1),
+        'total_ms': round(total_seconds * 1000, 1),
+        'repeated_queries': [
+            {'sql': shape[:500], 'count': count, 'ms': round(seconds * 1000, 1)}
+            for shape, count, seconds in repeated[:_WORST_SHAPES]
+        ],
+    }))
@@ -0,0 +1,428 @@
+import json
+import logging
+import platform
+import random
+import statistics
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Count, Q
+from django.test import Client, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.instrumentation import capture_sql
+from bookings.models import ACTIVE_STATUSES, BOOKING_WINDOW_DAYS, Booking, BookingEvent
+from bookings.slots import held_slots, load_slot_index, slot_times
+from doctors.models import Departments, Doctors
+
+
+SCENARIOS = ['catalog', 'slots', 'booking', 'dashboard', 'admin']
+# Booking attempts that lose the race for a hot slot get a 400; that is the expected outcome
+EXPECTED_STATUSES = {'booking': {201, 400}}
+# Baseline values compared on each run: (key, higher is worse, smallest change that counts)
+COMPARED = [('p95_ms', True, None), ('throughput', False, 0), ('queries_per_request', True, 0.5)]
+
+
+class Step:
+    """One request of a scenario; `pages` > 1 follows the response's `next` link that many times."""
+
+    def __init__(self, path, token=None, method='get', body=None, pages=1):
+        self.path = path
+        self.token = token
+        self.method = method
+        self.body = body
+        self.pages = pages
+
+
+def _percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Replay realistic request scenarios through the real URLconf with the '
+        'Django test client: catalog browsing, slot lookups, booking creation '
+        'racing for hot slots, doctor dashboard polling and admin list paging. '
+        'Reports p50/p95/p99 latency, throughput and queries per request for '
+        'each, and compares them with a JSON baseline for the database in use '
+        '(SQLite or PostgreSQL), failing when a scenario regressed past '
+        '--threshold. Runs offline against the configured database, which '
+        'should hold realistic data (see seed_load); bookings it creates are '
+        'deleted again.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scenarios', default=','.join(SCENARIOS),
+            help=f'Comma-separated scenarios to run (default: {",".join(SCENARIOS)}).',
+        )
+        parser.add_argument(
+            '--requests', type=int, default=300,
+            help='Requests per read scenario (default: 300).',
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=4,
+            help='Client threads per scenario (default: 4).',
+        )
+        parser.add_argument(
+            '--hot-slots', type=int, default=10,
+            help='Slots the booking scenario races for (default: 10).',
+        )
+        parser.add_argument(
+            '--contenders', type=int, default=8,
+            help='Patients trying to book each hot slot (default: 8).',
+        )
+        parser.add_argument(
+            '--pages', type=int, default=5,
+            help='Pages an admin walks through per cursor listing (default: 5).',
+        )
+        parser.add_argument('--seed', type=int, default=1, help='Random seed for the request mix (default: 1).')
+        parser.add_argument(
+            '--baseline', default=None,
+            help='Baseline JSON file (default: benchmarks/<database vendor>.json).',
+        )
+        parser.add_argument(
+            '--save', action='store_true',
+            help='Write this run as the new baseline instead of comparing with it.',
+        )
+        parser.add_argument(
+            '--threshold', type=float, default=0.25,
+            help='Allowed relative regression of p95, throughput and queries per request (default: 0.25).',
+        )
+        parser.add_argument(
+            '--noise-ms', type=float, default=2,
+            help='p95 changes smaller than this are never regressions (default: 2).',
+        )
+
+    def handle(self, *args, **options):
+        scenarios = [name.strip() for name in options['scenarios'].split(',') if name.strip()]
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f'Unknown scenario(s): {", ".join(sorted(unknown))}')
+        if not Doctors.objects.exists():
+            raise CommandError('There are no doctors to benchmark; load some data with seed_load first.')
+
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        baseline_path = Path(options['baseline'] or settings.BASE_DIR / 'benchmarks' / f'{connection.vendor}.json')
+
+        results = {}
+        with override_settings(ALLOWED_HOSTS=['*']):
+            for name in scenarios:
+                steps = getattr(self, f'_{name}_steps')()
+                if not steps:
+                    self.stdout.write(self.style.WARNING(f'{name}: skipped, no suitable data'))
+                    continue
+                self.stdout.write(f'{name}: {len(steps)} steps, {options["concurrency"]} clients')
+                if name == 'booking':
+                    results[name] = self._run_booking(steps)
+                else:
+                    # Warm up caches (catalog responses, slot index rows) for every path before timing
+                    self._run(list({step.path: step for step in steps}.values()), 1)
+                    results[name] = self._summarize(name, *self._run(steps, options['concurrency']))
+
+        self._print(results)
+        run = {
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'options': {
+                key: options[key]
+                for key in ('requests', 'concurrency', 'hot_slots', 'contenders', 'pages', 'seed')
+            },
+            'scenarios': results,
+        }
+        if options['save']:
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline_path.write_text(json.dumps(run, indent=2) + '\n')
+            self.stdout.write(self.style.SUCCESS(f'Saved baseline to {baseline_path}'))
+            return
+        if not baseline_path.exists():
+            self.stdout.write(f'No baseline at {baseline_path}; run with --save to record one.')
+            self._fail_on_errors(results)
+            return
+        self._compare(results, json.loads(baseline_path.read_text()), baseline_path)
+
+    # Scenarios: each builds its list of steps from the data in the database
+
+    def _doctor_ids(self, limit=50):
+        ids = list(Doctors.objects.order_by('id').values_list('id', flat=True))
+        return self.rng.sample(ids, min(limit, len(ids)))
+
+    def _window_day(self, low=0):
+        return date.today() + timedelta(days=self.rng.randint(low, BOOKING_WINDOW_DAYS - 1))
+
+    def _catalog_steps(self):
+        doctors = self._doctor_ids()
+        departments = list(Departments.objects.order_by('id').values_list('id', flat=True)[:50])
+        paths = [
+            lambda: '/api/departments/',
+            lambda: f'/api/departments/{self.rng.choice(departments)}/',
+            lambda: '/api/doctors/',
+            lambda: f'/api/doctors/{self.rng.choice(doctors)}/',
+            lambda: f'/api/doctors/{self.rng.choice(doctors)}/availability/',
+            lambda: '/api/department-blogs/',
+        ]
+        return [Step(self.rng.choice(paths)()) for _ in range(self.options['requests'])]
+
+    def _slots_steps(self):
+        doctors = self._doctor_ids()
+        paths = [
+            lambda: f'/api/doctors/{self.rng.choice(doctors)}/available_slots/?date={self._window_day()}',
+            lambda: f'/api/doctors/{self.rng.choice(doctors)}/available_slots/?date={self._window_day()}',
+            lambda: f'/api/doctors/{self.rng.choice(doctors)}/available_slots_range/',
+            lambda: '/api/doctors/next_available/',
+        ]
+        return [Step(self.rng.choice(paths)()) for _ in range(self.options['requests'])]
+
+    def _dashboard_steps(self):
+        doctors = list(Doctors.objects.filter(user__isnull=False).select_related('user').order_by('id')[:50])
+        if not doctors:
+            return []
+        tokens = [str(AccessToken.for_user(doctor.user)) for doctor in doctors]
+        steps = []
+        for _ in range(self.options['requests']):
+            token = self.rng.choice(tokens)
+            path = self.rng.choice(['/api/dashboard/stats/', '/api/dashboard/stats/', '/api/bookings/'])
+            steps.append(Step(path, token))
+        return steps
+
+    def _admin_steps(self):
+        admin = User.objects.filter(is_superuser=True, is_active=True).order_by('id').first()
+        if admin is None:
+            return []
+        token = str(AccessToken.for_user(admin))
+        pages = self.options['pages']
+        paths = [
+            lambda: Step('/api/bookings/?cursor=', token, pages=pages),
+            lambda: Step(f'/api/bookings/?page={self.rng.randint(1, 20)}', token),
+            lambda: Step('/api/bookings/?status=pending&cursor=', token, pages=pages),
+            lambda: Step('/api/users/?cursor=', token, pages=pages),
+            lambda: Step('/api/doctor-leaves/', token),
+            lambda: Step('/api/contacts/', token),
+        ]
+        steps, planned = [], 0
+        while planned < self.options['requests']:
+            step = self.rng.choice(paths)()
+            steps.append(step)
+            planned += step.pages
+        return steps
+
+    def _booking_steps(self):
+        """Every contender POSTs for its hot slot; the steps are shuffled so the races interleave."""
+        self.hot_slots = self._free_slots(self.options['hot_slots'])
+        patients = list(
+            User.objects.filter(is_active=True, is_staff=False, is_superuser=False)
+            .order_by('id').values_list('id', flat=True)[:5000]
+        )
+        if not self.hot_slots or not patients:
+            return []
+        users = {user.id: user for user in User.objects.filter(id__in=patients)}
+        steps = []
+        for doctor_id, day, slot in self.hot_slots:
+            # Patients with an active booking with this doctor that day would fail for another reason
+            busy = set(Booking.objects.filter(
+                doc_name_id=doctor_id, booking_date=day, status__in=ACTIVE_STATUSES
+            ).values_list('user_id', flat=True))
+            free = [user_id for user_id in patients if user_id not in busy]
+            for user_id in self.rng.sample(free, min(self.options['contenders'], len(free))):
+                steps.append(Step(
+                    '/api/bookings/', str(AccessToken.for_user(users[user_id])), method='post',
+                    body={
+                        'doctor_id': doctor_id,
+                        'booking_date': day.isoformat(),
+                        'appointment_time': slot.strftime('%H:%M'),
+                    },
+                ))
+        self.rng.shuffle(steps)
+        return steps
+
+    def _free_slots(self, count):
+        """(doctor id, date, time) of slots nobody has booked or held, in the second half of the window."""
+        doctors = list(Doctors.objects.filter(id__in=self._doctor_ids(20)).order_by('id'))
+        start = date.today() + timedelta(days=BOOKING_WINDOW_DAYS // 2)
+        rows = load_slot_index(doctors, start, date.today() + timedelta(days=BOOKING_WINDOW_DAYS - 1))
+        free = []
+        for (doctor_id, day), row in sorted(rows.items()):
+            if not row.is_working_day:
+                continue
+            held = held_slots(row)
+            for number, slot in enumerate(slot_times(row.start_time, row.end_time)):
+                if not row.is_booked(slot) and number not in held:
+                    free.append((doctor_id, day, slot))
+        return self.rng.sample(free, min(count, len(free)))
+
+    # Running
+
+    def _run(self, steps, concurrency):
+        """Replay the steps from `concurrency` threads; returns ([(seconds, status, queries, response)], wall seconds)."""
+        samples = []
+        lock = threading.Lock()
+        queue = list(reversed(steps))
+
+        def client():
+            mine = []
+            # Errors come back as 500s and count against the scenario
+            http = Client(raise_request_exception=False)
+            try:
+                with capture_sql() as statements:
+                    while True:
+                        with lock:
+                            if not queue:
+                                break
+                            step = queue.pop()
+                        path = step.path
+                        for _ in range(step.pages):
+                            headers = {'HTTP_AUTHORIZATION': f'Bearer {step.token}'} if step.token else {}
+                            before = len(statements)
+                            sent = time.perf_counter()
+                            if step.method == 'post':
+                                response = http.post(path, step.body, content_type='application/json', **headers)
+                            else:
+                                response = http.get(path, **headers)
+                            elapsed = time.perf_counter() - sent
+                            mine.append((elapsed, response.status_code, len(statements) - before, response))
+                            path = self._next_page(response)
+                            if path is None:
+                                break
+            finally:
+                connections.close_all()
+                with lock:
+                    samples.extend(mine)
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=client) for _ in range(max(1, concurrency))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return samples, time.perf_counter() - started
+
+    @staticmethod
+    def _next_page(response):
+        if response.status_code != 200:
+            return None
+        try:
+            url = json.loads(response.content).get('next')
+        except (ValueError, AttributeError):
+            return None
+        return url.split('testserver', 1)[-1] if url else None
+
+    def _run_booking(self, steps):
+        concurrency = self.options['concurrency']
+        if connection.vendor == 'sqlite':
+            # SQLite has one writer at a time; concurrent bookings only fail with "database is locked"
+            self.stdout.write('  (one client on SQLite: the races are decided by the slot check)')
+            concurrency = 1
+        # Losing a race is expected; don't log every 400
+        request_logger = logging.getLogger('django.request')
+        level = request_logger.level
+        request_logger.setLevel(logging.ERROR)
+        try:
+            samples, elapsed = self._run(steps, concurrency)
+        finally:
+            request_logger.setLevel(level)
+        created = [
+            json.loads(response.content)['id'] for _, status, _, response in samples if status == 201
+        ]
+        try:
+            double_booked = (
+                Booking.objects.filter(status__in=ACTIVE_STATUSES)
+                .filter(self._hot_slot_filter())
+                .values('doc_name_id', 'booking_date', 'appointment_time')
+                .order_by().annotate(n=Count('id')).filter(n__gt=1).count()
+            )
+        finally:
+            # Leave the data as it was; deleting through the ORM keeps the derived data in step
+            Booking.objects.filter(id__in=created).delete()
+            BookingEvent.objects.filter(booking_id__in=created).delete()
+        summary = self._summarize('booking', samples, elapsed)
+        summary['hot_slots'] = len(self.hot_slots)
+        summary['booked'] = len(created)
+        summary['double_booked'] = double_booked
+        if double_booked or len(created) > len(self.hot_slots):
+            summary['errors'] += max(double_booked, len(created) - len(self.hot_slots))
+        return summary
+
+    def _hot_slot_filter(self):
+        condition = Q(pk__in=[])
+        for doctor_id, day, slot in self.hot_slots:
+            condition |= Q(doc_name_id=doctor_id, booking_date=day, appointment_time=slot)
+        return condition
+
+    def _summarize(self, name, samples, elapsed):
+        expected = EXPECTED_STATUSES.get(name, {200})
+        latencies = sorted(seconds for seconds, *_ in samples)
+        queries = [count for _, _, count, _ in samples]
+        statuses = Counter(status for _, status, _, _ in samples)
+        return {
+            'requests': len(samples),
+            'throughput': round(len(samples) / elapsed, 1) if elapsed else 0,
+            'p50_ms': round(statistics.median(latencies) * 1000, 2) if latencies else 0,
+            'p95_ms': round(_percentile(latencies, 0.95) * 1000, 2) if latencies else 0,
+            'p99_ms': round(_percentile(latencies, 0.99) * 1000, 2) if latencies else 0,
+            'queries_per_request': round(statistics.mean(queries), 2) if queries else 0,
+            'errors': sum(count for status, count in statuses.items() if status not in expected),
+            'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        }
+
+    # Reporting
+
+    def _print(self, results):
+        self.stdout.write(
+            f'{"scenario":<10} {"requests":>8} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8} '
+            f'{"p99 ms":>8} {"queries":>8} {"errors":>7}'
+        )
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<10} {result["requests"]:>8} {result["throughput"]:>8.1f} {result["p50_ms"]:>8.1f} '
+                f'{result["p95_ms"]:>8.1f} {result["p99_ms"]:>8.1f} {result["queries_per_request"]:>8.2f} '
+                f'{result["errors"]:>7}'
+            )
+        if 'booking' in results:
+            booking = results['booking']
+            self.stdout.write(
+                f'booking: {booking["booked"]} of {booking["hot_slots"]} hot slots booked, '
+                f'{booking["statuses"].get("400", 0)} attempts lost the race, '
+                f'{booking["double_booked"]} double bookings'
+            )
+
+    def _fail_on_errors(self, results):
+        failing = [name for name, result in results.items() if result['errors']]
+        if failing:
+            raise CommandError(f'Unexpected responses in: {", ".join(failing)}')
+
+    def _compare(self, results, baseline, path):
+        threshold = self.options['threshold']
+        regressions = []
+        for name, result in results.items():
+            before = baseline['scenarios'].get(name)
+            if before is None:
+                continue
+            for key, higher_is_worse, noise in COMPARED:
+                old, new = before[key], result[key]
+                if noise is None:
+                    noise = self.options['noise_ms']
+                if higher_is_worse:
+                    worse = new > old * (1 + threshold) and new - old > noise
+                else:
+                    worse = new < old * (1 - threshold) and old - new > noise
+                if worse:
+                    regressions.append(f'{name} {key}: {old} -> {new}')
+
+        self.stdout.write(f'Compared with {path} ({baseline["database"]}, {baseline["created"]}):')
+        for line in regressions:
+            self.stdout.write(self.style.ERROR(f'  {line}'))
+        self._fail_on_errors(results)
+        if regressions:
+            raise CommandError(f'{len(regressions)} regression(s) past the {threshold:.0%} threshold')
+        self.stdout.write(self.style.SUCCESS('  No regressions.'))
@@ -0,0 +1,174 @@
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from doctors.models import Doctors
+
+
+SERVERS = {
+    'wsgi': ['django_tutorial.wsgi:application'],
+    'asgi': ['django_tutorial.asgi:application', '-k', 'uvicorn_worker.UvicornWorker'],
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare concurrent-request throughput of the WSGI (sync gunicorn) and '
+        'ASGI (gunicorn + uvicorn workers) setups. Starts each server on a local '
+        'port against the configured database, replays a mix of catalog lists, '
+        'slot lookups and dashboard stats from many client threads, and prints '
+        'requests per second and latency percentiles.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--servers', default='wsgi,asgi',
+            help='Comma-separated setups to run (default: wsgi,asgi).',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='gunicorn worker processes for each setup (default: 1).',
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=50,
+            help='Client threads sending requests at once (default: 50).',
+        )
+        parser.add_argument(
+            '--duration', type=float, default=15,
+            help='Seconds of load per setup, after a warm-up pass (default: 15).',
+        )
+        parser.add_argument(
+            '--port', type=int, default=8750,
+            help='Local port the servers listen on (default: 8750).',
+        )
+        parser.add_argument(
+            '--user', default=None,
+            help='Username whose dashboard stats are polled (default: the first superuser).',
+        )
+
+    def handle(self, *args, **options):
+        servers = [name.strip() for name in options['servers'].split(',') if name.strip()]
+        unknown = set(servers) - set(SERVERS)
+        if unknown:
+            raise CommandError(f'Unknown setup(s): {", ".join(sorted(unknown))}')
+
+        base = f'http://127.0.0.1:{options["port"]}'
+        requests = self._request_mix(base, options['user'])
+        self.stdout.write(f'{len(requests)} URLs in the mix, {options["concurrency"]} clients, '
+                          f'{options["workers"]} worker(s), {options["duration"]:g}s per setup')
+
+        results = []
+        for name in servers:
+            server = self._start(name, options['workers'], options['port'])
+            try:
+                self._wait_until_up(base, server)
+                # One pass to build slot index rows and fill the catalog cache
+                for url, headers in requests:
+                    self._fetch(url, headers)
+                results.append((name, self._load(requests, options['concurrency'], options['duration'])))
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+
+        self.stdout.write(f'{"setup":<6} {"requests":>9} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8} {"max ms":>8} {"errors":>7}')
+        for name, (latencies, errors, elapsed) in results:
+            if not latencies:
+                self.stdout.write(f'{name:<6} no successful requests ({errors} errors)')
+                continue
+            latencies.sort()
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            self.stdout.write(
+                f'{name:<6} {len(latencies):>9} {len(latencies) / elapsed:>8.1f} '
+                f'{statistics.median(latencies) * 1000:>8.1f} {p95 * 1000:>8.1f} '
+                f'{latencies[-1] * 1000:>8.1f} {errors:>7}'
+            )
+
+    def _request_mix(self, base, username):
+        """(url, headers) pairs replayed round-robin by every client."""
+        requests = [
+            (f'{base}/api/doctors/', {}),
+            (f'{base}/api/departments/', {}),
+        ]
+        # The next weekday for each of a few doctors
+        day = date.today() + timedelta(days=1)
+        while day.weekday() >= 5:
+            day += timedelta(days=1)
+        for doctor_id in Doctors.objects.order_by('id').values_list('id', flat=True)[:5]:
+            requests.append((f'{base}/api/doctors/{doctor_id}/available_slots/?date={day}', {}))
+
+        users = User.objects.filter(is_active=True)
+        user = users.filter(username=username).first() if username else users.filter(is_superuser=True).first()
+        if username and user is None:
+            raise CommandError(f'No active user "{username}"')
+        if user is not None:
+            token = AccessToken.for_user(user)
+            requests.append((f'{base}/api/dashboard/stats/', {'Authorization': f'Bearer {token}'}))
+        return requests
+
+    def _start(self, name, workers, port):
+        command = [
+            sys.executable, '-m', 'gunicorn', *SERVERS[name],
+            '--bind', f'127.0.0.1:{port}', '--workers', str(workers), '--log-level', 'warning',
+        ]
+        self.stdout.write(f'Starting {name}: {" ".join(command[2:])}')
+        return subprocess.Popen(command, env=os.environ.copy())
+
+    def _wait_until_up(self, base, server, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError('The server exited before it started listening')
+            try:
+                urllib.request.urlopen(f'{base}/api/', timeout=2).close()
+                return
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.2)
+        raise CommandError(f'The server did not answer within {timeout}s')
+
+    @staticmethod
+    def _fetch(url, headers):
+        request = urllib.request.Request(url, headers={'Accept': 'application/json', **headers})
+        with urllib.request.urlopen(request, timeout=30) as response:
+            response.read()
+
+    def _load(self, requests, concurrency, duration):
+        """Run the clients; returns (latencies in seconds, error count, elapsed seconds)."""
+        latencies = []
+        errors = [0]
+        lock = threading.Lock()
+        started = time.monotonic()
+        deadline = started + duration
+
+        def client(offset):
+            mine, failed = [], 0
+            index = offset
+            while time.monotonic() < deadline:
+                url, headers = requests[index % len(requests)]
+                index += 1
+                sent = time.monotonic()
+                try:
+                    self._fetch(url, headers)
+                except (urllib.error.URLError, ConnectionError, TimeoutError):
+                    failed += 1
+                    continue
+                mine.append(time.monotonic() - sent)
+            with lock:
+                latencies.extend(mine)
+                errors[0] += failed
+
+        threads = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return latencies, errors[0], time.monotonic() - started
@@ -0,0 +1,16 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        'Guard against N+1 regressions: run the query-count tests '
+        '(api.tests.test_query_counts) on a throwaway test database. Every '
+        'list/detail endpoint is called as anonymous, admin, doctor and patient '
+        'with N and then 10xN rows, and fails if it runs more queries with more '
+        'data. Same as "manage.py test api.tests.test_query_counts".'
+    )
+
+    def handle(self, *args, **options):
+        # Exits with status 1 if a test fails
+        call_command('test', 'api.tests.test_query_counts', verbosity=options['verbosity'])
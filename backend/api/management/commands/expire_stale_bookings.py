@@ -0,0 +1,86 @@
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+
+from bookings.models import Booking
+from bookings.transitions import bulk_transition
+
+
+# What a booking still active after its date becomes
+STALE_TRANSITIONS = [
+    ('accepted', 'completed'),
+    ('pending', 'expired'),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Move bookings whose date has passed out of the active states: accepted '
+        'ones to completed, pending ones to expired. Works in small batches, '
+        'each in its own transaction, so it is safe to run every few minutes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Bookings updated per transaction (default: 1000).',
+        )
+        parser.add_argument(
+            '--grace-days', type=int, default=0,
+            help='Only touch bookings at least this many days before today (default: 0).',
+        )
+        parser.add_argument(
+            '--max-batches', type=int, default=None,
+            help='Stop after this many batches; the next run picks up the rest.',
+        )
+        parser.add_argument(
+            '--sleep', type=float, default=0,
+            help='Seconds to pause between batches to spread the write load.',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only count the bookings that would change.',
+        )
+
+    def handle(self, *args, **options):
+        cutoff = date.today() - timedelta(days=options['grace_days'])
+        batch_size = options['batch_size']
+        max_batches = options['max_batches']
+
+        if options['dry_run']:
+            for old_status, new_status in STALE_TRANSITIONS:
+                count = Booking.objects.filter(status=old_status, booking_date__lt=cutoff).count()
+                self.stdout.write(f'{count} {old_status} bookings before {cutoff} would become {new_status}.')
+            return
+
+        started = time.monotonic()
+        batches = 0
+        total = 0
+        for old_status, new_status in STALE_TRANSITIONS:
+            moved = 0
+            while max_batches is None or batches < max_batches:
+                # Served by the partial booking_active_date_idx index
+                ids = list(
+                    Booking.objects.filter(status=old_status, booking_date__lt=cutoff)
+                    .order_by('booking_date', 'pk')
+                    .values_list('pk', flat=True)[:batch_size]
+                )
+                if not ids:
+                    break
+                # Locks, re-checks the status, logs BookingEvents and keeps the
+                # dashboard counters in step. Past days have no slot index upkeep
+                # and nobody follows them live, so no events are published.
+                results = bulk_transition(Booking.objects.all(), ids, new_status, publish=False)
+                moved += sum(1 for result, _ in results.values() if result == 'updated')
+                batches += 1
+                if options['sleep']:
+                    time.sleep(options['sleep'])
+            total += moved
+            self.stdout.write(f'{moved} {old_status} bookings before {cutoff} -> {new_status}')
+
+        elapsed = time.monotonic() - started
+        rate = total / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Updated {total} bookings in {batches} batches, {elapsed:.2f}s ({rate:.0f} rows/s).'
+        ))
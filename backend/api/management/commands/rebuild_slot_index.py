@@ -0,0 +1,42 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from bookings.models import BOOKING_WINDOW_DAYS, SlotIndex
+from bookings.slots import load_slot_index
+from doctors.models import Doctors
+
+
+class Command(BaseCommand):
+    help = (
+        'Recreate the slot occupancy index from the Booking, DoctorLeave and '
+        'DoctorAvailability tables for the booking window.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=BOOKING_WINDOW_DAYS,
+            help=f'Number of days after today to build (default: {BOOKING_WINDOW_DAYS}).',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help='Doctors indexed per batch (default: 100).',
+        )
+
+    def handle(self, *args, **options):
+        start = date.today()
+        end = start + timedelta(days=options['days'])
+        batch_size = options['batch_size']
+
+        with transaction.atomic():
+            deleted, _ = SlotIndex.objects.all().delete()
+            doctors = list(Doctors.objects.prefetch_related('availabilities').order_by('id'))
+            for offset in range(0, len(doctors), batch_size):
+                load_slot_index(doctors[offset:offset + batch_size], start, end)
+
+        built = SlotIndex.objects.count()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt slot index: removed {deleted} rows, built {built} rows '
+            f'for {len(doctors)} doctors ({start} to {end}).'
+        ))
@@ -0,0 +1,92 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from bookings.counters import COUNTER_ROWS, STATUS_FIELDS, compute_counters
+from bookings.models import DashboardCounter
+
+
+COUNTER_FIELDS = STATUS_FIELDS + ['patients']
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the dashboard counters from the Booking table, report any '
+        'drift from the stored values and replace them.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only report drift; leave the stored counters untouched.',
+        )
+        parser.add_argument(
+            '--show', type=int, default=20,
+            help='Number of drifted rows to print (default: 20).',
+        )
+
+    def handle(self, *args, **options):
+        checked = 0
+        drifted = 0
+        for scope, per_date in COUNTER_ROWS:
+            # One transaction per kind of row, so bookings wait on one scope's locks at most
+            with transaction.atomic():
+                rows, drift = self._drift(scope, per_date)
+                checked += rows
+                for (scope_id, day), have, want in drift[:max(options['show'] - drifted, 0)]:
+                    diff = ', '.join(
+                        f'{field} {have[field]} -> {want[field]}'
+                        for field in COUNTER_FIELDS if have[field] != want[field]
+                    )
+                    self.stdout.write(f'  {scope}:{scope_id} {day or "all time"}: {diff}')
+                drifted += len(drift)
+                if drift and not options['dry_run']:
+                    self._fix(scope, drift)
+
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS(f'No drift in {checked} counter rows.'))
+        elif options['dry_run']:
+            self.stdout.write(self.style.WARNING(
+                f'{drifted} counter rows drifted (dry run, nothing written).'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Fixed {drifted} drifted counter rows.'))
+
+    def _drift(self, scope, per_date):
+        """(rows checked, [((scope_id, date), stored, expected)]) for one kind of row."""
+        stored = {
+            (scope_id, day): dict(zip(COUNTER_FIELDS, values))
+            for scope_id, day, *values in DashboardCounter.objects.select_for_update()
+            .filter(scope=scope, date__isnull=not per_date)
+            .values_list('scope_id', 'date', *COUNTER_FIELDS)
+            .iterator(chunk_size=5000)
+        }
+        checked = len(stored)
+        zero = dict.fromkeys(COUNTER_FIELDS, 0)
+
+        drift = []
+        for key, values in compute_counters(scope, per_date):
+            want = {**zero, **values}
+            have = stored.pop(key, zero)
+            if want != have:
+                drift.append((key, have, want))
+        # Stored rows with nothing left to count
+        drift.extend(
+            (key, have, zero) for key, have in stored.items() if have != zero
+        )
+        return checked, sorted(drift, key=str)
+
+    def _fix(self, scope, drift):
+        scope_ids = defaultdict(list)
+        for (scope_id, day), _, _ in drift:
+            scope_ids[day].append(scope_id)
+        for day, ids in scope_ids.items():
+            DashboardCounter.objects.filter(scope=scope, date=day, scope_id__in=ids).delete()
+        DashboardCounter.objects.bulk_create(
+            [
+                DashboardCounter(scope=scope, scope_id=scope_id, date=day, **want)
+                for (scope_id, day), _, want in drift if any(want.values())
+            ],
+            batch_size=1000,
+        )
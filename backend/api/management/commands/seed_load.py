@@ -0,0 +1,264 @@
+import random
+import time
+from datetime import date, datetime, time as dt_time, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from bookings.models import BOOKING_WINDOW_DAYS, SLOT_MINUTES, Booking
+from core.models import UserProfile
+from doctors.cache import invalidate_catalog
+from doctors.models import Departments, DoctorAvailability, DoctorLeave, Doctors
+
+
+SPECIALTIES = [
+    'Cardiology', 'Neurology', 'Orthopedics', 'Pediatrics', 'Dermatology', 'Oncology',
+    'Gastroenterology', 'Ophthalmology', 'Psychiatry', 'Radiology', 'Urology', 'ENT',
+]
+FIRST_NAMES = [
+    'Anu', 'Arjun', 'Maria', 'Rahul', 'Fatima', 'John', 'Priya', 'David', 'Meera', 'Joseph',
+    'Aisha', 'Vivek', 'Sara', 'Thomas', 'Divya', 'Ravi', 'Neha', 'George', 'Lakshmi', 'Akhil',
+]
+LAST_NAMES = [
+    'Thomas', 'Nair', 'Menon', 'Kumar', 'Joseph', 'Varghese', 'Pillai', 'Khan', 'Mathew',
+    'Iyer', 'George', 'Das', 'Reddy', 'Philip', 'Rao', 'Jacob', 'Shah', 'Paul', 'Krishnan',
+]
+
+# Weighted status mix for bookings before today and from today on. Future
+# bookings are mostly active; past ones have been through expire_stale_bookings.
+PAST_STATUSES = [('completed', 72), ('cancelled', 13), ('rejected', 7), ('expired', 8)]
+FUTURE_STATUSES = [('pending', 45), ('accepted', 43), ('cancelled', 9), ('rejected', 3)]
+
+
+def _weights(mix):
+    return [status for status, _ in mix], [weight for _, weight in mix]
+
+
+class Command(BaseCommand):
+    help = (
+        'Fill the database with synthetic data for scale testing: departments, '
+        'doctors with weekly availability and leave calendars, patients with '
+        'profiles, and years of bookings with a realistic status mix. Rows are '
+        'inserted with bulk_create in batches; the same --seed always produces '
+        'the same data. Bookings never share an active slot or an active '
+        'patient/doctor/day, so both partial unique constraints hold. The slot '
+        'index and dashboard counters are rebuilt at the end; no BookingEvent '
+        'or SyncChange rows are written for the generated history.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--departments', type=int, default=12, help='Departments to create (default: 12).')
+        parser.add_argument('--doctors', type=int, default=200, help='Doctors to create (default: 200).')
+        parser.add_argument('--users', type=int, default=20000, help='Patients to create (default: 20000).')
+        parser.add_argument(
+            '--bookings', type=int, default=1000000,
+            help='Bookings to create, spread over the history and the booking window (default: 1000000).',
+        )
+        parser.add_argument('--years', type=float, default=3, help='Years of booking history (default: 3).')
+        parser.add_argument(
+            '--leave-days', type=int, default=20,
+            help='Leave days per doctor per year (default: 20).',
+        )
+        parser.add_argument('--seed', type=int, default=1, help='Random seed (default: 1).')
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Rows per bulk_create batch (default: 5000).',
+        )
+        parser.add_argument(
+            '--prefix', default='load',
+            help='Username prefix of the generated users (default: "load").',
+        )
+        parser.add_argument(
+            '--password', default='load-test-password',
+            help='Password of every generated user (default: "load-test-password").',
+        )
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.prefix = options['prefix']
+        if options['departments'] < 1 or options['doctors'] < 1 or options['users'] < 1:
+            raise CommandError('--departments, --doctors and --users must be at least 1')
+        if User.objects.filter(username__startswith=f'{self.prefix}-').exists():
+            raise CommandError(f'Users named "{self.prefix}-..." already exist; pick another --prefix.')
+
+        today = date.today()
+        self.first_day = today - timedelta(days=round(options['years'] * 365))
+        self.last_day = today + timedelta(days=BOOKING_WINDOW_DAYS)
+        # One hash for everyone: hashing per user would take longer than the rest
+        salt = f'seed{options["seed"]}'
+        self.password = make_password(options['password'], salt=salt)
+
+        started = time.monotonic()
+        departments = self._departments(options['departments'])
+        doctors = self._doctors(options['doctors'], departments)
+        schedules = self._availability(doctors)
+        leaves = self._leaves(doctors, options['leave_days'])
+        patients = self._patients(options['users'])
+        self._bookings(options['bookings'], doctors, schedules, leaves, patients)
+
+        self.stdout.write('Rebuilding derived data...')
+        call_command('rebuild_slot_index', stdout=self.stdout)
+        call_command('reconcile_dashboard_counters', show=0, stdout=self.stdout)
+        invalidate_catalog()
+        self.stdout.write(self.style.SUCCESS(f'Done in {time.monotonic() - started:.1f}s.'))
+
+    def _bulk_create(self, model, rows):
+        created = []
+        for offset in range(0, len(rows), self.batch_size):
+            created.extend(model.objects.bulk_create(rows[offset:offset + self.batch_size]))
+        return created
+
+    def _name(self):
+        return self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES)
+
+    def _users(self, kind, count, **extra):
+        """Bulk-create users (and the profiles the post_save signal would have made); returns their ids."""
+        joined = timezone.make_aware(datetime.combine(self.first_day, dt_time.min))
+        users = []
+        for number in range(count):
+            first, last = self._name()
+            username = f'{self.prefix}-{kind}-{number:07d}'
+            users.append(User(
+                username=username, email=f'{username}@example.com', first_name=first, last_name=last,
+                password=self.password, date_joined=joined, **extra,
+            ))
+        self._bulk_create(User, users)
+        # Not every backend returns ids from bulk_create, so look them up
+        ids = list(
+            User.objects.filter(username__startswith=f'{self.prefix}-{kind}-')
+            .order_by('username').values_list('id', flat=True)
+        )
+        self._bulk_create(UserProfile, [
+            UserProfile(user_id=user_id, phone_number=f'9{self.rng.randrange(10 ** 9):09d}') for user_id in ids
+        ])
+        return ids
+
+    def _departments(self, count):
+        departments = []
+        for number in range(count):
+            name = SPECIALTIES[number % len(SPECIALTIES)]
+            if number >= len(SPECIALTIES):
+                name = f'{name} {number // len(SPECIALTIES) + 1}'
+            departments.append(Departments(dep_name=name, dep_decription=f'The {name} department.'))
+        created = self._bulk_create(Departments, departments)
+        if created[0].pk is None:
+            created = list(Departments.objects.order_by('-id')[:count])[::-1]
+        self.stdout.write(f'{count} departments')
+        return created
+
+    def _doctors(self, count, departments):
+        user_ids = self._users('doctor', count, is_staff=True)
+        doctors = []
+        for number, user_id in enumerate(user_ids):
+            first, last = self._name()
+            department = departments[number % len(departments)]
+            doctors.append(Doctors(
+                user_id=user_id, doc_name=f'{first} {last}', doc_spec=department.dep_name, dep_name=department,
+            ))
+        self._bulk_create(Doctors, doctors)
+        doctors = list(Doctors.objects.filter(user_id__in=user_ids).order_by('user_id'))
+        self.stdout.write(f'{count} doctors')
+        return doctors
+
+    def _availability(self, doctors):
+        """Four to six working days a week, 3-7 hours from 8-10am. Returns {doctor id: {weekday: slots}}."""
+        rows, schedules = [], {}
+        for doctor in doctors:
+            days = sorted(self.rng.sample(range(6), self.rng.randint(4, 6)))
+            start = dt_time(self.rng.choice([8, 9, 10]))
+            hours = self.rng.randint(3, 7)
+            end = dt_time(start.hour + hours)
+            slots = [
+                (datetime.combine(date.min, start) + timedelta(minutes=SLOT_MINUTES * n)).time()
+                for n in range(hours * 60 // SLOT_MINUTES)
+            ]
+            schedules[doctor.id] = {day: slots for day in days}
+            rows.extend(DoctorAvailability(doctor=doctor, day=day, start_time=start, end_time=end) for day in days)
+        self._bulk_create(DoctorAvailability, rows)
+        self.stdout.write(f'{len(rows)} availability rows')
+        return schedules
+
+    def _leaves(self, doctors, per_year):
+        """Random leave days over the whole span. Returns {(doctor id, date)}."""
+        span = (self.last_day - self.first_day).days + 1
+        count = min(span, round(per_year * span / 365))
+        leaves = set()
+        for doctor in doctors:
+            for offset in self.rng.sample(range(span), count):
+                leaves.add((doctor.id, self.first_day + timedelta(days=offset)))
+        self._bulk_create(DoctorLeave, [
+            DoctorLeave(doctor_id=doctor_id, date=day, reason=self.rng.choice(['Conference', 'Personal', 'Sick']))
+            for doctor_id, day in sorted(leaves)
+        ])
+        self.stdout.write(f'{len(leaves)} leave days')
+        return leaves
+
+    def _patients(self, count):
+        ids = self._users('patient', count)
+        self.stdout.write(f'{count} patients')
+        return ids
+
+    def _bookings(self, count, doctors, schedules, leaves, patients):
+        """
+        Walk every working doctor-day and book a random sample of its slots,
+        each by a different patient: a slot is never booked twice and no
+        patient has two bookings with one doctor on one day, whatever the
+        status, so neither partial unique constraint can be violated.
+        """
+        days = [self.first_day + timedelta(days=n) for n in range((self.last_day - self.first_day).days + 1)]
+        capacity = sum(
+            min(len(schedules[doctor.id].get(day.weekday(), ())), len(patients))
+            for doctor in doctors for day in days if (doctor.id, day) not in leaves
+        )
+        if count > capacity:
+            raise CommandError(
+                f'{count} bookings do not fit in {capacity} free slots; add doctors, patients or years.'
+            )
+        fill = count / capacity if capacity else 0
+        today = date.today()
+        past, future = _weights(PAST_STATUSES), _weights(FUTURE_STATUSES)
+        contacts = {
+            user_id: (f'{first} {last}', email)
+            for user_id, first, last, email in User.objects.filter(id__in=patients)
+            .values_list('id', 'first_name', 'last_name', 'email').iterator(chunk_size=5000)
+        }
+
+        batch, created, flushes, started = [], 0, 0, time.monotonic()
+        for day in days:
+            statuses, weights = past if day < today else future
+            for doctor in doctors:
+                slots = schedules[doctor.id].get(day.weekday())
+                if not slots or (doctor.id, day) in leaves or created >= count:
+                    continue
+                # Round the expected number of bookings up or down at random so the total comes out right
+                expected = fill * min(len(slots), len(patients))
+                booked = int(expected) + (self.rng.random() < expected % 1)
+                booked = min(booked, count - created)
+                if not booked:
+                    continue
+                users = self.rng.sample(patients, booked)
+                picked = self.rng.sample(slots, booked)
+                chosen = self.rng.choices(statuses, weights, k=booked)
+                for user_id, slot, status in zip(users, picked, chosen):
+                    # Booked one to thirty days ahead
+                    made = datetime.combine(day, slot) - timedelta(minutes=self.rng.randint(24 * 60, 30 * 24 * 60))
+                    name, email = contacts[user_id]
+                    batch.append(Booking(
+                        user_id=user_id, p_name=name, p_email=email,
+                        p_phone=f'9{self.rng.randrange(10 ** 9):09d}', doc_name_id=doctor.id, booking_date=day,
+                        appointment_time=slot, status=status, created_at=timezone.make_aware(made),
+                    ))
+                created += booked
+                if len(batch) >= self.batch_size:
+                    Booking.objects.bulk_create(batch)
+                    batch = []
+                    flushes += 1
+                    if flushes % 20 == 0:
+                        rate = created / (time.monotonic() - started)
+                        self.stdout.write(f'  {created}/{count} bookings, {rate:.0f} rows/s')
+        Booking.objects.bulk_create(batch)
+        self.stdout.write(f'{created} bookings')
@@ -0,0 +1,184 @@
+import random
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware as DjangoGZipMiddleware
+from django.utils.functional import SimpleLazyObject
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from .instrumentation import RequestMetrics, current_metrics, report
+from .principal import Principal
+from .profiling import current_capture, get_sampler, write_profile
+
+
+class PrincipalMiddleware:
+    """
+    Attach a lazy `request.principal` to every request.
+
+    It is resolved on first use, which is after DRF has authenticated the
+    request (DRF copies the JWT user onto the underlying HttpRequest), and
+    DRF's Request forwards the attribute, so views and permissions can read
+    `request.principal` directly.
+
+    Async views (api.async_views) authenticate the token themselves and build
+    their own Principal with `await Principal(user).aload()`; resolving the
+    lazy one there would query from the event loop.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request.principal = SimpleLazyObject(lambda: Principal(request.user))
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        request.principal = SimpleLazyObject(lambda: Principal(request.user))
+        return await self.get_response(request)
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise that can sit in an async middleware chain.
+
+    Django runs the whole chain synchronously (one thread hop per request)
+    if any middleware is sync-only, which would undo the async views under
+    ASGI. Static files are rare on this API, so serving them goes through a
+    thread; every other request passes straight through.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
+
+
+class GZipMiddleware(DjangoGZipMiddleware):
+    """
+    GZip everything but server-sent event streams (api.streams).
+
+    Django's GZipMiddleware compresses a streaming response chunk by chunk,
+    and clients and proxies then hold events back waiting for more input.
+    """
+
+    def process_response(self, request, response):
+        if response.get('Content-Type', '').startswith('text/event-stream'):
+            return response
+        return super().process_response(request, response)
+
+
+class ServerTimingMiddleware:
+    """
+    Time every request and add a Server-Timing header: database time and
+    query count, serializer time, DRF view time and the total.
+
+    Only in MIDDLEWARE when settings.SERVER_TIMING is on (see
+    api.instrumentation, which also logs N+1 and slow requests). Put it
+    first, so the total covers the other middleware too.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self._finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self._finish(request, response, metrics)
+
+    def _finish(self, request, response, metrics):
+        total = time.perf_counter() - metrics.started
+        if metrics.view_name is None and request.resolver_match is not None:
+            metrics.view_name = request.resolver_match.view_name or request.resolver_match._func_path
+        response['Server-Timing'] = metrics.server_timing(total)
+        report(request, response, metrics, total)
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Profile 1 in PROFILING_SAMPLE_RATE requests, and every request still
+    running after PROFILING_SLOW_MS, with the stack sampler in
+    api.profiling; the profiles are listed at /api/profiles/.
+
+    Only in MIDDLEWARE when settings.PROFILING is on.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.rate = settings.PROFILING_SAMPLE_RATE
+        self.sampler = get_sampler()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _sampled(self):
+        return self.rate > 0 and random.randrange(self.rate) == 0
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        capture = self.sampler.start(threading.get_ident(), self._sampled())
+        try:
+            response = self.get_response(request)
+        finally:
+            duration = self.sampler.stop(capture)
+        if capture.stacks:
+            write_profile(request, capture, duration)
+        return response
+
+    async def __acall__(self, request):
+        # The event loop thread; sync_to_async threads join through current_capture
+        capture = self.sampler.start(threading.get_ident(), self._sampled())
+        token = current_capture.set(capture)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_capture.reset(token)
+            duration = self.sampler.stop(capture)
+        if capture.stacks:
+            await sync_to_async(write_profile, thread_sensitive=False)(request, capture, duration)
+        return response
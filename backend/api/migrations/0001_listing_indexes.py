@@ -0,0 +1,26 @@
+# Indexes backing the keyset (cursor) pagination of /api/users/ and
+# /api/contacts/. auth_user and core_contact belong to other apps, so they are
+# created here with plain SQL that both SQLite and PostgreSQL accept.
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("core", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            "CREATE INDEX IF NOT EXISTS api_user_date_joined_idx "
+            "ON auth_user (date_joined, id)",
+            "DROP INDEX IF EXISTS api_user_date_joined_idx",
+        ),
+        migrations.RunSQL(
+            "CREATE INDEX IF NOT EXISTS api_contact_submitted_idx "
+            "ON core_contact (submitted_at, id)",
+            "DROP INDEX IF EXISTS api_contact_submitted_idx",
+        ),
+    ]
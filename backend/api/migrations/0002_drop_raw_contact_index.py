@@ -0,0 +1,22 @@
+# The core_contact index is declared on core.Contact now (core migration
+# 0006), so Django's model state knows about it; drop the raw SQL copy 0001
+# created. auth_user's index stays raw SQL in 0001: User belongs to
+# django.contrib.auth, and its Meta can't be given extra indexes.
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0001_listing_indexes"),
+        ("core", "0006_contact_submitted_idx"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            "DROP INDEX IF EXISTS api_contact_submitted_idx",
+            "CREATE INDEX IF NOT EXISTS api_contact_submitted_idx "
+            "ON core_contact (submitted_at, id)",
+        ),
+    ]
@@ -0,0 +1,44 @@
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination ordered like the view (its `ordering`, or ?ordering=
+    through OrderingFilter), so pages are read with an indexed range scan
+    instead of COUNT(*) + OFFSET. An empty ?cursor= means the first page.
+    """
+
+    def decode_cursor(self, request):
+        if not request.query_params.get(self.cursor_query_param):
+            return None
+        return super().decode_cursor(request)
+
+
+class OptInCursorPagination(PageNumberPagination):
+    """
+    The project's page-number pagination, unless the client opts in to
+    keyset pagination by sending ?cursor= (empty for the first page). Cursor
+    pages return {"next", "previous", "results"} with no count.
+    """
+
+    def __init__(self):
+        self.keyset = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if KeysetPagination.cursor_query_param not in request.query_params:
+            return super().paginate_queryset(queryset, request, view)
+        self.keyset = KeysetPagination()
+        self.keyset.ordering = getattr(view, 'ordering', None) or ('-pk',)
+        page = self.keyset.paginate_queryset(queryset, request, view)
+        self.display_page_controls = self.keyset.display_page_controls
+        return page
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_html_context(self):
+        if self.keyset is not None:
+            return self.keyset.get_html_context()
+        return super().get_html_context()
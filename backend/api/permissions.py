@@ -1,5 +1,4 @@
 from rest_framework import permissions
-from doctors.models import Doctors
 
 class IsOwnerOrAdmin(permissions.BasePermission):
     """
@@ -13,49 +12,55 @@ class IsOwnerOrAdmin(permissions.BasePermission):
     
     def has_object_permission(self, request, view, obj):
         # Admin can do anything
-        if request.user.is_staff:
+        if request.principal.is_staff:
             return True
         
         # Check if object has a user field
-        if hasattr(obj, 'user'):
-            return obj.user == request.user
+        if hasattr(obj, 'user_id'):
+            return obj.user_id == request.user.id
         
         return False
 
 
+class IsAdmin(permissions.BasePermission):
+    """
+    Superusers only. Doctor accounts are staff too, so IsAdminUser would let them in.
+    """
+    def has_permission(self, request, view):
+        return request.user.is_authenticated and request.principal.is_admin
+
+
 class IsDoctorOrAdmin(permissions.BasePermission):
     """
     Custom permission for doctor or admin users.
+    Role lookups go through request.principal, so they cost at most one query per request.
     """
     def has_permission(self, request, view):
         if not request.user.is_authenticated:
             return False
         
         # Admin/superuser always allowed
-        if request.user.is_superuser or request.user.is_staff:
+        if request.principal.is_staff:
             return True
         
         # Check if user is linked to a doctor profile
-        return Doctors.objects.filter(user=request.user).exists()
+        return request.principal.is_doctor
     
     def has_object_permission(self, request, view, obj):
         # Admin/superuser always allowed
-        if request.user.is_superuser or request.user.is_staff:
+        if request.principal.is_staff:
             return True
         
-        # Try to get doctor for current user
-        try:
-            doctor = Doctors.objects.get(user=request.user)
-        except Doctors.DoesNotExist:
+        doctor_id = request.principal.doctor_id
+        if doctor_id is None:
             return False
         
         # For bookings, check if user is the assigned doctor
-        if hasattr(obj, 'doc_name'):
-            return obj.doc_name.id == doctor.id
+        if hasattr(obj, 'doc_name_id'):
+            return obj.doc_name_id == doctor_id
         
         # For leaves and availability, check if user is the doctor
-        if hasattr(obj, 'doctor'):
-            return obj.doctor.id == doctor.id
+        if hasattr(obj, 'doctor_id'):
+            return obj.doctor_id == doctor_id
         
         return False
-
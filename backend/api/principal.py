@@ -0,0 +1,85 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.utils.functional import cached_property
+
+from core.models import ADMIN_MODULES, AdminPermissions
+
+
+class Principal:
+    """
+    Who is making the request: admin flags, the linked doctor profile and the
+    admin panel modules they may use.
+
+    Doctor and module lookups share one query, run on first use and cached for
+    the rest of the request, so permissions and views can ask "is this a
+    doctor?" as often as they like. Attached to every request as
+    `request.principal` by api.middleware.PrincipalMiddleware.
+    """
+
+    def __init__(self, user):
+        self.user = user
+
+    def _links_query(self):
+        # Reverse one-to-ones: Doctors.user and AdminPermissions.user
+        return User.objects.filter(pk=self.user.pk).values(
+            'doctors__id', 'admin_permissions__allowed_modules'
+        )
+
+    @cached_property
+    def _links(self):
+        if not self.user.is_authenticated:
+            return {}
+        return self._links_query().first() or {}
+
+    async def aload(self):
+        """
+        Run the links query from async code, so the properties below can be
+        read in an async view without touching the database.
+        """
+        if self.user.is_authenticated:
+            self.__dict__['_links'] = await self._links_query().afirst() or {}
+        else:
+            self.__dict__['_links'] = {}
+        return self
+
+    @property
+    def is_authenticated(self):
+        return self.user.is_authenticated
+
+    @property
+    def is_admin(self):
+        """Superusers: full access to bookings, schedules and the dashboard."""
+        return self.user.is_superuser
+
+    @property
+    def is_staff(self):
+        """Staff or superuser (doctor accounts are created as staff too)."""
+        return self.user.is_staff or self.user.is_superuser
+
+    @property
+    def is_main_admin(self):
+        return self.user.username == settings.MAIN_ADMIN_USERNAME
+
+    @property
+    def doctor_id(self):
+        return self._links.get('doctors__id')
+
+    @property
+    def is_doctor(self):
+        return self.doctor_id is not None
+
+    @property
+    def role(self):
+        if self.is_admin:
+            return 'admin'
+        return 'doctor' if self.is_doctor else 'patient'
+
+    @cached_property
+    def allowed_modules(self):
+        """Admin panel module keys this user may open (all of them for the main admin)."""
+        if not self.is_admin:
+            return []
+        if self.is_main_admin:
+            return [key for key, _ in ADMIN_MODULES]
+        modules = self._links.get('admin_permissions__allowed_modules') or ''
+        return AdminPermissions(allowed_modules=modules).get_modules_list()
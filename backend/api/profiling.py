@@ -0,0 +1,291 @@
+"""
+Sampling profiler for production requests, written as collapsed stacks.
+
+Opt-in with PROFILING=True (settings.PROFILING), which puts
+api.middleware.ProfilingMiddleware in MIDDLEWARE. A request is profiled when
+
+- it is picked at random, 1 in PROFILING_SAMPLE_RATE requests (0 never), or
+- it is still running PROFILING_SLOW_MS after it started; its stacks from
+  then on are kept, which is where a slow request spends its extra time.
+
+One background thread (started with the first request) takes the stacks
+from sys._current_frames() every PROFILING_INTERVAL_MS, but only of requests
+that are being profiled; otherwise it sleeps until the next one could cross
+the threshold. A request that is not profiled costs a dict insert and
+delete, so it is safe to leave on at a low sample rate.
+
+Sync requests are sampled on their own thread. Async requests are sampled
+on the event loop thread and on every sync_to_async thread while it runs
+code for them: install() wraps asgiref's SyncToAsync.thread_handler so that
+a worker thread registers itself on the Capture in current_capture (copied
+into the thread with the rest of the context) and unregisters when done.
+thread_handler is private to asgiref, so install() checks its signature
+first; on a version that changed it, it logs a warning and leaves asgiref
+alone, and async requests are only sampled on the event loop thread.
+The event loop is shared, so async code of concurrent requests can show up
+in each other's profiles; their sync work does not.
+
+Each profile is one file in PROFILING_DIR (the newest PROFILING_KEEP are
+kept), in the collapsed format of flamegraph.pl and speedscope: one line per
+distinct stack, frames root first separated by ";", then the sample count.
+GET /api/profiles/ lists them for admins.
+"""
+import functools
+import inspect
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+
+from asgiref.sync import SyncToAsync
+from django.conf import settings
+
+
+logger = logging.getLogger('api.profiling')
+
+# <time>-<pid>-<method>-<path>-<duration>ms-<reason>.txt
+_NAME = re.compile(
+    r'^(?P<time>\d{8}T\d{6}\.\d{6})-(?P<pid>\d+)-(?P<method>[A-Z]+)-(?P<path>[\w.-]*)'
+    r'-(?P<duration>\d+)ms-(?P<reason>sampled|slow)\.txt$'
+)
+# Where an idle thread sits; samples ending here are not work. An idle
+# uvloop event loop (C code) shows as asyncio.runners' run.
+_IDLE = {
+    ('threading.py', 'wait'), ('selectors.py', 'select'), ('queue.py', 'get'),
+    ('thread.py', '_worker'), ('runners.py', 'run'),
+}
+
+
+# The Capture of the async request being handled, for its sync_to_async threads
+current_capture = ContextVar('profiling_capture', default=None)
+
+
+class Capture:
+    """The stacks of one request, from `started` until the middleware stops it."""
+
+    def __init__(self, thread_id, sampled):
+        # {thread id: nesting depth} of the threads running the request; each
+        # thread only changes its own entry
+        self.threads = Counter({thread_id: 1})
+        self.sampled = sampled
+        self.started = time.perf_counter()
+        self.stacks = Counter()
+
+    def enter(self, thread_id):
+        self.threads[thread_id] += 1
+
+    def leave(self, thread_id):
+        self.threads[thread_id] -= 1
+        if not self.threads[thread_id]:
+            del self.threads[thread_id]
+
+
+def _tracked(call):
+    """Run `call` with the current thread registered on the request's Capture."""
+    def run(*args, **kwargs):
+        capture = current_capture.get()
+        if capture is None:
+            return call(*args, **kwargs)
+        thread_id = threading.get_ident()
+        capture.enter(thread_id)
+        try:
+            return call(*args, **kwargs)
+        finally:
+            capture.leave(thread_id)
+    return run
+
+
+# The SyncToAsync.thread_handler parameters tracked_thread_handler passes on
+_THREAD_HANDLER_PARAMS = ('self', 'loop', 'exc_info', 'task_context', 'func', 'args', 'kwargs')
+# SyncToAsync.thread_handler as it was before install()
+_original_thread_handler = None
+
+
+def install():
+    """
+    Make sync_to_async threads register on the request's Capture (once per
+    process). Returns whether the hook is in place.
+    """
+    global _original_thread_handler
+    if _original_thread_handler is not None:
+        return True
+    thread_handler = SyncToAsync.thread_handler
+    signature = inspect.signature(thread_handler)
+    if tuple(signature.parameters) != _THREAD_HANDLER_PARAMS:
+        logger.warning(
+            'asgiref SyncToAsync.thread_handler%s has changed; sync_to_async threads '
+            'will not be profiled', signature,
+        )
+        return False
+
+    @functools.wraps(thread_handler)
+    def tracked_thread_handler(self, loop, exc_info, task_context, func, *args, **kwargs):
+        # func enters the caller's context and calls its argument there, which
+        # is where current_capture can be read
+        def run(call, *call_args, **call_kwargs):
+            return func(_tracked(call), *call_args, **call_kwargs)
+        return thread_handler(self, loop, exc_info, task_context, run, *args, **kwargs)
+
+    SyncToAsync.thread_handler = tracked_thread_handler
+    _original_thread_handler = thread_handler
+    return True
+
+
+def uninstall():
+    """Put asgiref's own thread_handler back."""
+    global _original_thread_handler
+    if _original_thread_handler is not None:
+        SyncToAsync.thread_handler = _original_thread_handler
+        _original_thread_handler = None
+
+
+@lru_cache(maxsize=8192)
+def _frame_name(code):
+    path = Path(code.co_filename)
+    where = f'{path.parent.name}/{path.name}' if path.parent.name else path.name
+    return f'{code.co_name} ({where}:{code.co_firstlineno})'
+
+
+def _collapse(frame):
+    """'root;...;leaf' for a frame, or None if the thread is idle."""
+    code = frame.f_code
+    if (os.path.basename(code.co_filename), code.co_name) in _IDLE:
+        return None
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class Sampler:
+    def __init__(self, interval, slow_seconds):
+        self.interval = interval
+        self.slow_seconds = slow_seconds
+        self._captures = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self, thread_id, sampled):
+        capture = Capture(thread_id, sampled)
+        with self._lock:
+            self._captures[id(capture)] = capture
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return capture
+
+    @staticmethod
+    def _sample(captures, me):
+        frames = sys._current_frames()
+        stacks = {}
+        for capture in captures:
+            for thread_id in list(capture.threads):
+                if thread_id == me or thread_id not in frames:
+                    continue
+                if thread_id not in stacks:
+                    stacks[thread_id] = _collapse(frames[thread_id])
+                if stacks[thread_id]:
+                    capture.stacks[stacks[thread_id]] += 1
+
+    def stop(self, capture):
+        with self._lock:
+            self._captures.pop(id(capture), None)
+        return time.perf_counter() - capture.started
+
+    def _run(self):
+        me = threading.get_ident()
+        while True:
+            # Sample under the lock, so a stopped capture is never written to again
+            with self._lock:
+                # Cleared before looking, so a request started after this wakes us
+                self._wake.clear()
+                captures = list(self._captures.values())
+                now = time.perf_counter()
+                due = [c for c in captures if c.sampled or now - c.started >= self.slow_seconds]
+                if due:
+                    self._sample(due, me)
+            if due:
+                time.sleep(self.interval)
+            elif captures:
+                # Nothing to sample until the oldest request turns slow (or a new one arrives)
+                self._wake.wait(min(c.started for c in captures) + self.slow_seconds - now)
+            else:
+                self._wake.wait()
+
+
+_sampler = None
+
+
+def get_sampler():
+    global _sampler
+    if _sampler is None:
+        _sampler = Sampler(settings.PROFILING_INTERVAL_MS / 1000, settings.PROFILING_SLOW_MS / 1000)
+    return _sampler
+
+
+def profile_dir():
+    return Path(settings.PROFILING_DIR)
+
+
+def write_profile(request, capture, duration):
+    """Save a finished capture and drop the oldest files past PROFILING_KEEP."""
+    if not capture.stacks:
+        return
+    # The path with / as . (list_profiles turns it back)
+    slug = '.'.join(re.sub(r'[^\w-]+', '_', part) for part in request.path.strip('/').split('/'))[:80]
+    reason = 'sampled' if capture.sampled else 'slow'
+    stamp = datetime.now().strftime('%Y%m%dT%H%M%S.%f')
+    name = f'{stamp}-{os.getpid()}-{request.method}-{slug}-{round(duration * 1000)}ms-{reason}.txt'
+    directory = profile_dir()
+    try:
+        directory.mkdir(parents=True, exist_ok=True)
+        (directory / name).write_text(
+            ''.join(f'{stack} {count}\n' for stack, count in capture.stacks.most_common())
+        )
+        # Other workers write here too; losing a race to delete a file is fine
+        for old in sorted(directory.glob('*.txt'))[:-settings.PROFILING_KEEP]:
+            old.unlink(missing_ok=True)
+    except OSError:
+        logger.exception('Could not write profile %s', name)
+
+
+def list_profiles():
+    """Metadata of the saved profiles, newest first."""
+    profiles = []
+    for path in sorted(profile_dir().glob('*.txt'), reverse=True):
+        match = _NAME.match(path.name)
+        if match is None:
+            continue
+        try:
+            size = path.stat().st_size
+        except OSError:
+            continue  # rotated away meanwhile
+        profiles.append({
+            'name': path.name,
+            'created': datetime.strptime(match['time'], '%Y%m%dT%H%M%S.%f').isoformat(),
+            'method': match['method'],
+            'path': '/' + match['path'].replace('.', '/') + '/',
+            'duration_ms': int(match['duration']),
+            'reason': match['reason'],
+            'pid': int(match['pid']),
+            'size': size,
+        })
+    return profiles
+
+
+def profile_path(name):
+    """The file of a listed profile, or None (also for names that are not ours)."""
+    if not _NAME.match(name):
+        return None
+    path = profile_dir() / name
+    return path if path.is_file() else None
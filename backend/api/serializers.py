@@ -1,7 +1,9 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from django.db.models import Exists, OuterRef
 from doctors.models import Doctors, Departments, DoctorAvailability, DoctorLeave, DepartmentBlog
-from bookings.models import Booking
+from bookings.models import ACTIVE_STATUSES, Booking, SlotHold
+from bookings.slots import held_slots, load_slot_index
 from core.models import Contact
 from datetime import date, time, datetime, timedelta
 
@@ -10,6 +12,14 @@ from datetime import date, time, datetime, timedelta
 # User Serializers
 # ===========================
 
+def with_role(queryset):
+    """
+    Annotate `is_doctor` on a User queryset (one EXISTS subquery) so
+    UserSerializer.get_role doesn't query Doctors once per user.
+    """
+    return queryset.annotate(is_doctor=Exists(Doctors.objects.filter(user=OuterRef('pk'))))
+
+
 class UserSerializer(serializers.ModelSerializer):
     role = serializers.SerializerMethodField()
     
@@ -21,9 +31,11 @@ class UserSerializer(serializers.ModelSerializer):
     def get_role(self, obj):
         if obj.is_superuser:
             return 'admin'
-        if Doctors.objects.filter(user=obj).exists():
-            return 'doctor'
-        return 'patient'
+        # Use annotated value if available (see with_role)
+        is_doctor = getattr(obj, 'is_doctor', None)
+        if is_doctor is None:
+            is_doctor = Doctors.objects.filter(user=obj).exists()
+        return 'doctor' if is_doctor else 'patient'
 
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
@@ -95,10 +107,12 @@ class DepartmentSerializer(serializers.ModelSerializer):
 
 class DoctorAvailabilitySerializer(serializers.ModelSerializer):
     day_display = serializers.CharField(source='get_day_display', read_only=True)
+    # `doctor` is write-only; the id is still needed to place a synced row (GET /api/sync/)
+    doctor_id = serializers.IntegerField(read_only=True)
     
     class Meta:
         model = DoctorAvailability
-        fields = ['id', 'doctor', 'day', 'day_display', 'start_time', 'end_time']
+        fields = ['id', 'doctor', 'doctor_id', 'day', 'day_display', 'start_time', 'end_time']
         extra_kwargs = {
             'doctor': {'write_only': True, 'required': False}
         }
@@ -109,10 +123,14 @@ class DoctorLeaveSerializer(serializers.ModelSerializer):
     department_name = serializers.SerializerMethodField()
     start_date = serializers.DateField(source='date', read_only=True)
     end_date = serializers.DateField(source='date', read_only=True)
+    doctor_id = serializers.IntegerField(read_only=True)
     
     class Meta:
         model = DoctorLeave
-        fields = ['id', 'doctor', 'doctor_name', 'department_name', 'date', 'start_date', 'end_date', 'reason']
+        fields = [
+            'id', 'doctor', 'doctor_id', 'doctor_name', 'department_name', 'date', 'start_date', 'end_date',
+            'reason',
+        ]
         extra_kwargs = {
             'doctor': {'write_only': True, 'required': False}
         }
@@ -163,6 +181,7 @@ class DoctorListSerializer(serializers.ModelSerializer):
     department_name = serializers.CharField(source='dep_name.dep_name', read_only=True)
     department_id = serializers.IntegerField(source='dep_name.id', read_only=True)
     doc_image_url = serializers.SerializerMethodField()
+    # Reads the flags annotated by Doctors.objects.with_current_status() (no per-row queries)
     current_status = serializers.ReadOnlyField()
     # availabilities is shown on the DoctorCard (weekly schedule), so keep it.
     # It does NOT cause N+1 queries because DoctorViewSet uses prefetch_related('availabilities').
@@ -368,6 +387,8 @@ class BookingSerializer(serializers.ModelSerializer):
     formatted_time = serializers.ReadOnlyField()
     formatted_booked_on = serializers.ReadOnlyField()
     status_display = serializers.CharField(source='get_status_display', read_only=True)
+    # Token from POST /api/doctors/{id}/hold/ for the chosen slot
+    hold_token = serializers.CharField(write_only=True, required=False)
     
     class Meta:
         model = Booking
@@ -375,9 +396,9 @@ class BookingSerializer(serializers.ModelSerializer):
             'id', 'p_name', 'p_phone', 'p_email', 'doctor', 'doctor_id',
             'booking_date', 'appointment_time', 'status', 'status_display',
             'formatted_date', 'formatted_time', 'formatted_booked_on', 
-            'booked_on', 'user_name'
+            'booked_on', 'created_at', 'user_name', 'hold_token'
         ]
-        read_only_fields = ['id', 'user', 'booked_on', 'status']
+        read_only_fields = ['id', 'user', 'booked_on', 'created_at', 'status']
         extra_kwargs = {
             'p_name': {'required': False},
             'p_phone': {'required': False},
@@ -401,36 +422,73 @@ class BookingSerializer(serializers.ModelSerializer):
                 {'booking_date': 'Cannot book appointments more than 2 months in advance.'}
             )
 
+        # Steps 3-6 read one slot index row instead of querying leaves,
+        # availabilities and bookings separately.
+        row = load_slot_index([doctor], booking_date, booking_date)[(doctor.id, booking_date)]
+
         # 3. Doctor must not be on leave that day
-        if doctor.leaves.filter(date=booking_date).exists():
+        if row.on_leave:
             raise serializers.ValidationError(
                 {'booking_date': 'Doctor is on leave on this date.'}
             )
 
         # 4. Doctor must be scheduled on that weekday
-        availability = doctor.availabilities.filter(day=booking_date.weekday()).first()
-        if not availability:
+        if not row.is_working_day:
             raise serializers.ValidationError(
                 {'booking_date': f'Doctor is not available on {booking_date.strftime("%A")}s.'}
             )
 
         # 5. Appointment time must fall within the working-hours window
-        if appointment_time and not (availability.start_time <= appointment_time < availability.end_time):
+        if appointment_time and not (row.start_time <= appointment_time < row.end_time):
             raise serializers.ValidationError({
                 'appointment_time': (
                     f'Appointment time must be between '
-                    f'{availability.start_time.strftime("%H:%M")} and '
-                    f'{availability.end_time.strftime("%H:%M")}.'
+                    f'{row.start_time.strftime("%H:%M")} and '
+                    f'{row.end_time.strftime("%H:%M")}.'
                 )
             })
 
-        # ✅ All clean — duplicate booking rules are enforced by the database
-        #    UniqueConstraints in Booking.Meta, so no Python loops needed here.
+        # 6. The slot must not already be taken (a bit test on the bitmap),
+        #    unless it is taken by the booking being edited
+        own_slot = (
+            self.instance is not None
+            and self.instance.status in ACTIVE_STATUSES
+            and self.instance.doc_name_id == doctor.id
+            and self.instance.booking_date == booking_date
+            and self.instance.appointment_time is not None
+            and row.slot_number(self.instance.appointment_time) == row.slot_number(appointment_time)
+        )
+        if appointment_time and not own_slot and row.is_booked(appointment_time):
+            raise serializers.ValidationError(
+                {'appointment_time': 'This time slot is already booked. Please choose another slot.'}
+            )
+
+        # 7. Another patient's unexpired hold blocks the slot, unless the
+        #    request carries that hold's token
+        if appointment_time and not own_slot:
+            holder_id = held_slots(row).get(row.slot_number(appointment_time))
+            request = self.context.get('request')
+            user_id = request.user.id if request else None
+            if holder_id is not None and holder_id != user_id:
+                token = attrs.get('hold_token')
+                if not token or not SlotHold.objects.active().filter(
+                    token=token, doctor=doctor, date=booking_date, appointment_time=appointment_time
+                ).exists():
+                    raise serializers.ValidationError({
+                        'appointment_time': (
+                            'This time slot is being held by another patient. '
+                            'Please choose another slot.'
+                        )
+                    })
+
+        # ✅ All clean — the database UniqueConstraints in Booking.Meta still
+        #    catch bookings that race past the slot check above.
         return attrs
 
 
     
     def create(self, validated_data):
+        hold_token = validated_data.pop('hold_token', None)
         # Automatically assign the authenticated user
         request = self.context.get('request')
         if request and request.user.is_authenticated:
@@ -459,7 +517,21 @@ class BookingSerializer(serializers.ModelSerializer):
                 if not validated_data.get('p_phone'):
                      validated_data['p_phone'] = ''
         
-        return super().create(validated_data)
+        booking = super().create(validated_data)
+        # The booking now occupies the slot; release the hold on it
+        if hold_token:
+            SlotHold.objects.filter(token=hold_token).delete()
+        elif booking.user_id:
+            SlotHold.objects.filter(
+                doctor_id=booking.doc_name_id,
+                date=booking.booking_date,
+                user_id=booking.user_id,
+            ).delete()
+        return booking
+
+    def update(self, instance, validated_data):
+        validated_data.pop('hold_token', None)
+        return super().update(instance, validated_data)
 
 
 class BookingListSerializer(serializers.ModelSerializer):
@@ -0,0 +1,100 @@
+"""
+Server-sent event streams fed by bookings.live.
+
+GET /api/stream/slots/<doctor_id>/<YYYY-MM-DD>/   slot_taken / slot_freed (public)
+GET /api/stream/doctor/<doctor_id>/?token=<JWT>   booking_status (that doctor or an admin)
+
+These are plain async Django views rather than DRF views: under ASGI
+(django_tutorial/asgi.py) each listener is a coroutine waiting on a queue,
+not a worker thread. EventSource cannot send headers, so the doctor stream
+takes the access token as a query parameter.
+"""
+import asyncio
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from bookings.live import doctor_channel, get_broker, slot_channel
+from doctors.models import Doctors
+from .principal import Principal
+
+
+HEARTBEAT_SECONDS = 15
+# Streams end after this long and EventSource reconnects by itself, so a
+# listener whose client went away is released within a bounded time
+STREAM_SECONDS = 300
+
+
+async def _event_stream(channel):
+    broker = get_broker()
+    queue = broker.subscribe(channel)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + STREAM_SECONDS
+    try:
+        yield 'retry: 3000\n\n'
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                event, data = await asyncio.wait_for(
+                    queue.get(), timeout=min(HEARTBEAT_SECONDS, remaining)
+                )
+            except asyncio.TimeoutError:
+                yield ': keep-alive\n\n'
+                continue
+            yield f'event: {event}\ndata: {data}\n\n'
+    finally:
+        broker.unsubscribe(channel, queue)
+
+
+def _sse_response(channel):
+    response = StreamingHttpResponse(_event_stream(channel), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx-style proxies from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _method_not_allowed():
+    return JsonResponse({'detail': 'Method not allowed.'}, status=405)
+
+
+async def slot_stream(request, doctor_id, day):
+    """Slot taken/freed events for one doctor on one date."""
+    if request.method != 'GET':
+        return _method_not_allowed()
+    try:
+        day = datetime.strptime(day, '%Y-%m-%d').date()
+    except ValueError:
+        return JsonResponse({'error': 'Invalid date format. Use YYYY-MM-DD'}, status=400)
+    if not await Doctors.objects.filter(pk=doctor_id).aexists():
+        return JsonResponse({'detail': 'Not found.'}, status=404)
+    return _sse_response(slot_channel(doctor_id, day))
+
+
+def _may_watch_doctor(token, doctor_id):
+    """True if the access token belongs to that doctor or to an admin."""
+    try:
+        user_id = AccessToken(token)['user_id']
+    except (TokenError, KeyError):
+        return False
+    user = User.objects.filter(pk=user_id, is_active=True).first()
+    if user is None:
+        return False
+    principal = Principal(user)
+    return principal.is_admin or principal.doctor_id == doctor_id
+
+
+async def doctor_stream(request, doctor_id):
+    """Booking status events for one doctor's dashboard."""
+    if request.method != 'GET':
+        return _method_not_allowed()
+    token = request.GET.get('token', '')
+    if not await sync_to_async(_may_watch_doctor)(token, doctor_id):
+        return JsonResponse(
+            {'detail': 'A valid access token for this doctor or an admin is required.'},
+            status=403,
+        )
+    return _sse_response(doctor_channel(doctor_id))
@@ -0,0 +1,88 @@
+from datetime import date, time, timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.views import DoctorViewSet
+from bookings.models import Booking
+from bookings.slots import load_slot_index, place_hold
+from doctors.models import Departments, DoctorAvailability, Doctors
+
+
+class AsyncViewTests(TestCase):
+    """The async read views, driven on an event loop like under ASGI."""
+
+    @classmethod
+    def setUpTestData(cls):
+        department = Departments.objects.create(dep_name='Async', dep_decription='Async')
+        cls.doctor = Doctors.objects.create(
+            user=User.objects.create(username='async-doctor', password='!', is_staff=True),
+            doc_name='Async Doctor', doc_spec='General', dep_name=department,
+        )
+        for day in range(7):
+            DoctorAvailability.objects.create(doctor=cls.doctor, day=day, start_time=time(9), end_time=time(10))
+        cls.patient = User.objects.create(username='async-patient', password='!')
+        other = User.objects.create(username='async-other', password='!')
+        cls.day = date.today() + timedelta(days=2)
+        Booking.objects.create(
+            user=other, p_name='Async Other', p_email='async@example.com', doc_name=cls.doctor,
+            booking_date=cls.day, appointment_time=time(9),
+        )
+        row = load_slot_index([cls.doctor], cls.day, cls.day)[(cls.doctor.id, cls.day)]
+        place_hold(row, time(9, 20), other)
+        place_hold(row, time(9, 40), cls.patient)
+
+    def headers(self, user):
+        return {'Authorization': f'Bearer {AccessToken.for_user(user)}'}
+
+    async def test_available_slots(self):
+        url = f'/api/doctors/{self.doctor.pk}/available_slots/'
+        response = await self.async_client.get(url, {'date': self.day.isoformat()}, headers=self.headers(self.patient))
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        # The patient's own hold is still theirs to book
+        self.assertEqual(
+            [(slot['time'], slot['status']) for slot in body['slots']],
+            [('09:00', 'booked'), ('09:20', 'held'), ('09:40', 'available')],
+        )
+        self.assertEqual((body['available_slots'], body['held_slots']), (1, 1))
+
+        response = await self.async_client.get(url, {'date': self.day.isoformat()})
+        self.assertEqual(response.json()['available_slots'], 0)
+
+    async def test_available_slots_errors(self):
+        url = f'/api/doctors/{self.doctor.pk}/available_slots/'
+        response = await self.async_client.get(url, {'date': 'soon'})
+        self.assertEqual(response.status_code, 400)
+        response = await self.async_client.get(
+            url, {'date': self.day.isoformat()}, headers={'Authorization': 'Bearer not-a-token'}
+        )
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('WWW-Authenticate', response)
+        response = await self.async_client.post(url)
+        self.assertEqual((response.status_code, response['Allow']), (405, 'GET'))
+
+    async def test_doctor_dashboard(self):
+        response = await self.async_client.get('/api/dashboard/stats/', headers=self.headers(self.doctor.user))
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((body['role'], body['doctor_name']), ('doctor', 'Async Doctor'))
+        self.assertEqual((body['total_appointments'], body['upcoming_appointments']), (1, 1))
+
+        response = await self.async_client.get('/api/dashboard/stats/')
+        self.assertEqual(response.status_code, 401)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    async def test_catalog_hits_skip_drf(self):
+        await cache.aclear()
+        miss = await self.async_client.get('/api/doctors/')
+        self.assertEqual(miss['X-Cache'], 'MISS')
+
+        with mock.patch.object(DoctorViewSet, 'list') as drf_list:
+            hit = await self.async_client.get('/api/doctors/')
+        drf_list.assert_not_called()
+        self.assertEqual(hit['X-Cache'], 'HIT')
+        self.assertEqual(hit.json(), miss.json())
@@ -0,0 +1,73 @@
+from datetime import date, datetime, time, timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.utils.http import http_date
+
+from doctors.cache import catalog_version
+from doctors.models import Departments, Doctors
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class CatalogValidatorTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.department = Departments.objects.create(dep_name='Catalog', dep_decription='Catalog')
+
+    def test_last_modified_after_a_cache_flush_is_the_newest_update(self):
+        updated = timezone.now() - timedelta(minutes=1)
+        Departments.objects.filter(pk=self.department.pk).update(updated_at=updated)
+        cache.clear()
+
+        response = self.client.get('/api/departments/')
+        midnight = datetime.combine(date.today(), time.min).timestamp()
+        self.assertEqual(response['Last-Modified'], http_date(int(max(updated.timestamp(), midnight))))
+
+    def test_etag_wins_over_last_modified(self):
+        first = self.client.get('/api/departments/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Departments.objects.create(dep_name='Second', dep_decription='Catalog')
+
+        # Same second, so If-Modified-Since alone would wrongly say unchanged
+        response = self.client.get(
+            '/api/departments/',
+            HTTP_IF_NONE_MATCH=first['ETag'], HTTP_IF_MODIFIED_SINCE=first['Last-Modified'],
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class CatalogUserInvalidationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        department = Departments.objects.create(dep_name='Catalog', dep_decription='Catalog')
+        cls.doctor_user = User.objects.create(username='catalog-doctor', password='!', is_staff=True)
+        Doctors.objects.create(user=cls.doctor_user, doc_name='Catalog Doctor', doc_spec='General', dep_name=department)
+        cls.patient = User.objects.create(username='catalog-patient', password='!')
+
+    def setUp(self):
+        cache.clear()
+        self.version = catalog_version()
+
+    def save(self, user, **changes):
+        user = User.objects.get(pk=user.pk)
+        for field, value in changes.items():
+            setattr(user, field, value)
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+        return catalog_version() != self.version
+
+    def test_patient_changes_keep_the_catalog(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.create(username='catalog-signup', password='!')
+        self.assertFalse(self.save(self.patient, email='patient@example.com', first_name='Pat'))
+        self.assertEqual(catalog_version(), self.version)
+
+    def test_doctor_login_and_name_keep_the_catalog(self):
+        self.assertFalse(self.save(self.doctor_user, last_login=timezone.now(), first_name='Doc'))
+
+    def test_doctor_email_flushes_the_catalog(self):
+        self.assertTrue(self.save(self.doctor_user, email='doctor@example.com'))
@@ -0,0 +1,59 @@
+from datetime import date, time, timedelta
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from bookings.models import Booking, DashboardCounter
+from doctors.models import Departments, Doctors
+
+
+class DashboardCounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        department = Departments.objects.create(dep_name='Counters', dep_decription='Counters')
+        cls.doctor = Doctors.objects.create(
+            user=User.objects.create(username='counters-doctor', password='!', is_staff=True),
+            doc_name='Counters Doctor', doc_spec='General', dep_name=department,
+        )
+        cls.patient = User.objects.create(username='counters-patient', password='!')
+        for days, status in [(-3, 'completed'), (2, 'pending'), (5, 'accepted'), (6, 'cancelled')]:
+            Booking.objects.create(
+                user=cls.patient, p_name='Counters Patient', p_email='counters@example.com',
+                doc_name=cls.doctor, booking_date=date.today() + timedelta(days=days),
+                appointment_time=time(9), status=status,
+            )
+
+    def reconcile(self, **options):
+        out = StringIO()
+        call_command('reconcile_dashboard_counters', stdout=out, **options)
+        return out.getvalue()
+
+    def test_patients_only_have_a_totals_row(self):
+        rows = DashboardCounter.objects.filter(scope='user', scope_id=self.patient.id)
+        self.assertEqual([(row.date, row.total) for row in rows], [(None, 4)])
+
+    def test_patient_dashboard(self):
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {AccessToken.for_user(self.patient)}'
+        response = self.client.get('/api/dashboard/stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'role': 'patient', 'total_bookings': 4, 'pending_bookings': 1, 'accepted_bookings': 1,
+            'upcoming_bookings': 2,
+        })
+
+    def test_reconcile_fixes_drift(self):
+        self.assertIn('No drift', self.reconcile(dry_run=True))
+        DashboardCounter.objects.filter(scope='doctor', date=None).update(pending=7)
+        DashboardCounter.objects.filter(scope='global', date=date.today() + timedelta(days=5)).delete()
+        DashboardCounter.objects.create(scope='doctor', scope_id=self.doctor.id, date=date.today(), pending=1)
+
+        out = self.reconcile(dry_run=True)
+        self.assertIn('3 counter rows drifted', out)
+        self.assertIn('doctor:%d all time: pending 7 -> 1' % self.doctor.id, out)
+
+        self.assertIn('Fixed 3 drifted counter rows', self.reconcile())
+        self.assertIn('No drift', self.reconcile(dry_run=True))
+        self.assertFalse(DashboardCounter.objects.filter(date=date.today()).exists())
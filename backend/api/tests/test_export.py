@@ -0,0 +1,128 @@
+import asyncio
+import json
+from datetime import date, time, timedelta
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIHandler
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections
+from django.test import TestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api import export
+from bookings.models import Booking
+from doctors.models import Departments, Doctors
+
+
+class BookingExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        department = Departments.objects.create(dep_name='Export', dep_decription='Export')
+        doctor = Doctors.objects.create(
+            user=User.objects.create(username='export-doctor', password='!', is_staff=True),
+            doc_name='Export Doctor', doc_spec='General', dep_name=department,
+        )
+        cls.patient = User.objects.create(username='export-patient', password='!')
+        cls.booking = Booking.objects.create(
+            user=cls.patient, p_name='Export Patient', p_email='export@example.com', doc_name=doctor,
+            booking_date=date.today() + timedelta(days=3), appointment_time=time(9),
+        )
+
+    def setUp(self):
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {AccessToken.for_user(self.patient)}'
+
+    def test_csv_by_default(self):
+        response = self.client.get('/api/bookings/export/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertTrue(lines[0].startswith('id,patient_name,'))
+        self.assertEqual(len(lines), 2)
+
+    def test_ndjson(self):
+        response = self.client.get('/api/bookings/export/?as=ndjson')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['id'] for row in rows], [self.booking.id])
+
+    def test_unknown_format_is_rejected(self):
+        response = self.client.get('/api/bookings/export/?as=xml')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'as must be one of: csv, ndjson'})
+
+
+
+class AsgiExportTests(TestCase):
+    """The export served by Django's ASGI handler, as under uvicorn."""
+
+    @classmethod
+    def setUpTestData(cls):
+        department = Departments.objects.create(dep_name='Export', dep_decription='Export')
+        doctor = Doctors.objects.create(
+            user=User.objects.create(username='export-doctor', password='!', is_staff=True),
+            doc_name='Export Doctor', doc_spec='General', dep_name=department,
+        )
+        cls.patient = User.objects.create(username='export-patient', password='!')
+        for day in range(3, 23):
+            Booking.objects.create(
+                user=cls.patient, p_name='Export Patient', p_email='export@example.com', doc_name=doctor,
+                booking_date=date.today() + timedelta(days=day), appointment_time=time(9),
+            )
+
+    def get(self, path, query_string, send):
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': query_string,
+            'headers': [
+                (b'host', b'testserver'),
+                (b'authorization', f'Bearer {AccessToken.for_user(self.patient)}'.encode()),
+            ],
+            'client': ('127.0.0.1', 50000), 'server': ('testserver', 80),
+        }
+        requests = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+
+        async def receive():
+            if requests:
+                return requests.pop()
+            await asyncio.Event().wait()
+
+        # Like the test client: keep the test transaction's connection open
+        request_started.disconnect(close_old_connections)
+        request_finished.disconnect(close_old_connections)
+        try:
+            async_to_sync(ASGIHandler())(scope, receive, send)
+        finally:
+            request_started.connect(close_old_connections)
+            request_finished.connect(close_old_connections)
+
+    def test_rows_go_out_before_the_query_is_done(self):
+        read = {'rows': 0, 'done': False}
+
+        def counted_lines(queryset):
+            for line in export._ndjson_lines(queryset):
+                read['rows'] += 1
+                yield line
+            read['done'] = True
+
+        sent = []
+        # How far the export had read when each body message went out
+        read_when_sent = []
+
+        async def send(message):
+            sent.append(message)
+            if message.get('body'):
+                read_when_sent.append(dict(read))
+
+        streams = {'ndjson': (counted_lines, 'application/x-ndjson')}
+        with mock.patch.dict(export.STREAMS, streams), mock.patch.object(export, 'CHUNK_SIZE', 5), \
+                mock.patch.object(export, 'ASYNC_CHUNK_BYTES', 1):
+            self.get('/api/bookings/export/', b'as=ndjson', send)
+
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertEqual(read_when_sent[0], {'rows': 1, 'done': False})
+        body = b''.join(message.get('body', b'') for message in sent[1:])
+        self.assertEqual(len(body.splitlines()), 20)
+        self.assertTrue(read['done'])
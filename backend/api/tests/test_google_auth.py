@@ -0,0 +1,115 @@
+import json
+import time
+from unittest import mock
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from jwt.algorithms import RSAAlgorithm
+
+from api.google_auth import GoogleKeyProvider, InvalidGoogleToken, verify_id_token
+
+
+CLIENT_ID = 'test-client.apps.googleusercontent.com'
+
+
+def _signing_key(kid):
+    """(private key, public JWK) of a fresh RSA key."""
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = json.loads(RSAAlgorithm.to_jwk(private_key.public_key()))
+    jwk.update(kid=kid, alg='RS256', use='sig')
+    return private_key, jwk
+
+
+KEY, JWK = _signing_key('key-1')
+NEXT_KEY, NEXT_JWK = _signing_key('key-2')
+
+
+def _token(key=KEY, kid='key-1', **claims):
+    now = int(time.time())
+    payload = {
+        'iss': 'https://accounts.google.com', 'aud': CLIENT_ID, 'sub': '1234567890',
+        'iat': now, 'exp': now + 3600,
+        'email': 'google-user@example.com', 'email_verified': True,
+        'given_name': 'Google', 'family_name': 'User',
+        **claims,
+    }
+    return jwt.encode(payload, key, algorithm='RS256', headers={'kid': kid})
+
+
+@override_settings(
+    GOOGLE_CLIENT_IDS=[CLIENT_ID],
+    GOOGLE_KEY_PROVIDER='api.google_auth.LocalKeyProvider',
+    GOOGLE_JWKS={'keys': [JWK]},
+)
+class GoogleLoginTests(TestCase):
+    def login(self, token):
+        return self.client.post('/api/auth/google/', {'token': token}, content_type='application/json')
+
+    def assertRejected(self, token, error='Invalid Google token'):
+        response = self.login(token)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': error})
+        self.assertFalse(User.objects.filter(email='google-user@example.com').exists())
+
+    def test_valid_token_signs_up(self):
+        response = self.login(_token())
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['user']['email'], 'google-user@example.com')
+        self.assertEqual(body['user']['first_name'], 'Google')
+        self.assertIn('access', body)
+        self.assertTrue(User.objects.filter(email='google-user@example.com').exists())
+
+    def test_other_audience(self):
+        self.assertRejected(_token(aud='someone-else.apps.googleusercontent.com'))
+
+    def test_other_issuer(self):
+        self.assertRejected(_token(iss='https://accounts.example.com'))
+
+    def test_expired(self):
+        issued = int(time.time()) - 7200
+        self.assertRejected(_token(iat=issued, exp=issued + 3600))
+
+    def test_unknown_key(self):
+        self.assertRejected(_token(key=NEXT_KEY, kid='key-2'))
+
+    def test_signed_with_another_key(self):
+        # Right kid, wrong signature
+        self.assertRejected(_token(key=NEXT_KEY))
+
+    def test_unverified_email(self):
+        self.assertRejected(_token(email_verified=False), error='Google account email is not verified')
+
+
+@override_settings(
+    GOOGLE_CLIENT_IDS=[CLIENT_ID],
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class GoogleKeyRotationTests(TestCase):
+    def keyset(self, *jwks):
+        response = mock.Mock(headers={'Cache-Control': 'public, max-age=20000'})
+        response.json.return_value = {'keys': list(jwks)}
+        return response
+
+    def test_unknown_key_refetches_once(self):
+        provider = GoogleKeyProvider()
+        provider.MIN_FETCH_INTERVAL = 0
+        with mock.patch('api.google_auth.get_key_provider', return_value=provider), \
+                mock.patch('api.google_auth.requests.get') as get:
+            get.return_value = self.keyset(JWK)
+            self.assertEqual(verify_id_token(_token())['sub'], '1234567890')
+            self.assertEqual(get.call_count, 1)
+            # Cached: no fetch for the next login
+            verify_id_token(_token())
+            self.assertEqual(get.call_count, 1)
+
+            # Google rotated early: a token with the new kid forces one fetch
+            get.return_value = self.keyset(JWK, NEXT_JWK)
+            self.assertEqual(verify_id_token(_token(key=NEXT_KEY, kid='key-2'))['sub'], '1234567890')
+            self.assertEqual(get.call_count, 2)
+
+            # A kid Google doesn't have either is still refused
+            with self.assertRaises(InvalidGoogleToken):
+                verify_id_token(_token(kid='key-3'))
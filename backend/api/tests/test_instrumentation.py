@@ -0,0 +1,61 @@
+import json
+import re
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from api.instrumentation import install, uninstall
+from doctors.models import Departments, Doctors
+
+
+@override_settings(
+    MIDDLEWARE=['api.middleware.ServerTimingMiddleware', *settings.MIDDLEWARE],
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+    SERVER_TIMING_REPEAT_THRESHOLD=1000,
+    SERVER_TIMING_SLOW_MS=60000,
+)
+class ServerTimingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        department = Departments.objects.create(dep_name='Timing', dep_decription='Timing')
+        Doctors.objects.create(
+            user=User.objects.create(username='timing-doctor', password='!', is_staff=True),
+            doc_name='Timing Doctor', doc_spec='General', dep_name=department,
+        )
+
+    def setUp(self):
+        # Leave the hooks alone if SERVER_TIMING installed them for the whole run
+        if install():
+            self.addCleanup(uninstall)
+
+    def test_header(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/doctors/')
+        self.assertEqual(response.status_code, 200)
+        timings = dict(re.findall(r'(\w+);dur=([\d.]+)', response['Server-Timing']))
+        self.assertEqual(set(timings), {'db', 'serialize', 'view', 'total'})
+        self.assertIn(f'desc="{len(queries)} queries"', response['Server-Timing'])
+        self.assertLessEqual(float(timings['view']), float(timings['total']))
+
+    def test_repeated_queries_are_logged(self):
+        with self.assertNoLogs('api.timing'):
+            self.client.get('/api/doctors/')
+
+        # With a threshold of 1 every query counts as repeated
+        with override_settings(SERVER_TIMING_REPEAT_THRESHOLD=1), \
+                self.assertLogs('api.timing', 'WARNING') as logs:
+            self.client.get('/api/doctors/')
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(
+            (line['event'], line['path'], line['view']), ('n_plus_one', '/api/doctors/', 'DoctorViewSet.list')
+        )
+        # Only the worst few shapes go in the log line
+        self.assertEqual(len(line['repeated_queries']), 3)
+        self.assertTrue(all(query['sql'].startswith('SELECT') for query in line['repeated_queries']))
+
+    @override_settings(MIDDLEWARE=settings.MIDDLEWARE)
+    def test_off_by_default(self):
+        self.assertNotIn('Server-Timing', self.client.get('/api/doctors/'))
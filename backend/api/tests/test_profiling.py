@@ -0,0 +1,69 @@
+import threading
+import time
+from unittest import mock
+
+from asgiref.sync import SyncToAsync, async_to_sync, sync_to_async
+from django.test import SimpleTestCase
+
+from api.profiling import Capture, Sampler, current_capture, install, uninstall
+
+
+def _spin(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+class AsyncThreadTrackingTests(SimpleTestCase):
+    def setUp(self):
+        self.assertTrue(install())
+        self.addCleanup(uninstall)
+
+    def test_sync_to_async_threads_join_the_capture(self):
+        capture = Capture(threading.get_ident(), sampled=True)
+        seen = []
+
+        def work():
+            seen.append((threading.get_ident(), dict(capture.threads)))
+
+        async def request():
+            token = current_capture.set(capture)
+            try:
+                await sync_to_async(work, thread_sensitive=False)()
+            finally:
+                current_capture.reset(token)
+
+        async_to_sync(request)()
+        thread_id, threads = seen[0]
+        self.assertIn(thread_id, threads)
+        # Unregistered once the call returned
+        self.assertNotIn(thread_id, capture.threads)
+
+    def test_uninstall_restores_asgiref(self):
+        tracked = SyncToAsync.thread_handler
+        uninstall()
+        self.assertIs(SyncToAsync.thread_handler, tracked.__wrapped__)
+
+    def test_changed_thread_handler_is_left_alone(self):
+        uninstall()
+
+        def thread_handler(self, loop, source_task, exc_info, func, *args, **kwargs):
+            pass
+
+        with mock.patch.object(SyncToAsync, 'thread_handler', thread_handler), \
+                self.assertLogs('api.profiling', 'WARNING'):
+            self.assertFalse(install())
+            self.assertIs(SyncToAsync.thread_handler, thread_handler)
+
+    def test_other_busy_threads_are_not_sampled(self):
+        stop = threading.Event()
+        other = threading.Thread(target=_spin, args=(stop,))
+        other.start()
+        try:
+            time.sleep(0.01)
+            capture = Capture(threading.get_ident(), sampled=True)
+            Sampler._sample([capture], me=None)
+        finally:
+            stop.set()
+            other.join()
+        self.assertTrue(capture.stacks)
+        self.assertFalse(any('_spin' in stack for stack in capture.stacks))
@@ -0,0 +1,368 @@
+"""
+N+1 regression tests: every list/detail endpoint must run the same number
+of queries with N and with 10xN rows behind it.
+
+BookingQueryCountTests also pins the exact count of the booking list and
+detail for each role, so a new per-request query shows up too.
+
+Run with `python manage.py test api` (or `manage.py check_query_counts`).
+The catalog cache is disabled, so catalog endpoints hit the database.
+"""
+import re
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.tokens import AccessToken
+
+from bookings.models import Booking
+from core.models import Contact
+from doctors.models import Departments, DepartmentBlog, DoctorAvailability, DoctorLeave, Doctors
+from api.instrumentation import sql_shape
+from api.pagination import OptInCursorPagination
+
+
+# (label, who asks, URL); {placeholders} are filled from the fixtures
+ENDPOINTS = [
+    ('doctors', None, '/api/doctors/'),
+    ('doctor detail', None, '/api/doctors/{doctor}/'),
+    ('doctor availability', None, '/api/doctors/{doctor}/availability/'),
+    ('doctor leaves', None, '/api/doctors/{doctor}/leaves/'),
+    ('doctor slots', None, '/api/doctors/{doctor}/available_slots/?date={slot_date}'),
+    ('doctor slot range', None, '/api/doctors/{doctor}/available_slots_range/'),
+    ('next available', None, '/api/doctors/next_available/'),
+    ('departments', None, '/api/departments/'),
+    ('department detail', None, '/api/departments/{department}/'),
+    ('department blogs', None, '/api/department-blogs/'),
+    ('bookings', 'admin', '/api/bookings/'),
+    ('bookings', 'doctor', '/api/bookings/'),
+    ('bookings', 'patient', '/api/bookings/'),
+    ('bookings by cursor', 'admin', '/api/bookings/?cursor='),
+    ('booking detail', 'admin', '/api/bookings/{booking}/'),
+    ('users', 'admin', '/api/users/'),
+    ('user detail', 'admin', '/api/users/{patient}/'),
+    ('leaves', 'admin', '/api/doctor-leaves/'),
+    ('leaves', 'doctor', '/api/doctor-leaves/'),
+    ('availability', 'admin', '/api/doctor-availability/'),
+    ('availability', 'doctor', '/api/doctor-availability/'),
+    ('contacts', 'admin', '/api/contacts/'),
+    ('dashboard stats', 'admin', '/api/dashboard/stats/'),
+    ('dashboard stats', 'doctor', '/api/dashboard/stats/'),
+    ('dashboard stats', 'patient', '/api/dashboard/stats/'),
+    ('profile', 'patient', '/api/auth/profile/'),
+]
+
+STATUSES = ['pending', 'accepted', 'completed', 'cancelled']
+SLOTS_PER_DAY = 9  # 09:00-12:00 in 20-minute slots
+# Rows of each kind in the small data set; the large one has 10x
+N = 5
+# Quoted strings and numbers in the captured SQL (the parameters are filled in)
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def _shape(sql):
+    return sql_shape(_LITERAL.sub('%s', sql))
+
+
+def _user(name, **extra):
+    # '!' is an unusable password: no hashing, and nobody can log in as these
+    return User.objects.create(username=f'qc-{name}', password='!', **extra)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class QueryCountTestCase(TestCase):
+    """The department, doctor, patient and booking every endpoint is asked about."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Departments.objects.create(dep_name='Query check', dep_decription='Query check')
+        cls.doctor = Doctors.objects.create(
+            user=_user('doctor', is_staff=True), doc_name='Query Check', doc_spec='General',
+            dep_name=cls.department,
+        )
+        for day in range(5):
+            DoctorAvailability.objects.create(doctor=cls.doctor, day=day, start_time=time(9), end_time=time(12))
+        cls.patient = _user('patient')
+        cls.admin = _user('admin', is_staff=True, is_superuser=True)
+
+        cls.slot_date = date.today() + timedelta(days=1)
+        while cls.slot_date.weekday() >= 5:
+            cls.slot_date += timedelta(days=1)
+        cls.booking = Booking.objects.create(
+            user=cls.patient, p_name='Query Check', p_email='qc@example.com', doc_name=cls.doctor,
+            booking_date=cls.slot_date + timedelta(days=60), appointment_time=time(9),
+        )
+
+    def setUp(self):
+        self.clients = {
+            role: self._client(user)
+            for role, user in ((None, None), ('admin', self.admin), ('doctor', self.doctor.user),
+                               ('patient', self.patient))
+        }
+
+    def _client(self, user):
+        client = Client()
+        if user is not None:
+            client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {AccessToken.for_user(user)}'
+        return client
+
+    def _url(self, url):
+        return url.format(
+            doctor=self.doctor.pk, department=self.department.pk, booking=self.booking.pk,
+            patient=self.patient.pk, slot_date=self.slot_date,
+        )
+
+    def grow(self, start, end):
+        """Add rows start..end-1 of each kind, spread over the fixtures and new owners."""
+        today = date.today()
+        for i in range(start, end):
+            other_department = Departments.objects.create(dep_name=f'Dept {i}', dep_decription='Query check')
+            other_doctor = Doctors.objects.create(
+                user=_user(f'doctor-{i}', is_staff=True), doc_name=f'Doctor {i}', doc_spec='General',
+                dep_name=self.department if i % 2 else other_department,
+            )
+            for day in range(5):
+                DoctorAvailability.objects.create(
+                    doctor=other_doctor, day=day, start_time=time(9), end_time=time(12)
+                )
+            DoctorLeave.objects.create(doctor=self.doctor, date=today + timedelta(days=70 + i), reason='Query check')
+            DoctorLeave.objects.create(doctor=other_doctor, date=today + timedelta(days=1), reason='Query check')
+
+            other_patient = _user(f'patient-{i}')
+            # A fresh slot of the fixture doctor, and one of the new doctor for the fixture patient
+            slot = datetime.combine(today, time(9)) + timedelta(minutes=20 * (i % SLOTS_PER_DAY))
+            Booking.objects.create(
+                user=other_patient, p_name=f'Patient {i}', p_email='qc@example.com', doc_name=self.doctor,
+                booking_date=self.slot_date + timedelta(days=i // SLOTS_PER_DAY),
+                appointment_time=slot.time(), status=STATUSES[i % len(STATUSES)],
+            )
+            Booking.objects.create(
+                user=self.patient, p_name='Query Check', p_email='qc@example.com', doc_name=other_doctor,
+                booking_date=today + timedelta(days=1 + i % 30), appointment_time=time(9),
+                status=STATUSES[i % len(STATUSES)],
+            )
+            Contact.objects.create(name=f'Visitor {i}', email='qc@example.com', subject='Query check', message='-')
+            DepartmentBlog.objects.create(department=self.department, title=f'Post {i}', content='Query check')
+
+    def measure(self):
+        """{(label, role): (status code, [sql])} for every endpoint."""
+        results = {}
+        for label, role, url in ENDPOINTS:
+            client = self.clients[role]
+            url = self._url(url)
+            # Warm up first, so one-off work (building slot index rows) isn't counted
+            client.get(url)
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(url)
+            results[(label, role)] = (response.status_code, [query['sql'] for query in queries])
+        return results
+
+
+class QueryCountsDoNotGrowTests(QueryCountTestCase):
+    def test_query_counts_do_not_grow_with_data(self):
+        self.grow(0, N)
+        small = self.measure()
+        self.grow(N, 10 * N)
+        large = self.measure()
+
+        for label, role, _ in ENDPOINTS:
+            with self.subTest(endpoint=label, role=role or 'anon'):
+                small_status, small_sql = small[(label, role)]
+                large_status, large_sql = large[(label, role)]
+                self.assertEqual((small_status, large_status), (200, 200))
+                small_shapes = Counter(_shape(sql) for sql in small_sql)
+                grown = [
+                    f'{small_shapes[shape]} -> {count}x {shape}'
+                    for shape, count in Counter(_shape(sql) for sql in large_sql).most_common()
+                    if count > small_shapes[shape]
+                ]
+                self.assertLessEqual(
+                    len(large_sql), len(small_sql),
+                    f'{len(small_sql)} queries with N={N}, {len(large_sql)} with N={10 * N}:\n' + '\n'.join(grown),
+                )
+
+
+class BookingQueryCountTests(QueryCountTestCase):
+    # Every request: the JWT user, then (not for superusers) the principal's
+    # doctor profile and admin permissions
+    LIST = {'admin': 3, 'doctor': 4, 'patient': 4}  # + count, page
+    # + booking, department, leave today?, working today?, availabilities, patient user
+    DETAIL = {'admin': 7, 'doctor': 8, 'patient': 8}
+
+    def setUp(self):
+        super().setUp()
+        self.grow(0, N)
+
+    def test_booking_list(self):
+        for role, queries in self.LIST.items():
+            with self.subTest(role=role), self.assertNumQueries(queries):
+                self.assertEqual(self.clients[role].get('/api/bookings/').status_code, 200)
+
+    def test_booking_detail(self):
+        for role, queries in self.DETAIL.items():
+            with self.subTest(role=role), self.assertNumQueries(queries):
+                response = self.clients[role].get(f'/api/bookings/{self.booking.pk}/')
+                self.assertEqual(response.status_code, 200)
+
+
+class UserQueryCountTests(QueryCountTestCase):
+    """The users list and the two auth views all get the role from with_role()'s annotation."""
+    LIST = 3  # JWT user, count, page
+    PROFILE = 2  # JWT user, annotated user
+    GOOGLE_LOGIN = 1  # annotated user
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # Patients, every third one also a doctor's account (the newest one, too)
+        for i in range(24):
+            user = _user(f'listed-{i}')
+            if i % 3 == 2:
+                Doctors.objects.create(user=user, doc_name=f'Listed {i}', doc_spec='General', dep_name=cls.department)
+        cls.doctor_account = User.objects.get(username='qc-listed-2')
+
+    def test_user_list(self):
+        for page_size in (2, 20):
+            with self.subTest(page_size=page_size), \
+                    mock.patch.object(OptInCursorPagination, 'page_size', page_size), \
+                    self.assertNumQueries(self.LIST):
+                response = self.clients['admin'].get('/api/users/')
+            self.assertEqual(len(response.json()['results']), page_size)
+            self.assertEqual(
+                {user['role'] for user in response.json()['results']}, {'doctor', 'patient'}
+            )
+
+    def test_profile(self):
+        client = self._client(self.doctor_account)
+        with self.assertNumQueries(self.PROFILE):
+            response = client.get('/api/auth/profile/')
+        self.assertEqual(response.json()['role'], 'doctor')
+
+    def test_google_login(self):
+        claims = {'email': 'qc-google@example.com', 'email_verified': True}
+        User.objects.filter(pk=self.doctor_account.pk).update(email=claims['email'])
+        with mock.patch('api.async_views.verify_id_token', return_value=claims), \
+                self.assertNumQueries(self.GOOGLE_LOGIN):
+            response = self.client.post('/api/auth/google/', {'token': 'x'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['user']['role'], 'doctor')
+
+
+class DoctorStatusTests(QueryCountTestCase):
+    """current_status comes from with_current_status()'s annotations, on the list and detail alike."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        today = date.today()
+        cls.present, cls.absent, cls.off = (
+            Doctors.objects.create(
+                user=_user(f'status-{name}'), doc_name=f'Status {name}', doc_spec='General',
+                dep_name=cls.department,
+            )
+            for name in ('present', 'absent', 'off')
+        )
+        for doctor in (cls.present, cls.absent):
+            DoctorAvailability.objects.create(
+                doctor=doctor, day=today.weekday(), start_time=time(9), end_time=time(12)
+            )
+        # Scheduled elsewhere in the week only
+        DoctorAvailability.objects.create(
+            doctor=cls.off, day=(today.weekday() + 1) % 7, start_time=time(9), end_time=time(12)
+        )
+        DoctorLeave.objects.create(doctor=cls.absent, date=today, reason='Query check')
+        # Yesterday's leave doesn't count
+        DoctorLeave.objects.create(doctor=cls.present, date=today - timedelta(days=1), reason='Query check')
+
+    def statuses(self):
+        response = self.client.get('/api/doctors/', {'dep_name': self.department.pk})
+        return {doctor['id']: doctor['current_status'] for doctor in response.json()['results']}
+
+    def test_list_and_detail(self):
+        expected = {self.present.pk: 'Present', self.absent.pk: 'Absent', self.off.pk: 'Not Scheduled'}
+        statuses = self.statuses()
+        self.assertEqual({pk: statuses[pk] for pk in expected}, expected)
+        for pk, status in expected.items():
+            with self.subTest(doctor=pk):
+                self.assertEqual(self.client.get(f'/api/doctors/{pk}/').json()['current_status'], status)
+
+    def test_leave_taken_today(self):
+        DoctorLeave.objects.create(doctor=self.present, date=date.today(), reason='Query check')
+        self.assertEqual(self.statuses()[self.present.pk], 'Absent')
+
+
+class PrincipalTests(QueryCountTestCase):
+    """Role checks read request.principal, which looks the doctor profile up once per request."""
+
+    def links_queries(self, queries):
+        return [query for query in queries if 'allowed_modules' in query['sql']]
+
+    def test_role_is_resolved_once_per_request(self):
+        url = f'/api/bookings/{self.booking.pk}/update_status/'
+        response = self.clients['patient'].post(url, {'status': 'accepted'}, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.clients['doctor'].post(url, {'status': 'accepted'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['booking']['status'], 'accepted')
+        # get_queryset and update_status both asked
+        self.assertEqual(len(self.links_queries(queries)), 1)
+
+    def test_doctors_save_schedules_as_themselves(self):
+        other = Doctors.objects.create(
+            user=_user('principal-other', is_staff=True), doc_name='Other', doc_spec='General',
+            dep_name=self.department,
+        )
+        response = self.clients['doctor'].post(
+            '/api/doctor-availability/',
+            {'doctor': other.pk, 'day': 5, 'start_time': '09:00', 'end_time': '12:00'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['doctor_id'], self.doctor.pk)
+        self.assertFalse(other.availabilities.exists())
+
+
+class LeaveListingTests(QueryCountTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other_department = Departments.objects.create(dep_name='Leave check', dep_decription='Query check')
+        cls.other_doctor = Doctors.objects.create(
+            user=_user('leave-doctor', is_staff=True), doc_name='Leave Check', doc_spec='General',
+            dep_name=cls.other_department,
+        )
+        cls.first_day = date.today() + timedelta(days=10)
+        for days in range(4):
+            for doctor in (cls.doctor, cls.other_doctor):
+                DoctorLeave.objects.create(
+                    doctor=doctor, date=cls.first_day + timedelta(days=days), reason='Query check'
+                )
+
+    def leaves(self, role, **params):
+        response = self.clients[role].get('/api/doctor-leaves/', params)
+        self.assertEqual(response.status_code, 200)
+        return [(leave['doctor_name'], leave['date']) for leave in response.json()['results']]
+
+    def test_filters(self):
+        second, third = (str(self.first_day + timedelta(days=days)) for days in (1, 2))
+        self.assertEqual(
+            self.leaves('admin', department=self.other_department.pk, **{'from': second, 'to': third}),
+            [('Leave Check', third), ('Leave Check', second)],
+        )
+        self.assertEqual(
+            self.leaves('admin', doctor=self.doctor.pk, ordering='date')[0], ('Query Check', str(self.first_day))
+        )
+        response = self.clients['admin'].get('/api/doctor-leaves/', {'from': 'soon'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_doctors_see_their_own(self):
+        self.assertEqual(len(self.leaves('admin')), 8)
+        self.assertEqual({name for name, _ in self.leaves('doctor')}, {'Query Check'})
+        # Another doctor's id doesn't widen the doctor's view
+        self.assertEqual(self.leaves('doctor', doctor=self.other_doctor.pk), [])
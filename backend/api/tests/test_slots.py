@@ -0,0 +1,185 @@
+from datetime import date, time, timedelta
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+
+from bookings.models import BOOKING_WINDOW_DAYS, Booking, SlotHold, SlotIndex
+from bookings.slots import load_slot_index, next_available_slots, place_hold, refresh_booked_slots
+from doctors.models import Departments, DoctorAvailability, DoctorLeave, Doctors
+
+
+class SlotIndexLockTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        department = Departments.objects.create(dep_name='Slots', dep_decription='Slots')
+        cls.doctor = Doctors.objects.create(
+            user=User.objects.create(username='slots-doctor', password='!', is_staff=True),
+            doc_name='Slots Doctor', doc_spec='General', dep_name=department,
+        )
+        for day in range(7):
+            DoctorAvailability.objects.create(doctor=cls.doctor, day=day, start_time=time(9), end_time=time(12))
+        cls.patient = User.objects.create(username='slots-patient', password='!')
+        cls.day = date.today() + timedelta(days=2)
+
+    def book(self, slot_time):
+        return Booking.objects.create(
+            user=self.patient, p_name='Slots Patient', p_email='slots@example.com', doc_name=self.doctor,
+            booking_date=self.day, appointment_time=slot_time,
+        )
+
+    def row(self):
+        return load_slot_index([self.doctor], self.day, self.day)[(self.doctor.id, self.day)]
+
+    def test_hold_after_the_row_was_dropped(self):
+        row = self.row()
+        # A schedule change drops the day's index rows after the view loaded one
+        SlotIndex.objects.filter(doctor=self.doctor).delete()
+
+        hold = place_hold(row, time(9, 20), self.patient)
+        self.assertIsNotNone(hold)
+        self.assertTrue(SlotIndex.objects.filter(doctor=self.doctor, date=self.day).exists())
+
+    def test_hold_outside_the_new_hours(self):
+        row = self.row()
+        DoctorAvailability.objects.filter(doctor=self.doctor).update(start_time=time(10))
+        SlotIndex.objects.filter(doctor=self.doctor).delete()
+
+        self.assertIsNone(place_hold(row, time(9, 20), self.patient))
+
+    def test_hold_sees_a_booking_missing_from_a_stale_row(self):
+        row = self.row()
+        self.book(time(9, 40))
+        # A lazy build that read the bookings before this one committed
+        SlotIndex.objects.filter(pk=row.pk).update(booked_mask=bytes(len(bytes(row.booked_mask))))
+
+        self.assertIsNone(place_hold(row, time(9, 40), self.patient))
+
+    def test_refresh_builds_a_missing_row(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book(time(10))
+        SlotIndex.objects.filter(doctor=self.doctor).delete()
+
+        refresh_booked_slots(self.doctor.id, self.day)
+        row = SlotIndex.objects.get(doctor=self.doctor, date=self.day)
+        self.assertTrue(row.is_booked(time(10)))
+        self.assertFalse(row.is_booked(time(9)))
+
+    def test_next_available_skips_held_slots(self):
+        self.book(time(9, 20))
+        place_hold(self.row(), time(9), self.patient)
+
+        with self.assertNumQueries(2):  # index rows, holds
+            slots = next_available_slots([self.doctor], self.day, self.day, 2)
+        self.assertEqual([slot_time for _, slot_time, _ in slots], [time(9, 40), time(10)])
+
+        SlotHold.objects.update(expires_at=timezone.now())
+        slots = next_available_slots([self.doctor], self.day, self.day, 2)
+        self.assertEqual([slot_time for _, slot_time, _ in slots], [time(9), time(9, 40)])
+
+
+class SlotRangeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        department = Departments.objects.create(dep_name='Range', dep_decription='Range')
+        cls.doctor = Doctors.objects.create(
+            user=User.objects.create(username='range-doctor', password='!', is_staff=True),
+            doc_name='Range Doctor', doc_spec='General', dep_name=department,
+        )
+        # Weekdays only, three slots a day
+        for day in range(5):
+            DoctorAvailability.objects.create(doctor=cls.doctor, day=day, start_time=time(9), end_time=time(10))
+        cls.workday = date.today() + timedelta(days=1)
+        while cls.workday.weekday() >= 4:
+            cls.workday += timedelta(days=1)
+        cls.leave_day = cls.workday + timedelta(days=1)
+        DoctorLeave.objects.create(doctor=cls.doctor, date=cls.leave_day, reason='Range')
+        Booking.objects.create(
+            user=User.objects.create(username='range-patient', password='!'), p_name='Range Patient',
+            p_email='range@example.com', doc_name=cls.doctor, booking_date=cls.workday,
+            appointment_time=time(9, 20),
+        )
+
+    def slot_range(self, **params):
+        return self.client.get(f'/api/doctors/{self.doctor.pk}/available_slots_range/', params)
+
+    def test_range_is_clipped_to_the_booking_window(self):
+        today = date.today()
+        # Doctor, index rows, then schedule, leaves, bookings and one insert for
+        # the missing rows: the same six queries for one day or sixty
+        with self.assertNumQueries(6):
+            response = self.slot_range(
+                start=(today - timedelta(days=5)).isoformat(), end=(today + timedelta(days=90)).isoformat()
+            )
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        window_end = today + timedelta(days=BOOKING_WINDOW_DAYS)
+        self.assertEqual((body['start'], body['end']), (today.isoformat(), window_end.isoformat()))
+        self.assertEqual(len(body['days']), BOOKING_WINDOW_DAYS + 1)
+
+        days = {entry['date']: entry for entry in body['days']}
+        workday = days[self.workday.isoformat()]
+        self.assertEqual((workday['free'], workday['booked']), (['09:00', '09:40'], ['09:20']))
+        self.assertEqual(days[self.leave_day.isoformat()]['reason'], 'Doctor is on leave')
+        saturday = next(entry for entry in body['days'] if entry['day'] == 'Saturday')
+        self.assertFalse(saturday['available'])
+        self.assertEqual(saturday['reason'], 'Doctor is not scheduled on Saturday')
+
+    def test_invalid_range(self):
+        self.assertEqual(self.slot_range(start='tomorrow').status_code, 400)
+        response = self.slot_range(start=self.leave_day.isoformat(), end=self.workday.isoformat())
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'end must be on or after start'})
+
+
+class NextAvailableTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Departments.objects.create(dep_name='Next', dep_decription='Next')
+        other_department = Departments.objects.create(dep_name='Elsewhere', dep_decription='Elsewhere')
+        doctors = [
+            ('Alpha', 'Cardiology', cls.department),
+            ('Beta', 'General', cls.department),
+            ('Gamma', 'Cardiology', other_department),
+        ]
+        tomorrow = date.today() + timedelta(days=1)
+        for name, spec, department in doctors:
+            doctor = Doctors.objects.create(
+                user=User.objects.create(username=f'next-{name.lower()}', password='!', is_staff=True),
+                doc_name=name, doc_spec=spec, dep_name=department,
+            )
+            for day in range(7):
+                DoctorAvailability.objects.create(doctor=doctor, day=day, start_time=time(9), end_time=time(10))
+            # Nobody works today, so the results don't depend on the time of day
+            DoctorLeave.objects.create(doctor=doctor, date=date.today(), reason='Next')
+            if name == 'Alpha':
+                Booking.objects.create(
+                    user=User.objects.create(username='next-patient', password='!'), p_name='Next Patient',
+                    p_email='next@example.com', doc_name=doctor, booking_date=tomorrow, appointment_time=time(9),
+                )
+        cls.tomorrow = tomorrow.isoformat()
+
+    def slots(self, response):
+        self.assertEqual(response.status_code, 200)
+        return [(slot['doctor_name'], slot['date'], slot['time']) for slot in response.json()['results']]
+
+    def test_department(self):
+        response = self.client.get(f'/api/departments/{self.department.pk}/next_available/', {'limit': 3})
+        self.assertEqual(response.json()['department'], 'Next')
+        self.assertEqual(self.slots(response), [
+            ('Beta', self.tomorrow, '09:00'),
+            ('Alpha', self.tomorrow, '09:20'),
+            ('Beta', self.tomorrow, '09:20'),
+        ])
+
+    def test_speciality(self):
+        response = self.client.get('/api/doctors/next_available/', {'spec': 'cardiology', 'limit': 3})
+        self.assertEqual(self.slots(response), [
+            ('Gamma', self.tomorrow, '09:00'),
+            ('Alpha', self.tomorrow, '09:20'),
+            ('Gamma', self.tomorrow, '09:20'),
+        ])
+
+    def test_invalid_limit(self):
+        response = self.client.get('/api/doctors/next_available/', {'limit': 'all'})
+        self.assertEqual(response.status_code, 400)
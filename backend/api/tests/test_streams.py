@@ -0,0 +1,82 @@
+import asyncio
+import json
+from datetime import date, time, timedelta
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.models import User
+from django.test import RequestFactory, TestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.streams import doctor_stream, slot_stream
+from bookings import live
+from bookings.models import Booking
+from doctors.models import Departments, Doctors
+
+
+class StreamTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        department = Departments.objects.create(dep_name='Stream', dep_decription='Stream')
+        cls.doctor = Doctors.objects.create(
+            user=User.objects.create(username='stream-doctor', password='!', is_staff=True),
+            doc_name='Stream Doctor', doc_spec='General', dep_name=department,
+        )
+        cls.patient = User.objects.create(username='stream-patient', password='!')
+        cls.day = date.today() + timedelta(days=2)
+
+    def book(self):
+        # Events go out once the booking's transaction commits
+        with self.captureOnCommitCallbacks(execute=True):
+            Booking.objects.create(
+                user=self.patient, p_name='Stream Patient', p_email='stream@example.com', doc_name=self.doctor,
+                booking_date=self.day, appointment_time=time(9, 20),
+            )
+
+    def first_event(self, view, *args, **params):
+        """Open the stream, book while it listens and return the first (event, data) it sends."""
+
+        async def listen():
+            response = await view(RequestFactory().get('/', params), *args)
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            chunks = aiter(response.streaming_content)
+            try:
+                self.assertEqual(await anext(chunks), b'retry: 3000\n\n')
+                await sync_to_async(self.book)()
+                chunk = await asyncio.wait_for(anext(chunks), timeout=5)
+            finally:
+                await chunks.aclose()
+            event, data = chunk.decode().strip().split('\n')
+            return event.removeprefix('event: '), json.loads(data.removeprefix('data: '))
+
+        return async_to_sync(listen)()
+
+    def test_slot_taken(self):
+        event = self.first_event(slot_stream, self.doctor.pk, self.day.isoformat())
+        self.assertEqual(event, ('slot_taken', {
+            'doctor_id': self.doctor.pk, 'date': self.day.isoformat(), 'time': '09:20',
+        }))
+        # The listener is gone once its stream closed
+        self.assertFalse(live.get_broker()._listeners)
+
+    def test_booking_status_for_the_doctor(self):
+        event, data = self.first_event(
+            doctor_stream, self.doctor.pk, token=str(AccessToken.for_user(self.doctor.user))
+        )
+        self.assertEqual(event, 'booking_status')
+        self.assertEqual((data['status'], data['previous_status']), ('pending', None))
+
+    def test_doctor_stream_needs_that_doctor_or_an_admin(self):
+        for token in ('', 'not-a-token', AccessToken.for_user(self.patient)):
+            with self.subTest(token=str(token)[:12]):
+                response = self.client.get(f'/api/stream/doctor/{self.doctor.pk}/', {'token': str(token)})
+                self.assertEqual(response.status_code, 403)
+
+    def test_slot_stream_checks_doctor_and_date(self):
+        self.assertEqual(self.client.get(f'/api/stream/slots/{self.doctor.pk}/soon/').status_code, 400)
+        self.assertEqual(self.client.get(f'/api/stream/slots/0/{self.day}/').status_code, 404)
+
+    def test_streams_are_not_gzipped(self):
+        response = self.client.get(f'/api/stream/slots/{self.doctor.pk}/{self.day}/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Content-Encoding', response)
+        response.close()
@@ -0,0 +1,65 @@
+from datetime import date, time, timedelta
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from bookings.models import Booking
+from doctors.models import Departments, DoctorLeave, Doctors
+
+
+class SyncTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        department = Departments.objects.create(dep_name='Sync', dep_decription='Sync')
+        cls.doctor = Doctors.objects.create(
+            user=User.objects.create(username='sync-doctor', password='!', is_staff=True),
+            doc_name='Sync Doctor', doc_spec='General', dep_name=department,
+        )
+        cls.patient = User.objects.create(username='sync-patient', password='!')
+
+    def setUp(self):
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {AccessToken.for_user(self.patient)}'
+
+    def sync(self, since, **params):
+        response = self.client.get('/api/sync/', {'since': since, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def book(self, days):
+        return Booking.objects.create(
+            user=self.patient, p_name='Sync Patient', p_email='sync@example.com', doc_name=self.doctor,
+            booking_date=date.today() + timedelta(days=days), appointment_time=time(9),
+        )
+
+    def test_changes_since_cursor(self):
+        cursor = self.client.get('/api/sync/').json()['cursor']
+        booking = self.book(3)
+        leave = DoctorLeave.objects.create(doctor=self.doctor, date=date.today() + timedelta(days=4))
+
+        page = self.sync(cursor)
+        self.assertEqual([b['id'] for b in page['bookings']['updated']], [booking.id])
+        self.assertEqual(page['leaves']['updated'][0]['id'], leave.id)
+        self.assertEqual(page['leaves']['updated'][0]['doctor_id'], self.doctor.id)
+        self.assertFalse(page['has_more'])
+
+        leave_id = leave.id
+        leave.delete()
+        page = self.sync(page['cursor'])
+        self.assertEqual(page['bookings']['updated'], [])
+        self.assertEqual(page['leaves']['deleted'], [leave_id])
+
+    def test_pages_until_caught_up(self):
+        cursor = self.client.get('/api/sync/').json()['cursor']
+        booked = {self.book(days).id for days in range(3, 8)}
+
+        seen = set()
+        for _ in range(5):
+            page = self.sync(cursor, limit=2)
+            seen.update(b['id'] for b in page['bookings']['updated'])
+            self.assertGreater(page['cursor'], cursor)
+            cursor = page['cursor']
+            if not page['has_more']:
+                break
+        self.assertEqual(seen, booked)
+        self.assertFalse(page['has_more'])
@@ -0,0 +1,156 @@
+from datetime import date, datetime, time, timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.tokens import AccessToken
+
+from bookings import live
+from bookings.models import Booking, BookingEvent, SlotIndex
+from bookings.transitions import bulk_transition
+from doctors.models import Departments, DoctorAvailability, Doctors
+
+
+class BulkTransitionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        department = Departments.objects.create(dep_name='Bulk', dep_decription='Bulk')
+        cls.doctor = Doctors.objects.create(
+            user=User.objects.create(username='bulk-doctor', password='!', is_staff=True),
+            doc_name='Bulk Doctor', doc_spec='General', dep_name=department,
+        )
+        for day in range(7):
+            DoctorAvailability.objects.create(doctor=cls.doctor, day=day, start_time=time(8), end_time=time(18))
+        cls.days = [date.today() + timedelta(days=2), date.today() + timedelta(days=3)]
+
+    def book(self, count, first=0):
+        """Pending bookings of new patients in slots first..first+count-1 of the two days."""
+        ids = []
+        for i in range(first, first + count):
+            slot = datetime.combine(date.today(), time(8)) + timedelta(minutes=20 * (i // 2))
+            ids.append(Booking.objects.create(
+                user=User.objects.create(username=f'bulk-patient-{i}', password='!'),
+                p_name='Bulk Patient', p_email='bulk@example.com', doc_name=self.doctor,
+                booking_date=self.days[i % 2], appointment_time=slot.time(),
+            ).id)
+        return ids
+
+    def accept(self, ids):
+        """Accept the bookings; returns the queries run, commit callbacks included."""
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            results = bulk_transition(Booking.objects.all(), ids, 'accepted')
+        self.assertEqual({result for result, _ in results.values()}, {'updated'})
+        return len(queries)
+
+    def test_queries_do_not_grow_with_the_batch(self):
+        few = self.accept(self.book(4))
+        many = self.accept(self.book(40, first=4))
+        self.assertEqual(few, many)
+
+    def test_counters_stay_in_step(self):
+        self.accept(self.book(10))
+        out = StringIO()
+        call_command('reconcile_dashboard_counters', dry_run=True, stdout=out)
+        self.assertIn('No drift', out.getvalue())
+
+    def test_live_events_go_out_in_one_batch(self):
+        ids = self.book(6)
+        with mock.patch.object(live.get_broker(), 'publish_many') as publish_many:
+            self.accept(ids)
+        publish_many.assert_called_once()
+        messages = publish_many.call_args.args[0]
+        self.assertEqual(
+            sorted(data['id'] for channel, event, data in messages if event == 'booking_status'), sorted(ids)
+        )
+
+
+class ExpireStaleBookingsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        department = Departments.objects.create(dep_name='Expire', dep_decription='Expire')
+        cls.doctor = Doctors.objects.create(
+            user=User.objects.create(username='expire-doctor', password='!', is_staff=True),
+            doc_name='Expire Doctor', doc_spec='General', dep_name=department,
+        )
+        for day in range(7):
+            DoctorAvailability.objects.create(doctor=cls.doctor, day=day, start_time=time(9), end_time=time(12))
+        for i, status in enumerate(['pending', 'accepted', 'pending']):
+            Booking.objects.create(
+                user=User.objects.create(username=f'expire-patient-{i}', password='!'),
+                p_name='Expire Patient', p_email='expire@example.com', doc_name=cls.doctor,
+                booking_date=date.today() - timedelta(days=1 + i), appointment_time=time(9), status=status,
+            )
+
+    def test_expires_without_slot_index_or_live_upkeep(self):
+        with mock.patch.object(live.get_broker(), 'publish_many') as publish_many, \
+                self.captureOnCommitCallbacks(execute=True):
+            call_command('expire_stale_bookings', batch_size=2, stdout=StringIO())
+
+        self.assertEqual(
+            sorted(Booking.objects.values_list('status', flat=True)), ['completed', 'expired', 'expired']
+        )
+        publish_many.assert_not_called()
+        self.assertFalse(SlotIndex.objects.filter(doctor=self.doctor).exists())
+        out = StringIO()
+        call_command('reconcile_dashboard_counters', dry_run=True, stdout=out)
+        self.assertIn('No drift', out.getvalue())
+
+
+class StatusTransitionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        department = Departments.objects.create(dep_name='Status', dep_decription='Status')
+        doctor = Doctors.objects.create(
+            user=User.objects.create(username='status-doctor', password='!', is_staff=True),
+            doc_name='Status Doctor', doc_spec='General', dep_name=department,
+        )
+        cls.admin = User.objects.create(username='status-admin', password='!', is_staff=True, is_superuser=True)
+        cls.patient = User.objects.create(username='status-patient', password='!')
+        cls.booking = Booking.objects.create(
+            user=cls.patient, p_name='Status Patient', p_email='status@example.com', doc_name=doctor,
+            booking_date=date.today() + timedelta(days=3), appointment_time=time(9),
+        )
+
+    def post(self, user, action, **data):
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {AccessToken.for_user(user)}'
+        return self.client.post(
+            f'/api/bookings/{self.booking.pk}/{action}/', data, content_type='application/json'
+        )
+
+    def events(self):
+        return list(
+            BookingEvent.objects.filter(booking=self.booking).order_by('id')
+            .values_list('from_status', 'to_status', 'actor')
+        )
+
+    def test_changes_are_logged(self):
+        created_at = self.booking.created_at
+        self.assertEqual(self.post(self.admin, 'update_status', status='accepted').status_code, 200)
+        self.assertEqual(self.post(self.patient, 'cancel').status_code, 200)
+
+        self.assertEqual(self.events(), [
+            ('', 'pending', self.patient.pk),
+            ('pending', 'accepted', self.admin.pk),
+            ('accepted', 'cancelled', self.patient.pk),
+        ])
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.created_at, created_at)
+
+    def test_final_statuses_stay_final(self):
+        self.assertEqual(self.post(self.patient, 'cancel').status_code, 200)
+        logged = self.events()
+
+        response = self.post(self.admin, 'update_status', status='accepted')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'Cannot change a cancelled booking to accepted'})
+        response = self.post(self.patient, 'cancel')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'Cannot cancel a cancelled booking'})
+
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.status, 'cancelled')
+        self.assertEqual(self.events(), logged)
@@ -6,12 +6,13 @@ from .views import (
     UserRegistrationView, UserProfileView, UserViewSet,
     DepartmentViewSet, DoctorViewSet,
     BookingViewSet, ContactViewSet,
-    dashboard_stats, api_root,
+    sync, api_root, profiles, profile_download,
     DoctorAvailabilityViewSet, DoctorLeaveViewSet,
-    GoogleLoginView,
     AdminListView, AdminCreateView, AdminRemoveView, AdminUpdatePermissionsView,
     DepartmentBlogViewSet,
 )
+from .async_views import available_slots, catalog_view, dashboard_stats, google_login
+from .streams import doctor_stream, slot_stream
 
 # Create router and register viewsets
 router = DefaultRouter()
@@ -24,6 +25,13 @@ router.register(r'doctor-leaves', DoctorLeaveViewSet, basename='doctor-leaves')
 router.register(r'users', UserViewSet, basename='user')
 router.register(r'department-blogs', DepartmentBlogViewSet, basename='department-blog')
 
+# Catalog list/detail GETs answered from the cache skip DRF (api.async_views)
+ASYNC_CATALOG_ROUTES = {'department-list', 'department-detail', 'doctor-list', 'doctor-detail'}
+router_urls = router.urls
+for pattern in router_urls:
+    if pattern.name in ASYNC_CATALOG_ROUTES:
+        pattern.callback = catalog_view(pattern.callback)
+
 urlpatterns = [
     # API Root
     path('', api_root, name='api-root'),
@@ -33,11 +41,25 @@ urlpatterns = [
     path('auth/login/', TokenObtainPairView.as_view(), name='auth-login'),
     path('auth/refresh/', TokenRefreshView.as_view(), name='auth-refresh'),
     path('auth/profile/', UserProfileView.as_view(), name='auth-profile'),
-    path('auth/google/', GoogleLoginView.as_view(), name='auth-google'),
+    path('auth/google/', google_login, name='auth-google'),
 
     # Dashboard
     path('dashboard/stats/', dashboard_stats, name='dashboard-stats'),
 
+    # Slot grid for one day (async view)
+    path('doctors/<int:pk>/available_slots/', available_slots, name='doctor-available-slots'),
+
+    # Delta sync
+    path('sync/', sync, name='sync'),
+
+    # Sampling profiler output (admins)
+    path('profiles/', profiles, name='profiles'),
+    path('profiles/<str:name>/', profile_download, name='profile-download'),
+
+    # Live events (server-sent events)
+    path('stream/slots/<int:doctor_id>/<str:day>/', slot_stream, name='stream-slots'),
+    path('stream/doctor/<int:doctor_id>/', doctor_stream, name='stream-doctor'),
+
     # Admin management (admintovin only)
     path('admins/', AdminListView.as_view(), name='admin-list'),
     path('admins/create/', AdminCreateView.as_view(), name='admin-create'),
@@ -45,5 +67,5 @@ urlpatterns = [
     path('admins/<int:pk>/permissions/', AdminUpdatePermissionsView.as_view(), name='admin-permissions'),
 
     # Include router URLs
-    path('', include(router.urls)),
+    path('', include(router_urls)),
 ]
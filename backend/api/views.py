@@ -2,31 +2,173 @@ from rest_framework import viewsets, generics, status, filters
 from rest_framework.decorators import action, api_view, permission_classes, authentication_classes
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework.response import Response
+from rest_framework.renderers import JSONRenderer
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from django_filters.rest_framework import DjangoFilterBackend
 from django.contrib.auth.models import User
 from django.contrib.auth.base_user import BaseUserManager
-from django.contrib.auth.hashers import make_password
 from rest_framework.views import APIView
-from rest_framework_simplejwt.tokens import RefreshToken
+from django.core.cache import cache
 from django.db.models import Count, Prefetch, Q
 from django.conf import settings
-import requests
+from django.http import HttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
 from datetime import datetime, timedelta, date
 from django.db import IntegrityError
 
 
 from doctors.models import Doctors, Departments, DoctorAvailability, DoctorLeave, DepartmentBlog
-from bookings.models import Booking
+from doctors.cache import CATALOG_CACHE_TIMEOUT, catalog_fingerprint, catalog_last_modified
+from bookings.models import BOOKING_WINDOW_DAYS, Booking
+from bookings.sync import changes_since, latest_cursor
+from bookings.transitions import InvalidTransition, bulk_transition, transition
 from core.models import Contact, AdminPermissions
 from .serializers import (
     UserSerializer, UserRegistrationSerializer,
     DoctorSerializer, DoctorListSerializer, DoctorCreateUpdateSerializer,
     DepartmentSerializer, DoctorAvailabilitySerializer, DoctorLeaveSerializer,
     BookingSerializer, BookingListSerializer, ContactSerializer,
-    DepartmentBlogSerializer
+    DepartmentBlogSerializer, with_role,
 )
-from .permissions import IsOwnerOrAdmin, IsDoctorOrAdmin
+from bookings.slots import (
+    HOLD_MINUTES, SLOT_MINUTES, build_slot_calendar, load_slot_index, next_available_slots,
+    place_hold, slot_times,
+)
+from .export import STREAMS, stream_bookings
+from .pagination import OptInCursorPagination
+from .permissions import IsAdmin, IsOwnerOrAdmin, IsDoctorOrAdmin
+from .profiling import list_profiles, profile_path
+
+
+def _parse_date_param(value):
+    """Parse an optional YYYY-MM-DD query param. Raises ValueError if malformed."""
+    if not value:
+        return None
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def _next_available_response(request, doctors, **extra):
+    """
+    Shared body of the next_available actions: the ?limit= (default 10, max 50)
+    earliest free slots across `doctors` within the booking window.
+    """
+    try:
+        limit = min(max(int(request.query_params.get('limit', 10)), 1), 50)
+    except ValueError:
+        return Response(
+            {'error': 'limit must be a number'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    now = timezone.localtime().replace(tzinfo=None)
+    today = now.date()
+    slots = next_available_slots(
+        doctors, today, today + timedelta(days=BOOKING_WINDOW_DAYS), limit, not_before=now
+    )
+    return Response({
+        **extra,
+        'count': len(slots),
+        'results': [
+            {
+                'doctor_id': doctor.id,
+                'doctor_name': doctor.doc_name,
+                'doc_spec': doctor.doc_spec,
+                'date': day.isoformat(),
+                'day': day.strftime('%A'),
+                'time': slot_time.strftime('%H:%M'),
+            }
+            for day, slot_time, doctor in slots
+        ],
+    })
+
+
+def _catalog_lookup(request, from_database=True):
+    """
+    (cache key, ETag, Last-Modified, 304 response or None) for a catalog GET,
+    or None if that takes a query and from_database is False.
+    """
+    last_modified = catalog_last_modified(from_database)
+    if last_modified is None:
+        return None
+    last_modified = int(last_modified)
+    fingerprint = catalog_fingerprint(request.build_absolute_uri())
+    etag = f'"{fingerprint}"'
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        not_modified['ETag'] = etag
+    return f'catalog:{fingerprint}', etag, last_modified, not_modified
+
+
+def _with_catalog_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # Let browsers keep the copy but revalidate it on every use
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+def _cached_catalog_response(request, build_response):
+    """
+    Serve a public catalog GET from the shared cache, building and storing
+    it on a miss. Catalog writes invalidate every entry (doctors.cache).
+
+    Responses carry an ETag and Last-Modified derived from the catalog
+    version, so a client revalidating an unchanged catalog gets a 304
+    without any query or serialization.
+    """
+    key, etag, last_modified, not_modified = _catalog_lookup(request)
+    if not_modified is not None:
+        return not_modified
+
+    data = cache.get(key)
+    if data is not None:
+        response = Response(data)
+        response['X-Cache'] = 'HIT'
+    else:
+        response = build_response()
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        cache.set(key, response.data, CATALOG_CACHE_TIMEOUT)
+        response['X-Cache'] = 'MISS'
+
+    return _with_catalog_validators(response, etag, last_modified)
+
+
+def cached_catalog_hit(request):
+    """
+    What _cached_catalog_response would answer from the cache alone (a 304,
+    or the stored body rendered as JSON), or None on a miss. Used by the
+    async catalog views (api.async_views.catalog_view), so it never queries
+    the database.
+    """
+    lookup = _catalog_lookup(request, from_database=False)
+    if lookup is None:
+        return None
+    key, etag, last_modified, not_modified = lookup
+    if not_modified is not None:
+        return not_modified
+
+    data = cache.get(key)
+    if data is None:
+        return None
+    response = HttpResponse(JSONRenderer().render(data), content_type='application/json')
+    response['X-Cache'] = 'HIT'
+    return _with_catalog_validators(response, etag, last_modified)
+
+
+class CatalogCacheMixin:
+    """Cache list and retrieve of a public catalog viewset."""
+
+    def list(self, request, *args, **kwargs):
+        return _cached_catalog_response(request, lambda: super(CatalogCacheMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return _cached_catalog_response(request, lambda: super(CatalogCacheMixin, self).retrieve(request, *args, **kwargs))
 
 
 # ===========================
@@ -61,7 +203,9 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
     permission_classes = [IsAuthenticated]
     
     def get_object(self):
-        return self.request.user
+        # Re-read the user with the role annotation: one query instead of a
+        # plain user object plus a Doctors lookup in the serializer.
+        return with_role(User.objects.all()).get(pk=self.request.user.pk)
 
 
 # ===========================
@@ -71,24 +215,30 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
 class UserViewSet(viewsets.ModelViewSet):
     """
     Manage Users (Admin only).
+    GET /api/users/?cursor= - Keyset pagination (follow `next`) instead of page numbers
     """
     # only() fetches only the columns the serializer actually needs — skips password hash etc.
-    queryset = User.objects.filter(
+    # with_role() annotates the doctor flag so the role costs no query per user.
+    queryset = with_role(User.objects.filter(
         is_superuser=False, is_staff=False
     ).only(
-        'id', 'username', 'email', 'first_name', 'last_name', 'date_joined', 'is_active'
-    ).order_by('-date_joined')
+        'id', 'username', 'email', 'first_name', 'last_name', 'date_joined', 'is_active',
+        'is_staff', 'is_superuser', 'last_login',
+    )).order_by('-date_joined', '-id')
     serializer_class = UserSerializer
     permission_classes = [IsAdminUser]
+    pagination_class = OptInCursorPagination
+    ordering = ['-date_joined', '-id']
 
 
-class DepartmentViewSet(viewsets.ModelViewSet):
+class DepartmentViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
     """
     Manage departments.
     GET /api/departments/ - List (public)
     POST /api/departments/ - Create (admin)
     PUT /api/departments/{id}/ - Update (admin)
     DELETE /api/departments/{id}/ - Delete (admin)
+    GET /api/departments/{id}/next_available/?limit=N - Earliest free slots (public)
     """
     # Annotate doctor_count in a single SQL query (no N+1 per department).
     # Django's default reverse name for the Doctors FK to Departments is 'doctors' (lowercase model name).
@@ -99,9 +249,7 @@ class DepartmentViewSet(viewsets.ModelViewSet):
     ordering_fields = ['dep_name']
     ordering = ['dep_name']
 
-    # No caching here — departments are a small list and the locmem cache
-    # is per gunicorn worker, so invalidation across workers is unreliable.
-    # Direct DB queries for this endpoint are fast enough.
+    # list/retrieve are served from the shared catalog cache (CatalogCacheMixin).
 
     def get_permissions(self):
         """Allow public read access, but require admin for write access"""
@@ -109,12 +257,21 @@ class DepartmentViewSet(viewsets.ModelViewSet):
             return [IsAdminUser()]
         return [AllowAny()]
 
+    @action(detail=True, methods=['get'])
+    def next_available(self, request, pk=None):
+        """Earliest free slots across every doctor in the department"""
+        department = self.get_object()
+        doctors = Doctors.objects.filter(dep_name=department).prefetch_related('availabilities')
+        return _next_available_response(
+            request, doctors, department=department.dep_name, department_id=department.id
+        )
+
 
 # ===========================
 # Doctor Views
 # ===========================
 
-class DoctorViewSet(viewsets.ModelViewSet):
+class DoctorViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
     """
     CRUD operations for doctors.
     GET /api/doctors/ - List all doctors (public)
@@ -124,12 +281,15 @@ class DoctorViewSet(viewsets.ModelViewSet):
     DELETE /api/doctors/{id}/ - Delete doctor (admin only)
     GET /api/doctors/{id}/availability/ - Get availability
     GET /api/doctors/{id}/leaves/ - Get leaves
-    GET /api/doctors/{id}/available_slots/?date=YYYY-MM-DD - Get available slots
+    GET /api/doctors/{id}/available_slots/?date=YYYY-MM-DD - Get available slots (async, api.async_views)
+    GET /api/doctors/{id}/available_slots_range/?start=&end= - Slots for a date range
+    GET /api/doctors/next_available/?spec=&limit=N - Earliest free slots across doctors
+    POST /api/doctors/{id}/hold/ - Hold a slot for a few minutes (authenticated)
     """
     # select_related covers all FK joins in a single query.
-    # prefetch_related('availabilities') is only needed for detail/availability views;
-    # for the list view DoctorListSerializer no longer serializes availabilities/leaves
-    # so we avoid pulling that data unnecessarily.
+    # prefetch_related('availabilities') feeds the weekly schedule on every view;
+    # leaves are only serialized by the detail view, so the list skips them.
+    # current_status is annotated in get_queryset (it depends on today's date).
     queryset = Doctors.objects.all().select_related('dep_name', 'user').prefetch_related('availabilities', 'leaves')
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['dep_name', 'doc_spec']
@@ -137,15 +297,26 @@ class DoctorViewSet(viewsets.ModelViewSet):
     ordering_fields = ['doc_name']
     ordering = ['doc_name']
 
-    # No cache_page here — locmem cache is per-worker and breaks with multiple
-    # gunicorn processes on Render (stale data randomly served). DB is fast enough.
-    def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
+    # list, retrieve and availability go through the shared catalog cache,
+    # which every gunicorn worker sees and every catalog write invalidates.
+
+    def get_queryset(self):
+        # Slot lookups read the slot index, so skip the schedule prefetches
+        if self.action in ['available_slots_range', 'hold']:
+            return Doctors.objects.all()
+        if self.action == 'list':
+            queryset = Doctors.objects.select_related('dep_name', 'user').prefetch_related('availabilities')
+        else:
+            queryset = super().get_queryset()
+        # Today's leave/schedule flags as EXISTS subqueries: no per-doctor queries
+        return queryset.with_current_status()
 
     def get_permissions(self):
         """Allow public read access, but require admin for create/update/delete"""
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
             return [IsAdminUser()]
+        if self.action == 'hold':
+            return [IsAuthenticated()]
         return [AllowAny()]
     
     def get_serializer_class(self):
@@ -159,10 +330,12 @@ class DoctorViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def availability(self, request, pk=None):
         """Get doctor's availability schedule"""
-        doctor = self.get_object()
-        availabilities = doctor.availabilities.all().order_by('day')
-        serializer = DoctorAvailabilitySerializer(availabilities, many=True)
-        return Response(serializer.data)
+        def build_response():
+            doctor = self.get_object()
+            availabilities = doctor.availabilities.all().order_by('day')
+            serializer = DoctorAvailabilitySerializer(availabilities, many=True)
+            return Response(serializer.data)
+        return _cached_catalog_response(request, build_response)
     
     @action(detail=True, methods=['get'])
     def leaves(self, request, pk=None):
@@ -172,102 +345,102 @@ class DoctorViewSet(viewsets.ModelViewSet):
         serializer = DoctorLeaveSerializer(leaves, many=True)
         return Response(serializer.data)
     
-    @action(detail=True, methods=['get'])
-    def available_slots(self, request, pk=None):
+    @action(detail=True, methods=['post'])
+    def hold(self, request, pk=None):
         """
-        Get available time slots for a specific date.
-        Query param: ?date=YYYY-MM-DD
+        Hold a slot for HOLD_MINUTES while the patient completes the booking.
+        Body: {"date": "YYYY-MM-DD", "time": "HH:MM"}
+        Pass the returned token as hold_token to POST /api/bookings/.
         """
         doctor = self.get_object()
-        date_str = request.query_params.get('date')
-        
-        if not date_str:
+        try:
+            booking_date = datetime.strptime(request.data.get('date') or '', '%Y-%m-%d').date()
+            slot_time = datetime.strptime(request.data.get('time') or '', '%H:%M').time()
+        except ValueError:
             return Response(
-                {'error': 'Date parameter  is required (format: YYYY-MM-DD)'},
+                {'error': 'date (YYYY-MM-DD) and time (HH:MM) are required'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        
+
+        today = date.today()
+        if not today <= booking_date <= today + timedelta(days=BOOKING_WINDOW_DAYS):
+            return Response(
+                {'error': 'Date is outside the booking window'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        row = load_slot_index([doctor], booking_date, booking_date)[(doctor.id, booking_date)]
+        if not row.is_working_day or slot_time not in slot_times(row.start_time, row.end_time):
+            return Response(
+                {'error': 'Not a bookable slot for this doctor on that date'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        hold = place_hold(row, slot_time, request.user)
+        if hold is None:
+            return Response(
+                {'error': 'This time slot is already booked or held. Please choose another slot.'},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        return Response({
+            'token': hold.token,
+            'doctor_id': doctor.id,
+            'date': booking_date.isoformat(),
+            'time': slot_time.strftime('%H:%M'),
+            'expires_at': hold.expires_at,
+            'hold_minutes': HOLD_MINUTES,
+        }, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['get'])
+    def next_available(self, request):
+        """
+        Earliest free slots across all doctors, optionally for one speciality.
+        Query params: ?spec=Cardiology&limit=10
+        """
+        doctors = Doctors.objects.prefetch_related('availabilities')
+        spec = request.query_params.get('spec')
+        if spec:
+            doctors = doctors.filter(doc_spec__iexact=spec)
+        return _next_available_response(request, doctors, spec=spec)
+
+    @action(detail=True, methods=['get'])
+    def available_slots_range(self, request, pk=None):
+        """
+        Get the slot grid for every day in a date range in one request.
+        Query params: ?start=YYYY-MM-DD&end=YYYY-MM-DD (default: today .. +60 days)
+        The range is clipped to the booking window (today .. today + 60 days).
+        """
+        doctor = self.get_object()
+        today = date.today()
+        window_end = today + timedelta(days=BOOKING_WINDOW_DAYS)
+
         try:
-            booking_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+            start = _parse_date_param(request.query_params.get('start')) or today
+            end = _parse_date_param(request.query_params.get('end')) or window_end
         except ValueError:
             return Response(
                 {'error': 'Invalid date format. Use YYYY-MM-DD'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        
-        # Check if date is in the past
-        if booking_date < date.today():
-            return Response({
-                'available': False,
-                'reason': 'Cannot book appointments in the past',
-                'slots': []
-            })
 
-        # Check if date is too far in future
-        if booking_date > date.today() + timedelta(days=60):
-            return Response({
-                'available': False,
-                'reason': 'Cannot book appointments more than 2 months in advance',
-                'slots': []
-            })
-        
-        # Check if doctor is on leave
-        leave = doctor.leaves.filter(date=booking_date).first()
-        if leave:
-            return Response({
-                'available': False,
-                'reason': 'Doctor is on leave',
-                'slots': []
-            })
-        
-        # Get availability for the day
-        day_of_week = booking_date.weekday()
-        availability = doctor.availabilities.filter(day=day_of_week).first()
-        
-        if not availability:
-            return Response({
-                'available': False,
-                'reason': f'Doctor is not scheduled on {booking_date.strftime("%A")}',
-                'slots': []
-            })
-        
-        # Generate 20-minute slots
-        slots = []
-        current_time = datetime.combine(booking_date, availability.start_time)
-        end_time = datetime.combine(booking_date, availability.end_time)
-        
-        # Get all booked slots for this day
-        booked_times = set(
-            Booking.objects.filter(
-                doc_name=doctor,
-                booking_date=booking_date,
-                status__in=['pending', 'accepted']
-            ).values_list('appointment_time', flat=True)
-        )
-        
-        while current_time < end_time:
-            slot_time = current_time.time()
-            is_available = slot_time not in booked_times
-            slots.append({
-                'time': slot_time.strftime('%H:%M'),
-                'available': is_available,
-                'status': 'available' if is_available else 'booked',
-            })
-            current_time += timedelta(minutes=20)
+        if end < start:
+            return Response(
+                {'error': 'end must be on or after start'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Days outside the booking window are never bookable, so don't compute them
+        start, end = max(start, today), min(end, window_end)
+        days = build_slot_calendar([doctor], start, end)[doctor.id] if start <= end else []
 
         return Response({
-            'available': True,
-            'date': date_str,
-            'day': booking_date.strftime('%A'),
             'doctor': doctor.doc_name,
             'doctor_id': doctor.id,
-            'working_hours': {
-                'start': availability.start_time.strftime('%H:%M'),
-                'end': availability.end_time.strftime('%H:%M')
-            },
-            'total_slots': len(slots),
-            'available_slots': len([s for s in slots if s['available']]),
-            'slots': slots
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'slot_minutes': SLOT_MINUTES,
+            'days': days,
         })
 
 
@@ -284,28 +457,33 @@ class BookingViewSet(viewsets.ModelViewSet):
     PUT /api/bookings/{id}/ - Update booking
     DELETE /api/bookings/{id}/ - Delete booking
     POST /api/bookings/{id}/update_status/ - Update status (doctor/admin)
+    POST /api/bookings/bulk_status/ - Update the status of many bookings (doctor/admin)
     POST /api/bookings/{id}/cancel/ - Cancel booking (owner/admin)
+    GET /api/bookings/?cursor= - Keyset pagination (follow `next`) instead of page numbers
+    GET /api/bookings/export/?as=csv|ndjson - Stream every matching booking
     """
     serializer_class = BookingSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['status', 'booking_date', 'doc_name']
-    ordering_fields = ['booking_date', 'appointment_time', 'booked_on']
-    ordering = ['-booked_on']
+    ordering_fields = ['booking_date', 'appointment_time', 'booked_on', 'created_at']
+    # id breaks ties so cursor pages never skip or repeat a booking
+    ordering = ['-created_at', '-id']
+    pagination_class = OptInCursorPagination
     
     def get_queryset(self):
-        user = self.request.user
+        principal = self.request.principal
         
         # Admin (Superuser) sees all bookings
-        if user.is_superuser:
+        if principal.is_admin:
             return Booking.objects.all().select_related('doc_name', 'user')
         
         # Doctors see their bookings
-        if hasattr(user, 'doctors') and user.doctors:
-            return Booking.objects.filter(doc_name=user.doctors).select_related('doc_name', 'user')
+        if principal.is_doctor:
+            return Booking.objects.filter(doc_name_id=principal.doctor_id).select_related('doc_name', 'user')
         
         # Regular users see only their bookings
-        return Booking.objects.filter(user=user).select_related('doc_name')
+        return Booking.objects.filter(user=self.request.user).select_related('doc_name', 'user')
     
     def get_serializer_class(self):
         if self.action == 'list':
@@ -343,18 +521,13 @@ class BookingViewSet(viewsets.ModelViewSet):
     def update_status(self, request, pk=None):
         """Update booking status (for doctors/admin)"""
         booking = self.get_object()
-        user = request.user
+        principal = request.principal
         
         # Check if user is admin
-        is_admin = user.is_superuser or user.is_staff
+        is_admin = principal.is_staff
         
         # Check if user is the doctor for this booking
-        is_assigned_doctor = False
-        try:
-            doctor = Doctors.objects.get(user=user)
-            is_assigned_doctor = booking.doc_name.id == doctor.id
-        except Doctors.DoesNotExist:
-            pass
+        is_assigned_doctor = principal.is_doctor and booking.doc_name_id == principal.doctor_id
         
         if not is_admin and not is_assigned_doctor:
             return Response(
@@ -377,8 +550,10 @@ class BookingViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        booking.status = new_status
-        booking.save()
+        try:
+            transition(booking, new_status, actor=request.user)
+        except InvalidTransition as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
         serializer = BookingSerializer(booking, context={'request': request})
         return Response({
@@ -386,21 +561,80 @@ class BookingViewSet(viewsets.ModelViewSet):
             'booking': serializer.data
         })
     
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Stream the caller's bookings (same role scoping and status /
+        booking_date / doc_name filters as the list) as CSV or NDJSON.
+        The format is ?as=, since ?format= is DRF's renderer override.
+        """
+        export_format = request.query_params.get('as', 'csv')
+        if export_format not in STREAMS:
+            return Response(
+                {'error': f'as must be one of: {", ".join(STREAMS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        queryset = self.filter_queryset(self.get_queryset())
+        return stream_bookings(queryset, export_format, f'bookings-{date.today():%Y%m%d}')
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
+    def bulk_status(self, request):
+        """
+        Update the status of many bookings at once (for doctors/admin).
+        Body: {"ids": [1, 2, ...], "status": "completed"}
+        Each id gets its own result: updated, unchanged, invalid_transition
+        or not_found (bookings outside the caller's own list count as not found).
+        """
+        principal = request.principal
+        if not principal.is_staff and not principal.is_doctor:
+            return Response(
+                {'error': 'Only doctors and admins can update booking status'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        new_status = request.data.get('status')
+        valid_statuses = dict(Booking.STATUS_CHOICES).keys()
+        if new_status not in valid_statuses:
+            return Response(
+                {'error': f'Invalid status. Must be one of: {", ".join(valid_statuses)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        ids = request.data.get('ids')
+        if (
+            not isinstance(ids, list) or not ids or len(ids) > 500
+            or not all(isinstance(pk, int) and not isinstance(pk, bool) for pk in ids)
+        ):
+            return Response(
+                {'error': 'ids must be a list of 1 to 500 booking ids'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        ids = list(dict.fromkeys(ids))
+        results = bulk_transition(self.get_queryset(), ids, new_status, actor=request.user)
+        return Response({
+            'status': new_status,
+            'updated': sum(1 for result, _ in results.values() if result == 'updated'),
+            'results': [
+                {'id': pk, 'result': results[pk][0], 'previous_status': results[pk][1]}
+                for pk in ids
+            ],
+        })
+    
     @action(detail=True, methods=['post'], permission_classes=[IsOwnerOrAdmin])
     def cancel(self, request, pk=None):
         """Cancel a booking (for booking owner or admin)"""
         booking = self.get_object()
         
-        if booking.status in ['completed', 'cancelled', 'rejected']:
+        try:
+            transition(booking, 'cancelled', actor=request.user)
+        except InvalidTransition:
             status_display = 'Not Visited' if booking.status == 'rejected' else booking.status
             return Response(
                 {'error': f'Cannot cancel a {status_display} booking'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        booking.status = 'cancelled'
-        booking.save()
-        
         serializer = BookingSerializer(booking, context={'request': request})
         return Response({
             'message': 'Booking cancelled successfully',
@@ -418,14 +652,16 @@ class ContactViewSet(viewsets.ModelViewSet):
     POST /api/contacts/ - Submit contact message (anyone)
     GET /api/contacts/ - List messages (admin only)
     POST /api/contacts/{id}/mark_read/ - Mark as read (admin only)
+    GET /api/contacts/?cursor= - Keyset pagination (follow `next`) instead of page numbers
     """
     # only() avoids loading large text blobs until actually needed
     queryset = Contact.objects.only(
         'id', 'name', 'email', 'subject', 'message', 'is_read', 'submitted_at'
-    ).order_by('-submitted_at')
+    ).order_by('-submitted_at', '-id')
     serializer_class = ContactSerializer
     filter_backends = [filters.OrderingFilter]
-    ordering = ['-submitted_at']
+    ordering = ['-submitted_at', '-id']
+    pagination_class = OptInCursorPagination
 
     def get_permissions(self):
         if self.action == 'create':
@@ -455,156 +691,149 @@ class ContactViewSet(viewsets.ModelViewSet):
 
 
 # ===========================
-# Dashboard Stats
+# Delta Sync
 # ===========================
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
-def dashboard_stats(request):
+def sync(request):
     """
-    Get dashboard statistics based on user role.
-    GET /api/dashboard/stats/
+    Changes since a cursor, for clients that keep local copies.
+    GET /api/sync/ - Current cursor only (load the lists, then sync from it)
+    GET /api/sync/?since=<cursor>&limit=N - Bookings, doctors, leaves and
+        availabilities changed since the cursor: current state under
+        "updated", ids of deleted ones under "deleted", plus the next cursor.
+        When has_more is true, call again with the new cursor straight away.
+    Patients see their own bookings, doctors the bookings made with them.
     """
-    user = request.user
-    stats = {}
-
-    if user.is_superuser:
-        today = date.today()
-        # Single aggregate query replaces 7 separate COUNT queries — massive DB savings
-        booking_agg = Booking.objects.aggregate(
-            total=Count('id'),
-            pending=Count('id', filter=Q(status='pending')),
-            accepted=Count('id', filter=Q(status='accepted')),
-            today_active=Count('id', filter=Q(
-                booking_date=today,
-                status__in=['pending', 'accepted']
-            )),
-            distinct_patients=Count('user', distinct=True),
+    principal = request.principal
+    since = request.query_params.get('since')
+    if not since:
+        return Response({'cursor': latest_cursor(), 'has_more': False})
+
+    try:
+        since = int(since)
+        limit = min(max(int(request.query_params.get('limit', 500)), 1), 1000)
+    except ValueError:
+        return Response(
+            {'error': 'since and limit must be numbers'},
+            status=status.HTTP_400_BAD_REQUEST
         )
-        stats = {
-            'role': 'admin',
-            # is_main_admin is determined entirely by the server using the env variable.
-            # The frontend never knows the actual username — it just gets True/False.
-            'is_main_admin': (user.username == settings.MAIN_ADMIN_USERNAME),
-            'total_doctors': Doctors.objects.count(),
-            'total_departments': Departments.objects.count(),
-            'total_bookings': booking_agg['total'],
-            'pending_bookings': booking_agg['pending'],
-            'accepted_bookings': booking_agg['accepted'],
-            'total_patients': booking_agg['distinct_patients'],
-            'unread_contacts': Contact.objects.filter(is_read=False).count(),
-            'today_bookings': booking_agg['today_active'],
-        }
-    elif Doctors.objects.filter(user=user).exists():
-        # Doctor stats
-        try:
-            doctor = Doctors.objects.get(user=user)
-            today = date.today()
-            stats = {
-                'role': 'doctor',
-                'doctor_name': doctor.doc_name,
-                'department': doctor.dep_name.dep_name if doctor.dep_name else 'No Department',
-                'total_appointments': Booking.objects.filter(doc_name=doctor).count(),
-                'pending_appointments': Booking.objects.filter(doc_name=doctor, status='pending').count(),
-                'accepted_appointments': Booking.objects.filter(doc_name=doctor, status='accepted').count(),
-                'today_appointments': Booking.objects.filter(
-                    doc_name=doctor,
-                    booking_date=today,
-                    status__in=['pending', 'accepted']
-                ).count(),
-                'upcoming_appointments': Booking.objects.filter(
-                    doc_name=doctor,
-                    booking_date__gt=today,
-                    status__in=['pending', 'accepted']
-                ).count(),
-            }
-        except Exception as e:
-            # If there's an error loading doctor data, fall back to patient view
-            stats = {
-                'role': 'patient',
-                'total_bookings': Booking.objects.filter(user=user).count(),
-                'pending_bookings': Booking.objects.filter(user=user, status='pending').count(),
-                'accepted_bookings': Booking.objects.filter(user=user, status='accepted').count(),
-                'upcoming_bookings': Booking.objects.filter(
-                    user=user,
-                    booking_date__gte=date.today(),
-                    status__in=['pending', 'accepted']
-                ).count(),
-                'error': f'Doctor profile error: {str(e)}'
-            }
+
+    bookings = Booking.objects.select_related('doc_name', 'user')
+    if principal.is_admin:
+        booking_scope = None
+    elif principal.is_doctor:
+        booking_scope = Q(model='booking', doctor_id=principal.doctor_id)
+        bookings = bookings.filter(doc_name_id=principal.doctor_id)
     else:
-        # Patient stats
-        stats = {
-            'role': 'patient',
-            'total_bookings': Booking.objects.filter(user=user).count(),
-            'pending_bookings': Booking.objects.filter(user=user, status='pending').count(),
-            'accepted_bookings': Booking.objects.filter(user=user, status='accepted').count(),
-            'upcoming_bookings': Booking.objects.filter(
-                user=user,
-                booking_date__gte=date.today(),
-                status__in=['pending', 'accepted']
-            ).count(),
+        booking_scope = Q(model='booking', user_id=request.user.id)
+        bookings = bookings.filter(user=request.user)
+
+    changed, deleted, cursor, has_more = changes_since(since, limit, booking_scope)
+
+    querysets = {
+        'booking': (bookings, BookingListSerializer),
+        'doctor': (
+            Doctors.objects.select_related('dep_name', 'user').prefetch_related('availabilities')
+            .with_current_status(),
+            DoctorListSerializer,
+        ),
+        'leave': (DoctorLeave.objects.select_related('doctor__dep_name'), DoctorLeaveSerializer),
+        'availability': (DoctorAvailability.objects.all(), DoctorAvailabilitySerializer),
+    }
+    payload = {'cursor': cursor, 'has_more': has_more}
+    for model, key in [('booking', 'bookings'), ('doctor', 'doctors'),
+                       ('leave', 'leaves'), ('availability', 'availabilities')]:
+        queryset, serializer_class = querysets[model]
+        objects = list(queryset.filter(pk__in=changed[model])) if changed[model] else []
+        # Changed but gone (or no longer visible) by now: send a tombstone
+        found = {obj.pk for obj in objects}
+        payload[key] = {
+            'updated': serializer_class(objects, many=True, context={'request': request}).data,
+            'deleted': deleted[model] + [pk for pk in changed[model] if pk not in found],
         }
-    
-    return Response(stats)
+    return Response(payload)
 
 
 # ===========================
 # Doctor Schedule Views
 # ===========================
 
+def _save_for_principal(serializer, principal):
+    """
+    Doctors always save schedule rows against their own profile; admins must
+    pass the doctor in the request data.
+    """
+    if principal.is_doctor:
+        serializer.validated_data.pop('doctor', None)
+        serializer.save(doctor_id=principal.doctor_id)
+    else:
+        serializer.save()
+
+
 class DoctorAvailabilityViewSet(viewsets.ModelViewSet):
     queryset = DoctorAvailability.objects.all()
     serializer_class = DoctorAvailabilitySerializer
     permission_classes = [IsAuthenticated, IsDoctorOrAdmin]
 
     def get_queryset(self):
-        user = self.request.user
-        if user.is_superuser:
+        principal = self.request.principal
+        if principal.is_admin:
             return DoctorAvailability.objects.all()
-        if Doctors.objects.filter(user=user).exists():
-            return DoctorAvailability.objects.filter(doctor__user=user)
+        if principal.is_doctor:
+            return DoctorAvailability.objects.filter(doctor_id=principal.doctor_id)
         return DoctorAvailability.objects.none()
 
     def perform_create(self, serializer):
-        user = self.request.user
-        try:
-            doctor = Doctors.objects.get(user=user)
-            serializer.save(doctor=doctor)
-        except Doctors.DoesNotExist:
-            serializer.save()
+        _save_for_principal(serializer, self.request.principal)
 
     def perform_update(self, serializer):
-        user = self.request.user
-        try:
-            doctor = Doctors.objects.get(user=user)
-            serializer.save(doctor=doctor)
-        except Doctors.DoesNotExist:
-            serializer.save()
+        _save_for_principal(serializer, self.request.principal)
 
 
 class DoctorLeaveViewSet(viewsets.ModelViewSet):
-    queryset = DoctorLeave.objects.all()
+    """
+    Doctor leave days (paginated).
+    GET /api/doctor-leaves/?from=YYYY-MM-DD&to=YYYY-MM-DD&doctor={id}&department={id}
+    Admins see every doctor's leave, doctors only their own.
+    """
+    # select_related feeds doctor_name/department_name without a query per row
+    queryset = DoctorLeave.objects.select_related('doctor__dep_name')
     serializer_class = DoctorLeaveSerializer
     permission_classes = [IsAuthenticated, IsDoctorOrAdmin]
+    filter_backends = [filters.OrderingFilter]
+    ordering_fields = ['date']
+    ordering = ['-date', 'id']
 
     def get_queryset(self):
-        user = self.request.user
-        if user.is_superuser:
-            return DoctorLeave.objects.all()
-        if Doctors.objects.filter(user=user).exists():
-            return DoctorLeave.objects.filter(doctor__user=user)
-        return DoctorLeave.objects.none()
+        principal = self.request.principal
+        if principal.is_admin:
+            queryset = self.queryset.all()
+        elif principal.is_doctor:
+            queryset = self.queryset.filter(doctor_id=principal.doctor_id)
+        else:
+            return DoctorLeave.objects.none()
+
+        params = self.request.query_params
+        try:
+            date_from = _parse_date_param(params.get('from'))
+            date_to = _parse_date_param(params.get('to'))
+        except ValueError:
+            raise ValidationError({'error': 'Invalid date format. Use YYYY-MM-DD'})
+        # from/to hit the (doctor, date) index together with the doctor filter
+        if date_from:
+            queryset = queryset.filter(date__gte=date_from)
+        if date_to:
+            queryset = queryset.filter(date__lte=date_to)
+        if params.get('doctor', '').isdigit():
+            queryset = queryset.filter(doctor_id=params['doctor'])
+        if params.get('department', '').isdigit():
+            queryset = queryset.filter(doctor__dep_name_id=params['department'])
+        return queryset
 
     def perform_create(self, serializer):
-        user = self.request.user
-        # For doctors creating their own leave
-        try:
-            doctor = Doctors.objects.get(user=user)
-            serializer.save(doctor=doctor)
-        except Doctors.DoesNotExist:
-            # For admins, the doctor must be provided in the request data
-            serializer.save()
+        _save_for_principal(serializer, self.request.principal)
 
 
 @api_view(['GET'])
@@ -628,74 +857,47 @@ def api_root(request):
             'bookings': '/api/bookings/',
             'contacts': '/api/contacts/',
             'dashboard': '/api/dashboard/stats/',
+            'sync': '/api/sync/?since=<cursor>',
+            'profiles': '/api/profiles/',
         },
         'documentation': 'Visit /api/ in browser mode for browsable API'
     })
 
 # ===========================
-# Google Auth View
+# Request Profiles
 # ===========================
 
-class GoogleLoginView(APIView):
-    permission_classes = [AllowAny]
-
-    def post(self, request):
-        token = request.data.get('token')
-        if not token:
-            return Response({'error': 'Token is required'}, status=status.HTTP_400_BAD_REQUEST)
-
-        # Verify token with Google
-        try:
-            # Using tokeninfo endpoint to verify ID token
-            response = requests.get(f'https://oauth2.googleapis.com/tokeninfo?id_token={token}')
-            
-            if response.status_code != 200:
-                return Response({'error': 'Invalid Google token'}, status=status.HTTP_400_BAD_REQUEST)
-            
-            google_data = response.json()
-            email = google_data.get('email')
-            
-            if not email:
-                return Response({'error': 'Email not found in Google token'}, status=status.HTTP_400_BAD_REQUEST)
-
-            # Use filter+first instead of get() to safely handle duplicate emails.
-            # Prefer a regular patient account (not staff/superuser) if duplicates exist.
-            users_with_email = User.objects.filter(email=email).order_by('is_superuser', 'is_staff')
-            user = users_with_email.first()
-            if user is None:
-                # Create user
-                username = email.split('@')[0]
-                # Ensure unique username
-                base_username = username
-                counter = 1
-                while User.objects.filter(username=username).exists():
-                    username = f"{base_username}{counter}"
-                    counter += 1
-                
-                # Generate random password for Google OAuth users
-                from django.utils.crypto import get_random_string
-                random_password = get_random_string(length=32)
-                
-                user = User.objects.create(
-                    username=username,
-                    email=email,
-                    first_name=google_data.get('given_name', ''),
-                    last_name=google_data.get('family_name', ''),
-                    password=make_password(random_password)
-                )
-                # UserProfile is created by signal
+@api_view(['GET'])
+@permission_classes([IsAdmin])
+def profiles(request):
+    """
+    Request profiles saved by the sampling profiler (PROFILING=True, see
+    api/profiling.py), for admins.
+    GET /api/profiles/ - Newest first: method, path, duration_ms, reason
+        (sampled or slow), created, worker pid, size and download url
+    GET /api/profiles/<name>/ - One profile as collapsed stacks, for
+        flamegraph.pl or https://www.speedscope.app
+    """
+    data = list_profiles()
+    for profile in data:
+        profile['url'] = request.build_absolute_uri(reverse('profile-download', args=[profile['name']]))
+    return Response({'enabled': settings.PROFILING, 'profiles': data})
 
-            # Generate tokens
-            refresh = RefreshToken.for_user(user)
-            
-            return Response({
-                'refresh': str(refresh),
-                'access': str(refresh.access_token),
-                'user': UserSerializer(user).data
-            })
 
-        except Exception as e:
-            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+@api_view(['GET'])
+@permission_classes([IsAdmin])
+def profile_download(request, name):
+    path = profile_path(name)
+    try:
+        content = path.read_bytes() if path else None
+    except FileNotFoundError:
+        content = None  # rotated away since the check
+    if content is None:
+        return Response({'error': 'Profile not found'}, status=status.HTTP_404_NOT_FOUND)
+    # Profiles are a few KB; a FileResponse would need a thread to stream under ASGI
+    response = HttpResponse(content, content_type='text/plain; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{name}"'
+    return response
 
 
 # ===========================
@@ -745,7 +947,7 @@ class AdminCreateView(APIView):
 
     def post(self, request):
         # Only the main admin can create other admins
-        if request.user.username != settings.MAIN_ADMIN_USERNAME:
+        if not request.principal.is_main_admin:
             return Response(
                 {'error': 'Only the main administrator can create new admins.'},
                 status=status.HTTP_403_FORBIDDEN
@@ -844,7 +1046,7 @@ class AdminRemoveView(APIView):
     permission_classes = [IsAdminUser]
 
     def post(self, request, pk):
-        if request.user.username != settings.MAIN_ADMIN_USERNAME:
+        if not request.principal.is_main_admin:
             return Response(
                 {'error': 'Only the main administrator can delete admin accounts.'},
                 status=status.HTTP_403_FORBIDDEN
@@ -875,7 +1077,7 @@ class AdminUpdatePermissionsView(APIView):
     permission_classes = [IsAdminUser]
 
     def post(self, request, pk):
-        if request.user.username != settings.MAIN_ADMIN_USERNAME:
+        if not request.principal.is_main_admin:
             return Response(
                 {'error': 'Only the main administrator can update admin permissions.'},
                 status=status.HTTP_403_FORBIDDEN
@@ -910,7 +1112,7 @@ class AdminUpdatePermissionsView(APIView):
 # Department Blog Views
 # ===========================
 
-class DepartmentBlogViewSet(viewsets.ModelViewSet):
+class DepartmentBlogViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
     """
     CRUD operations for department blogs.
     GET /api/department-blogs/ - List all blogs (public)
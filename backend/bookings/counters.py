@@ -0,0 +1,145 @@
+"""
+Dashboard counter maintenance.
+
+Every booking contributes to five DashboardCounter rows: the all-time and
+per-booking-date rows of the global and doctor scopes, and its patient's
+all-time row. Patients have no per-date rows; there would be about as many
+of those as bookings, and the patient dashboard counts its upcoming
+bookings with an indexed query instead. A change of doctor, patient, date
+or status moves one count from the old rows to the new ones with F()
+updates, inside the caller's transaction; a batch of changes is summed per
+row first.
+"""
+from collections import Counter, defaultdict
+
+from django.db.models import Count, F, Q
+
+from .models import Booking, DashboardCounter
+
+
+STATUS_FIELDS = [key for key, _ in Booking.STATUS_CHOICES]
+# scope -> the Booking field holding its scope_id (None: global, scope_id 0)
+SCOPE_FIELDS = {'global': None, 'doctor': 'doc_name_id', 'user': 'user_id'}
+# The kinds of counter rows: (scope, per-date rows or the all-time row)
+COUNTER_ROWS = [
+    ('global', False), ('global', True),
+    ('doctor', False), ('doctor', True),
+    ('user', False),
+]
+
+
+def counter_keys(doctor_id, user_id, booking_date):
+    """The (scope, scope_id, date) rows one booking is counted in."""
+    keys = [
+        ('global', 0, None), ('global', 0, booking_date),
+        ('doctor', doctor_id, None), ('doctor', doctor_id, booking_date),
+    ]
+    if user_id:
+        keys.append(('user', user_id, None))
+    return keys
+
+
+def record_booking_changes(changes):
+    """
+    Move each booking's count from its `old` snapshot to its `new` one.
+    `changes` holds (old, new) BookingSnapshot pairs (None for a created or
+    deleted booking); deltas to the same row are merged into one UPDATE.
+    """
+    deltas = defaultdict(Counter)
+    for old, new in changes:
+        if old is not None:
+            for key in counter_keys(old.doctor_id, old.user_id, old.booking_date):
+                deltas[key][old.status] -= 1
+        if new is not None:
+            for key in counter_keys(new.doctor_id, new.user_id, new.booking_date):
+                deltas[key][new.status] += 1
+    apply_deltas(deltas)
+
+
+def _matching(keys):
+    """A filter for the counter rows with the given (scope, scope_id, date) keys."""
+    scope_ids = defaultdict(list)
+    for scope, scope_id, day in keys:
+        scope_ids[(scope, day)].append(scope_id)
+    query = Q()
+    for (scope, day), ids in scope_ids.items():
+        query |= Q(scope=scope, date=day, scope_id__in=ids)
+    return query
+
+
+def apply_deltas(deltas):
+    """
+    Apply {(scope, scope_id, date): {status: delta}}. Rows that move by the
+    same amounts share one UPDATE (all the patients of a bulk change, say),
+    so a batch costs a handful of queries however many bookings it touches.
+    """
+    groups = defaultdict(list)
+    for key, fields in deltas.items():
+        fields = tuple(sorted((field, delta) for field, delta in fields.items() if delta))
+        if fields:
+            groups[fields].append(key)
+    if not groups:
+        return
+
+    keys = [key for group in groups.values() for key in group]
+    existing = set(
+        DashboardCounter.objects.filter(_matching(keys)).values_list('scope', 'scope_id', 'date')
+    )
+    patients = 0
+    for scope, scope_id, day in keys:
+        if (scope, scope_id, day) not in existing:
+            _, created = DashboardCounter.objects.get_or_create(scope=scope, scope_id=scope_id, date=day)
+            if created and scope == 'user' and day is None:
+                # First booking of this patient
+                patients += 1
+
+    for fields, group in groups.items():
+        DashboardCounter.objects.filter(_matching(group)).update(
+            **{field: F(field) + delta for field, delta in fields}
+        )
+
+    # Drop the totals rows of patients left without bookings
+    emptied = [
+        scope_id for fields, group in groups.items() if min(delta for _, delta in fields) < 0
+        for scope, scope_id, day in group if scope == 'user' and day is None
+    ]
+    if emptied:
+        deleted, _ = DashboardCounter.objects.filter(
+            scope='user', date=None, scope_id__in=emptied, **{field: 0 for field in STATUS_FIELDS}
+        ).delete()
+        patients -= deleted
+
+    if patients:
+        lookup = {'scope': 'global', 'scope_id': 0, 'date': None}
+        DashboardCounter.objects.get_or_create(**lookup)
+        DashboardCounter.objects.filter(**lookup).update(patients=F('patients') + patients)
+
+
+def compute_counters(scope, per_date):
+    """
+    Recompute one kind of counter row from the Booking table: the per-date
+    rows of `scope`, or its all-time rows. Yields ((scope_id, date), {field:
+    value}) in (scope_id, date) order with zero rows left out; the grouped
+    counts are read with .iterator(), so only one row is held at a time.
+    """
+    id_field = SCOPE_FIELDS[scope]
+    group_by = [field for field in (id_field, 'booking_date' if per_date else None) if field]
+    groups = Booking.objects.values(*group_by, 'status').annotate(n=Count('id')).order_by(*group_by)
+    if id_field == 'user_id':
+        groups = groups.filter(user_id__isnull=False)
+
+    key, values = None, {}
+    for group in groups.iterator(chunk_size=5000):
+        group_key = (group[id_field] if id_field else 0, group['booking_date'] if per_date else None)
+        if group_key != key:
+            if values:
+                yield key, values
+            key, values = group_key, {}
+        values[group['status']] = group['n']
+    if values:
+        if scope == 'global' and not per_date:
+            # The one global totals row also counts the patients
+            values['patients'] = (
+                Booking.objects.filter(user__isnull=False).values('user_id').distinct().count()
+            )
+        yield key, values
@@ -0,0 +1,241 @@
+"""
+Live booking events for the server-sent event streams in api.streams.
+
+Booking changes are published after their transaction commits (see
+bookings.models.sync_derived_data) to two kinds of channel:
+
+    slots:<doctor_id>:<YYYY-MM-DD>  slot_taken / slot_freed, for patients
+                                    picking a time
+    doctor:<doctor_id>              booking_status, for the doctor dashboard
+
+settings.LIVE_EVENTS_BROKER picks how events reach the listeners:
+
+    memory    InProcessBroker: listeners only hear events published by the
+              same server process. Enough for runserver, a single worker
+              and the test client.
+    postgres  PostgresBroker: events go through Postgres NOTIFY, and every
+              worker process LISTENs on one connection of its own, so a
+              booking saved on one worker reaches listeners on all of them.
+
+Publishing is thread-safe, so sync views running in worker threads can feed
+listeners waiting on the event loop.
+"""
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+
+from .models import ACTIVE_STATUSES
+
+
+logger = logging.getLogger('bookings.live')
+
+# The one Postgres channel every event goes through; the broker channel is
+# in the payload (Postgres channel names are identifiers of 63 bytes at most)
+PG_CHANNEL = 'live_booking_events'
+# Room for the messages of one NOTIFY payload, under the 8000-byte limit
+PG_PAYLOAD_LIMIT = 7500
+
+
+class InProcessBroker:
+    """Fan events out to asyncio queues, one per listener."""
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._listeners = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel):
+        """Register a listener on the running event loop; returns its queue."""
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._listeners[channel].add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, channel, queue):
+        with self._lock:
+            self._listeners[channel] = {
+                listener for listener in self._listeners[channel] if listener[1] is not queue
+            }
+            if not self._listeners[channel]:
+                del self._listeners[channel]
+
+    def publish(self, channel, event, data):
+        self.publish_many([(channel, event, data)])
+
+    def publish_many(self, messages):
+        """Publish (channel, event, data) triples."""
+        for channel, event, data in messages:
+            self._deliver(channel, event, json.dumps(data))
+
+    def _deliver(self, channel, event, payload):
+        """Hand an event to the listeners of this process."""
+        message = (event, payload)
+        with self._lock:
+            listeners = list(self._listeners.get(channel, ()))
+        for loop, queue in listeners:
+            try:
+                loop.call_soon_threadsafe(_offer, queue, message)
+            except RuntimeError:
+                # The listener's event loop has closed
+                self.unsubscribe(channel, queue)
+
+
+def _offer(queue, message):
+    # A listener that stopped reading loses events rather than growing forever
+    if not queue.full():
+        queue.put_nowait(message)
+
+
+class PostgresBroker(InProcessBroker):
+    """
+    Deliver events to listeners in every process through Postgres NOTIFY.
+
+    publish_many() packs its events into as few NOTIFYs as the payload limit
+    allows and sends them on the default database connection; a listener
+    thread per process (started with the first subscriber) holds its own
+    connection in LISTEN and hands what arrives to the local listeners, so
+    the publishing process hears its own events the same way as the others.
+    Events published while that connection is down are lost; streams carry
+    no history anyway, and clients reload the current state on reconnect.
+    """
+
+    reconnect_seconds = 5
+
+    def __init__(self, queue_size=100):
+        super().__init__(queue_size)
+        self._thread = None
+
+    def subscribe(self, channel):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._listen, name='live-events-listener', daemon=True)
+                self._thread.start()
+        return super().subscribe(channel)
+
+    def publish_many(self, messages):
+        try:
+            with connection.cursor() as cursor:
+                for payload in _payloads(messages):
+                    cursor.execute('SELECT pg_notify(%s, %s)', [PG_CHANNEL, payload])
+        except DatabaseError:
+            # Runs after the booking committed; a lost event must not fail the request
+            logger.exception('Could not publish %d live events', len(messages))
+
+    def _connect(self):
+        # A connection of our own: Django's are per thread and closed between requests
+        import psycopg2
+
+        db = settings.DATABASES['default']
+        conn = psycopg2.connect(
+            dbname=db['NAME'], user=db.get('USER') or None, password=db.get('PASSWORD') or None,
+            host=db.get('HOST') or None, port=db.get('PORT') or None, **db.get('OPTIONS', {}),
+        )
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute(f'LISTEN {PG_CHANNEL}')
+        return conn
+
+    def _listen(self):
+        import psycopg2
+
+        while True:
+            conn = None
+            try:
+                conn = self._connect()
+                while True:
+                    # Wake up now and then even when idle, so a dead connection is noticed
+                    if select.select([conn], [], [], 60) == ([], [], []):
+                        with conn.cursor() as cursor:
+                            cursor.execute('SELECT 1')
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        payload = json.loads(conn.notifies.pop(0).payload)
+                        for message in payload['messages']:
+                            self._deliver(message['channel'], message['event'], json.dumps(message['data']))
+            except (psycopg2.Error, OSError):
+                logger.exception('Live events listener lost its connection; reconnecting')
+            finally:
+                if conn is not None:
+                    conn.close()
+            time.sleep(self.reconnect_seconds)
+
+
+def _payloads(messages):
+    """NOTIFY payloads holding the messages, each under Postgres' 8000-byte limit."""
+    batch, size = [], 0
+    for channel, event, data in messages:
+        message = json.dumps({'channel': channel, 'event': event, 'data': data})
+        if batch and size + len(message) > PG_PAYLOAD_LIMIT:
+            yield '{"messages": [%s]}' % ', '.join(batch)
+            batch, size = [], 0
+        batch.append(message)
+        size += len(message) + 2
+    if batch:
+        yield '{"messages": [%s]}' % ', '.join(batch)
+
+
+BROKERS = {'memory': InProcessBroker, 'postgres': PostgresBroker}
+
+_broker = None
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        _broker = BROKERS[settings.LIVE_EVENTS_BROKER]()
+    return _broker
+
+
+def slot_channel(doctor_id, day):
+    return f'slots:{doctor_id}:{day.isoformat()}'
+
+
+def doctor_channel(doctor_id):
+    return f'doctor:{doctor_id}'
+
+
+def _slot(state):
+    """(doctor_id, date, time) of the slot a booking snapshot occupies, or None."""
+    if state is None or state.status not in ACTIVE_STATUSES or not state.appointment_time:
+        return None
+    return state.doctor_id, state.booking_date, state.appointment_time
+
+
+def publish_booking_changes(changes):
+    """Publish the events for (old, new) BookingSnapshot pairs in one batch."""
+    messages = []
+    for old, new in changes:
+        old_slot, new_slot = _slot(old), _slot(new)
+        if old_slot != new_slot:
+            for event, slot in (('slot_freed', old_slot), ('slot_taken', new_slot)):
+                if slot is not None:
+                    doctor_id, day, time = slot
+                    messages.append((slot_channel(doctor_id, day), event, {
+                        'doctor_id': doctor_id,
+                        'date': day.isoformat(),
+                        'time': time.strftime('%H:%M'),
+                    }))
+
+        old_status = old.status if old else None
+        new_status = new.status if new else None
+        if old_status != new_status:
+            current = new or old
+            messages.append((doctor_channel(current.doctor_id), 'booking_status', {
+                'id': current.id,
+                'status': new_status,
+                'previous_status': old_status,
+                'booking_date': current.booking_date.isoformat() if current.booking_date else None,
+                'appointment_time': (
+                    current.appointment_time.strftime('%H:%M') if current.appointment_time else None
+                ),
+            }))
+    if messages:
+        get_broker().publish_many(messages)
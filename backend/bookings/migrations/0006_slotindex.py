@@ -0,0 +1,53 @@
+# Generated by Django 4.2.30 on 2026-10-17 19:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("doctors", "0006_departmentblog"),
+        ("bookings", "0005_add_unique_constraints_booking"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SlotIndex",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("on_leave", models.BooleanField(default=False)),
+                ("start_time", models.TimeField(blank=True, null=True)),
+                ("end_time", models.TimeField(blank=True, null=True)),
+                (
+                    "booked_mask",
+                    models.BinaryField(
+                        default=b"\x00\x00\x00\x00\x00\x00\x00\x00\x00", max_length=9
+                    ),
+                ),
+                (
+                    "doctor",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="slot_index",
+                        to="doctors.doctors",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="slotindex",
+            constraint=models.UniqueConstraint(
+                fields=("doctor", "date"), name="unique_slot_index_per_doctor_date"
+            ),
+        ),
+    ]
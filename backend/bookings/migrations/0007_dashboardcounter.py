@@ -0,0 +1,101 @@
+# Generated by Django 4.2.30 on 2026-10-17 19:10
+
+from collections import Counter, defaultdict
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_counters(apps, schema_editor):
+    """Count the existing bookings into the new counter table."""
+    Booking = apps.get_model("bookings", "Booking")
+    DashboardCounter = apps.get_model("bookings", "DashboardCounter")
+
+    rows = defaultdict(Counter)
+    groupings = [
+        ("global", None, ["booking_date", "status"]),
+        ("doctor", "doc_name_id", ["doc_name_id", "booking_date", "status"]),
+        ("user", "user_id", ["user_id", "booking_date", "status"]),
+    ]
+    for scope, id_field, fields in groupings:
+        groups = Booking.objects.values(*fields).annotate(n=Count("id")).order_by()
+        for group in groups.iterator():
+            if id_field == "user_id" and group["user_id"] is None:
+                continue
+            scope_id = group[id_field] if id_field else 0
+            for day in (None, group["booking_date"]):
+                rows[(scope, scope_id, day)][group["status"]] += group["n"]
+
+    patients = (
+        Booking.objects.filter(user__isnull=False).values("user_id").distinct().count()
+    )
+    if patients:
+        rows[("global", 0, None)]["patients"] = patients
+
+    DashboardCounter.objects.bulk_create(
+        [
+            DashboardCounter(scope=scope, scope_id=scope_id, date=day, **values)
+            for (scope, scope_id, day), values in rows.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bookings", "0006_slotindex"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DashboardCounter",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "scope",
+                    models.CharField(
+                        choices=[
+                            ("global", "Global"),
+                            ("doctor", "Doctor"),
+                            ("user", "User"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("scope_id", models.BigIntegerField(default=0)),
+                ("date", models.DateField(blank=True, null=True)),
+                ("pending", models.IntegerField(default=0)),
+                ("accepted", models.IntegerField(default=0)),
+                ("rejected", models.IntegerField(default=0)),
+                ("completed", models.IntegerField(default=0)),
+                ("cancelled", models.IntegerField(default=0)),
+                ("patients", models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="dashboardcounter",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("date__isnull", True)),
+                fields=("scope", "scope_id"),
+                name="unique_dashboard_counter_totals",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="dashboardcounter",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("date__isnull", False)),
+                fields=("scope", "scope_id", "date"),
+                name="unique_dashboard_counter_per_date",
+            ),
+        ),
+        migrations.RunPython(backfill_counters, reverse_code=migrations.RunPython.noop),
+    ]
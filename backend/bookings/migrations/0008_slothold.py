@@ -0,0 +1,58 @@
+# Generated by Django 4.2.30 on 2026-10-17 19:14
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("doctors", "0008_catalog_updated_at"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("bookings", "0007_dashboardcounter"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SlotHold",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("appointment_time", models.TimeField()),
+                ("token", models.CharField(max_length=64, unique=True)),
+                ("expires_at", models.DateTimeField()),
+                (
+                    "doctor",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="slot_holds",
+                        to="doctors.doctors",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="slot_holds",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="slothold",
+            constraint=models.UniqueConstraint(
+                fields=("doctor", "date", "appointment_time"),
+                name="unique_slot_hold_per_doctor_date_time",
+            ),
+        ),
+    ]
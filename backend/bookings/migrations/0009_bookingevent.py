@@ -0,0 +1,98 @@
+# Generated by Django 4.2.30 on 2026-10-17 19:17
+
+from datetime import datetime, time, timezone
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def backfill_created_at(apps, schema_editor):
+    """
+    Existing bookings have no creation time; booked_on (the day of their last
+    save) is the closest thing we have.
+    """
+    Booking = apps.get_model("bookings", "Booking")
+    batch = []
+    for booking in Booking.objects.only("id", "booked_on").iterator(chunk_size=1000):
+        booking.created_at = datetime.combine(
+            booking.booked_on, time.min, tzinfo=timezone.utc
+        )
+        batch.append(booking)
+        if len(batch) == 1000:
+            Booking.objects.bulk_update(batch, ["created_at"])
+            batch = []
+    if batch:
+        Booking.objects.bulk_update(batch, ["created_at"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("bookings", "0008_slothold"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="booking",
+            name="created_at",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now, editable=False
+            ),
+        ),
+        migrations.RunPython(backfill_created_at, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="booking",
+            name="booked_on",
+            field=models.DateField(auto_now_add=True),
+        ),
+        migrations.CreateModel(
+            name="BookingEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("from_status", models.CharField(blank=True, max_length=20)),
+                ("to_status", models.CharField(max_length=20)),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "actor",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "booking",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="events",
+                        to="bookings.booking",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["created_at", "id"], name="bookingevent_created_idx"
+                    ),
+                    models.Index(
+                        fields=["booking", "created_at"],
+                        name="bookingevent_booking_idx",
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.30 on 2026-10-17 19:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bookings", "0009_bookingevent"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="dashboardcounter",
+            name="expired",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name="booking",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Pending"),
+                    ("accepted", "Accepted"),
+                    ("rejected", "Rejected"),
+                    ("completed", "Completed"),
+                    ("cancelled", "Cancelled"),
+                    ("expired", "Expired"),
+                ],
+                default="pending",
+                max_length=20,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="booking",
+            index=models.Index(
+                condition=models.Q(("status__in", ["pending", "accepted"])),
+                fields=["booking_date"],
+                name="booking_active_date_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-17 19:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bookings", "0010_expired_status"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="booking",
+            index=models.Index(fields=["created_at", "id"], name="booking_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="booking",
+            index=models.Index(
+                fields=["doc_name", "created_at"], name="booking_doctor_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="booking",
+            index=models.Index(
+                fields=["user", "created_at"], name="booking_user_created_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-17 19:22
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bookings", "0011_booking_list_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SyncChange",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "model",
+                    models.CharField(
+                        choices=[
+                            ("booking", "Booking"),
+                            ("doctor", "Doctor"),
+                            ("leave", "Doctor leave"),
+                            ("availability", "Doctor availability"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("object_id", models.BigIntegerField()),
+                ("deleted", models.BooleanField(default=False)),
+                ("doctor_id", models.BigIntegerField(blank=True, null=True)),
+                ("user_id", models.BigIntegerField(blank=True, null=True)),
+                ("changed_at", models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-17 20:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bookings", "0012_syncchange"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="syncchange",
+            name="txid",
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="syncchange",
+            index=models.Index(fields=["txid", "id"], name="syncchange_txid_id_idx"),
+        ),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations
+from django.db.models import Count
+
+
+def drop_patient_daily_counters(apps, schema_editor):
+    """Patients keep only their all-time counter row."""
+    DashboardCounter = apps.get_model("bookings", "DashboardCounter")
+    DashboardCounter.objects.filter(scope="user", date__isnull=False).delete()
+
+
+def rebuild_patient_daily_counters(apps, schema_editor):
+    Booking = apps.get_model("bookings", "Booking")
+    DashboardCounter = apps.get_model("bookings", "DashboardCounter")
+
+    rows = {}
+    groups = (
+        Booking.objects.filter(user__isnull=False)
+        .values("user_id", "booking_date", "status")
+        .annotate(n=Count("id"))
+        .order_by()
+    )
+    for group in groups.iterator():
+        key = (group["user_id"], group["booking_date"])
+        row = rows.setdefault(key, DashboardCounter(scope="user", scope_id=key[0], date=key[1]))
+        setattr(row, group["status"], group["n"])
+    DashboardCounter.objects.bulk_create(rows.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bookings", "0013_syncchange_txid"),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_patient_daily_counters, rebuild_patient_daily_counters),
+    ]
@@ -0,0 +1,34 @@
+from django.db import migrations
+
+
+def backfill_txid(apps, schema_editor):
+    """
+    Give the changes written before 0013 a transaction id; the txid cursor
+    skips rows without one. They are all committed, so they go below the
+    oldest transaction still running, in id order: txid = id where the ids
+    fit below it (a cursor handed out before 0013 keeps working), shifted
+    down as a block otherwise.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != "postgresql":
+        return  # SQLite pages by id and never reads txid
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT txid_snapshot_xmin(txid_current_snapshot())")
+        (finished_below,) = cursor.fetchone()
+        cursor.execute(
+            "UPDATE bookings_syncchange SET txid = id - GREATEST(0, ("
+            "  SELECT MAX(id) FROM bookings_syncchange WHERE txid IS NULL"
+            ") - %s) WHERE txid IS NULL",
+            [finished_below - 1],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bookings", "0014_drop_patient_daily_counters"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_txid, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,28 @@
-from django.db import models
+from collections import namedtuple
+from datetime import date
+
+from django.db import models, transaction
 from django.db.models import Q
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from django.utils import timezone
 from django.contrib.auth.models import User
-from doctors.models import Doctors
+from doctors.models import Doctors, DoctorAvailability, DoctorLeave
+
+
+# Appointments are handed out in fixed 20-minute slots, at most 60 days ahead
+SLOT_MINUTES = 20
+BOOKING_WINDOW_DAYS = 60
+# Bookings in these states occupy their slot (same rule as the partial unique indexes)
+ACTIVE_STATUSES = ['pending', 'accepted']
+# One bit per slot; a full 24h schedule needs 72 bits
+MASK_BYTES = (24 * 60 // SLOT_MINUTES + 7) // 8
+# How long a slot hold keeps a slot for one patient
+HOLD_MINUTES = 5
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute
 
 
 class Booking(models.Model):
@@ -11,6 +32,8 @@ class Booking(models.Model):
         ('rejected', 'Rejected'),
         ('completed', 'Completed'),
         ('cancelled', 'Cancelled'),
+        # Pending bookings whose date passed without a decision (expire_stale_bookings)
+        ('expired', 'Expired'),
     ]
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='bookings')
     p_name = models.CharField(max_length=255)
@@ -20,7 +43,8 @@ class Booking(models.Model):
     booking_date = models.DateField()
     appointment_time = models.TimeField(null=True, blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
-    booked_on = models.DateField(auto_now=True)
+    booked_on = models.DateField(auto_now_add=True)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         constraints = [
@@ -41,6 +65,18 @@ class Booking(models.Model):
                 name='unique_active_slot_per_doctor_date_time',
             ),
         ]
+        indexes = [
+            # Partial index: expire_stale_bookings scans active bookings by date
+            models.Index(
+                fields=['booking_date'],
+                condition=Q(status__in=['pending', 'accepted']),
+                name='booking_active_date_idx',
+            ),
+            # Booking lists (all, per doctor, per patient) page on (-created_at, -id)
+            models.Index(fields=['created_at', 'id'], name='booking_created_idx'),
+            models.Index(fields=['doc_name', 'created_at'], name='booking_doctor_created_idx'),
+            models.Index(fields=['user', 'created_at'], name='booking_user_created_idx'),
+        ]
 
     @property
     def formatted_date(self):
@@ -58,3 +94,351 @@ class Booking(models.Model):
 
     def __str__(self):
         return f"{self.p_name} - {self.doc_name.doc_name} ({self.status})"
+
+    def save(self, *args, **kwargs):
+        # The post_save handlers below update DashboardCounter in the same transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+class BookingEvent(models.Model):
+    """
+    Append-only log of booking status changes, written in the same
+    transaction as the change (see the Booking signals below and
+    bookings.transitions). from_status is blank for a new booking.
+
+    Events outlive their booking (no FK constraint), and the created_at index
+    serves "changes since T" reads such as turnaround metrics and syncs.
+    """
+    booking = models.ForeignKey(
+        Booking, on_delete=models.DO_NOTHING, db_constraint=False, related_name='events'
+    )
+    from_status = models.CharField(max_length=20, blank=True)
+    to_status = models.CharField(max_length=20)
+    actor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='bookingevent_created_idx'),
+            models.Index(fields=['booking', 'created_at'], name='bookingevent_booking_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValueError('Booking events are append-only')
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.booking_id}: {self.from_status or 'new'} -> {self.to_status}"
+
+
+class SyncChange(models.Model):
+    """
+    Append-only change feed behind GET /api/sync/ (see bookings.sync).
+
+    One row per save or delete of a booking, doctor, leave or availability,
+    written by the signals below. The sync cursor is the auto-increment id,
+    or on Postgres the id of the writing transaction (txid).
+    doctor_id and user_id are copied from the object so feeds can be scoped
+    to a doctor or patient even after the object is deleted.
+    """
+    MODEL_CHOICES = [
+        ('booking', 'Booking'),
+        ('doctor', 'Doctor'),
+        ('leave', 'Doctor leave'),
+        ('availability', 'Doctor availability'),
+    ]
+    model = models.CharField(max_length=20, choices=MODEL_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+    doctor_id = models.BigIntegerField(null=True, blank=True)
+    user_id = models.BigIntegerField(null=True, blank=True)
+    changed_at = models.DateTimeField(default=timezone.now)
+    # txid_current() of the writing transaction on Postgres; NULL elsewhere
+    txid = models.BigIntegerField(null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['txid', 'id'], name='syncchange_txid_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.pk} {self.model}:{self.object_id}{' deleted' if self.deleted else ''}"
+
+
+class SlotIndex(models.Model):
+    """
+    Precomputed slot occupancy for one doctor on one date.
+
+    Holds the day's working hours (or the reason there are none) and a bitmap
+    of booked slots: bit n is set when the slot starting n * SLOT_MINUTES after
+    start_time is held by a pending/accepted booking. Rows are built lazily by
+    bookings.slots.load_slot_index and kept current by the signals below;
+    `manage.py rebuild_slot_index` recreates them from scratch.
+    """
+    doctor = models.ForeignKey(Doctors, on_delete=models.CASCADE, related_name='slot_index')
+    date = models.DateField()
+    on_leave = models.BooleanField(default=False)
+    # Both NULL when the doctor is not scheduled on this weekday
+    start_time = models.TimeField(null=True, blank=True)
+    end_time = models.TimeField(null=True, blank=True)
+    booked_mask = models.BinaryField(max_length=MASK_BYTES, default=bytes(MASK_BYTES))
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['doctor', 'date'], name='unique_slot_index_per_doctor_date'),
+        ]
+
+    @property
+    def is_working_day(self):
+        return not self.on_leave and self.start_time is not None
+
+    @property
+    def booked_bits(self):
+        return int.from_bytes(bytes(self.booked_mask), 'big')
+
+    def slot_number(self, value):
+        """Number of the slot a time falls in, or None outside working hours."""
+        if not self.is_working_day or not (self.start_time <= value < self.end_time):
+            return None
+        return (_minutes(value) - _minutes(self.start_time)) // SLOT_MINUTES
+
+    def is_booked(self, value):
+        number = self.slot_number(value)
+        return number is not None and bool(self.booked_bits >> number & 1)
+
+    def pack(self, booked_times):
+        """Build a booked_mask for this row's working hours from booking times."""
+        bits = 0
+        for value in booked_times:
+            number = self.slot_number(value) if value else None
+            if number is not None:
+                bits |= 1 << number
+        return bits.to_bytes(MASK_BYTES, 'big')
+
+    def __str__(self):
+        return f"{self.doctor_id} - {self.date}"
+
+
+class SlotHoldQuerySet(models.QuerySet):
+    def active(self):
+        return self.filter(expires_at__gt=timezone.now())
+
+
+class SlotHold(models.Model):
+    """
+    A short reservation of one slot while a patient fills in the booking form.
+
+    Placed by POST /api/doctors/{id}/hold/ (see bookings.slots.place_hold) and
+    released when the booking is created with its token. Until expires_at,
+    other patients see the slot as held and cannot book it; expired holds are
+    ignored and cleared the next time the doctor-day is held.
+    """
+    doctor = models.ForeignKey(Doctors, on_delete=models.CASCADE, related_name='slot_holds')
+    date = models.DateField()
+    appointment_time = models.TimeField()
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='slot_holds')
+    token = models.CharField(max_length=64, unique=True)
+    expires_at = models.DateTimeField()
+
+    objects = SlotHoldQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['doctor', 'date', 'appointment_time'],
+                name='unique_slot_hold_per_doctor_date_time',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.doctor_id} - {self.date} {self.appointment_time} (held by {self.user_id})"
+
+
+class DashboardCounter(models.Model):
+    """
+    Materialized booking counts by status, kept in step with Booking.
+
+    One row per scope and booking date: scope is global, a doctor or a
+    patient (scope_id is the doctor/user id, 0 for global) and date is the
+    booking date, or NULL for the all-time totals row. Patients only have
+    the totals row (see bookings.counters). Updated in the same
+    transaction as the booking by bookings.counters; `manage.py
+    reconcile_dashboard_counters` recomputes them and reports drift.
+    """
+    SCOPE_CHOICES = [
+        ('global', 'Global'),
+        ('doctor', 'Doctor'),
+        ('user', 'User'),
+    ]
+    scope = models.CharField(max_length=10, choices=SCOPE_CHOICES)
+    scope_id = models.BigIntegerField(default=0)
+    date = models.DateField(null=True, blank=True)
+    pending = models.IntegerField(default=0)
+    accepted = models.IntegerField(default=0)
+    rejected = models.IntegerField(default=0)
+    completed = models.IntegerField(default=0)
+    cancelled = models.IntegerField(default=0)
+    expired = models.IntegerField(default=0)
+    # Global all-time row only: users with at least one booking
+    patients = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # NULL dates are never equal to each other, so the totals row needs its own rule
+            models.UniqueConstraint(
+                fields=['scope', 'scope_id'],
+                condition=Q(date__isnull=True),
+                name='unique_dashboard_counter_totals',
+            ),
+            models.UniqueConstraint(
+                fields=['scope', 'scope_id', 'date'],
+                condition=Q(date__isnull=False),
+                name='unique_dashboard_counter_per_date',
+            ),
+        ]
+
+    @property
+    def total(self):
+        return self.pending + self.accepted + self.rejected + self.completed + self.cancelled + self.expired
+
+    @property
+    def active(self):
+        return self.pending + self.accepted
+
+    def __str__(self):
+        return f"{self.scope}:{self.scope_id} {self.date or 'all time'}"
+
+
+# ===========================
+# Derived data maintenance
+# ===========================
+
+# The fields of a booking that the slot index, the dashboard counters and
+# the live event streams depend on
+BookingSnapshot = namedtuple(
+    'BookingSnapshot', ['id', 'doctor_id', 'user_id', 'booking_date', 'appointment_time', 'status']
+)
+
+
+def _snapshot(booking):
+    # Read from __dict__ so deferred fields (.only()) don't trigger a query
+    values = booking.__dict__
+    return BookingSnapshot(
+        values.get('id'),
+        values.get('doc_name_id'),
+        values.get('user_id'),
+        values.get('booking_date'),
+        values.get('appointment_time'),
+        values.get('status'),
+    )
+
+
+def _slot_state(snapshot):
+    return (
+        snapshot.doctor_id,
+        snapshot.booking_date,
+        snapshot.appointment_time,
+        snapshot.status in ACTIVE_STATUSES,
+    )
+
+
+def _refresh_slot_index_on_commit(*snapshots):
+    from .slots import refresh_booked_slots
+
+    # Past days can't be booked any more, so nothing reads their index rows
+    today = date.today()
+    days = sorted({
+        (s.doctor_id, s.booking_date) for s in snapshots
+        if s.doctor_id and s.booking_date and s.booking_date >= today
+    })
+
+    def refresh():
+        # Once per doctor-day however many of its bookings changed, in a
+        # fixed order so concurrent batches lock the rows the same way
+        for doctor_id, booking_date in days:
+            refresh_booked_slots(doctor_id, booking_date)
+
+    if days:
+        transaction.on_commit(refresh)
+
+
+def sync_derived_data(changes, publish=True):
+    """
+    Bring the slot index, dashboard counters and live event streams in line
+    with a batch of booking changes: (old, new) BookingSnapshot pairs, old
+    None for a created booking and new None for a deleted one. The signals
+    below call it for single saves; bulk writes that bypass signals
+    (queryset.update()) must call it themselves. publish=False leaves the
+    live streams out, for housekeeping nobody is watching.
+    """
+    from .counters import record_booking_changes
+    from .live import publish_booking_changes
+
+    moved = []
+    for old, new in changes:
+        if old is None or new is None or _slot_state(old) != _slot_state(new):
+            moved.extend(state for state in (old, new) if state is not None)
+    _refresh_slot_index_on_commit(*moved)
+    record_booking_changes(changes)
+    if publish:
+        transaction.on_commit(lambda: publish_booking_changes(changes))
+
+
+@receiver(post_init, sender=Booking)
+def remember_booking_state(sender, instance, **kwargs):
+    instance._saved_state = _snapshot(instance)
+
+
+@receiver(post_save, sender=Booking)
+def update_derived_data_on_booking_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old_state, new_state = instance._saved_state, _snapshot(instance)
+    instance._saved_state = new_state
+    sync_derived_data([(None if created else old_state, new_state)])
+
+    # Audit trail; bookings.transitions sets _actor to the user making the change
+    actor = getattr(instance, '_actor', None)
+    if created:
+        BookingEvent.objects.create(
+            booking=instance, to_status=new_state.status, actor=actor or instance.user,
+        )
+    elif old_state.status != new_state.status:
+        BookingEvent.objects.create(
+            booking=instance, from_status=old_state.status or '', to_status=new_state.status, actor=actor,
+        )
+
+
+@receiver(post_delete, sender=Booking)
+def update_derived_data_on_booking_delete(sender, instance, **kwargs):
+    sync_derived_data([(instance._saved_state, None)])
+
+
+def record_sync_change_on_save(sender, instance, raw=False, **kwargs):
+    from .sync import sync_change
+
+    if not raw:
+        sync_change(instance).save()
+
+
+def record_sync_change_on_delete(sender, instance, **kwargs):
+    from .sync import sync_change
+
+    sync_change(instance, deleted=True).save()
+
+
+for model in [Booking, Doctors, DoctorLeave, DoctorAvailability]:
+    post_save.connect(record_sync_change_on_save, sender=model, dispatch_uid=f'sync_save_{model.__name__}')
+    post_delete.connect(record_sync_change_on_delete, sender=model, dispatch_uid=f'sync_delete_{model.__name__}')
+
+
+@receiver(post_save, sender=DoctorAvailability)
+@receiver(post_delete, sender=DoctorAvailability)
+@receiver(post_save, sender=DoctorLeave)
+@receiver(post_delete, sender=DoctorLeave)
+def drop_slot_index_on_schedule_change(sender, instance, raw=False, **kwargs):
+    # Working hours or leave changed: the doctor's rows are rebuilt on next read
+    if not raw:
+        SlotIndex.objects.filter(doctor_id=instance.doctor_id).delete()
@@ -0,0 +1,293 @@
+"""
+Appointment slot helpers.
+
+Appointments are handed out in fixed 20-minute slots inside a doctor's weekly
+working hours, at most BOOKING_WINDOW_DAYS ahead. Slot occupancy is read from
+the SlotIndex bitmap rows; missing rows are built in bulk from the leave,
+availability and booking tables, so slot lookups for many days (and many
+doctors) cost a fixed number of queries.
+"""
+import secrets
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from django.utils import timezone
+
+from doctors.models import DoctorLeave, Doctors
+from .models import (
+    ACTIVE_STATUSES, HOLD_MINUTES, SLOT_MINUTES, Booking, SlotHold, SlotIndex,
+)
+
+
+def slot_times(start_time, end_time):
+    """Return the start time of every slot between start_time and end_time."""
+    times = []
+    current = datetime.combine(datetime.min, start_time)
+    end = datetime.combine(datetime.min, end_time)
+    while current < end:
+        times.append(current.time())
+        current += timedelta(minutes=SLOT_MINUTES)
+    return times
+
+
+def date_range(start, end):
+    """Every date from start to end, both inclusive."""
+    return [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+
+
+def load_slot_index(doctors, start, end):
+    """
+    Return {(doctor_id, date): SlotIndex} for every doctor and day in the range.
+
+    Existing rows are read with one query. Missing rows are built from the
+    source tables (leaves, availabilities, active bookings: one query each)
+    and saved with a single bulk insert.
+    """
+    doctors = list(doctors)
+    days = date_range(start, end)
+    rows = {
+        (row.doctor_id, row.date): row
+        for row in SlotIndex.objects.filter(doctor__in=doctors, date__range=(start, end))
+    }
+    missing = [doctor for doctor in doctors if any((doctor.id, day) not in rows for day in days)]
+    if missing:
+        rows.update(_build_rows(missing, days, rows))
+    return rows
+
+
+def _build_rows(doctors, days, existing):
+    start, end = days[0], days[-1]
+    doctor_ids = [doctor.id for doctor in doctors]
+    # No query when the caller already prefetched availabilities
+    prefetch_related_objects(doctors, 'availabilities')
+
+    leave_dates = set(
+        DoctorLeave.objects.filter(
+            doctor_id__in=doctor_ids, date__range=(start, end)
+        ).values_list('doctor_id', 'date')
+    )
+
+    booked = defaultdict(list)
+    for doctor_id, booking_date, appointment_time in Booking.objects.filter(
+        doc_name_id__in=doctor_ids,
+        booking_date__range=(start, end),
+        status__in=ACTIVE_STATUSES,
+    ).values_list('doc_name_id', 'booking_date', 'appointment_time'):
+        booked[(doctor_id, booking_date)].append(appointment_time)
+
+    new_rows = []
+    for doctor in doctors:
+        # First availability per weekday, like availabilities.filter(day=...).first()
+        availability_by_day = {}
+        for availability in doctor.availabilities.all():
+            availability_by_day.setdefault(availability.day, availability)
+
+        for day in days:
+            key = (doctor.id, day)
+            if key in existing:
+                continue
+            availability = availability_by_day.get(day.weekday())
+            row = SlotIndex(
+                doctor_id=doctor.id,
+                date=day,
+                on_leave=key in leave_dates,
+                start_time=availability.start_time if availability else None,
+                end_time=availability.end_time if availability else None,
+            )
+            row.booked_mask = row.pack(booked.get(key, []))
+            new_rows.append(row)
+
+    # A concurrent request may have built the same rows; theirs are equivalent
+    SlotIndex.objects.bulk_create(new_rows, batch_size=500, ignore_conflicts=True)
+    return {(row.doctor_id, row.date): row for row in new_rows}
+
+
+def _lock_row(doctor_id, day):
+    """
+    The index row of one doctor-day, locked until the surrounding transaction
+    ends, with its booked bitmap recomputed under the lock. A missing row
+    (never loaded, or dropped by a schedule change) is built first. Returns
+    None if the doctor is gone.
+
+    Rebuilding under the lock rather than skipping missing rows matters: a
+    lazy build in load_slot_index can read the bookings just before another
+    one commits and insert its row just after that booking's refresh ran,
+    leaving a bitmap without the booking. Whoever locks the row next fixes it.
+    """
+    row = SlotIndex.objects.select_for_update().filter(doctor_id=doctor_id, date=day).first()
+    if row is None:
+        doctor = Doctors.objects.filter(pk=doctor_id).first()
+        if doctor is None:
+            return None
+        _build_rows([doctor], [day], {})
+        row = SlotIndex.objects.select_for_update().get(doctor_id=doctor_id, date=day)
+    times = Booking.objects.filter(
+        doc_name_id=doctor_id,
+        booking_date=day,
+        status__in=ACTIVE_STATUSES,
+    ).values_list('appointment_time', flat=True)
+    row.booked_mask = row.pack(times)
+    SlotIndex.objects.filter(pk=row.pk).update(booked_mask=row.booked_mask)
+    return row
+
+
+def refresh_booked_slots(doctor_id, booking_date):
+    """Recompute the booked bitmap of one index row from the Booking table."""
+    with transaction.atomic():
+        # Locking the row makes concurrent refreshes see each other's bookings
+        _lock_row(doctor_id, booking_date)
+
+
+def _active_holds(row):
+    return SlotHold.objects.active().filter(
+        doctor_id=row.doctor_id, date=row.date
+    ).values_list('appointment_time', 'user_id')
+
+
+def _hold_numbers(row, holds):
+    numbers = {}
+    for appointment_time, user_id in holds:
+        number = row.slot_number(appointment_time)
+        if number is not None:
+            numbers[number] = user_id
+    return numbers
+
+
+def held_slots(row):
+    """{slot number: user_id} of the unexpired holds on one index row's day."""
+    return _hold_numbers(row, _active_holds(row))
+
+
+async def aheld_slots(row):
+    """held_slots() for async views."""
+    return _hold_numbers(row, [hold async for hold in _active_holds(row)])
+
+
+def place_hold(row, slot_time, user):
+    """
+    Hold the slot starting at slot_time on an index row's day for `user`.
+
+    Returns the SlotHold (a fresh token, or the user's existing hold on that
+    slot with its expiry pushed back), or None when the slot is booked, held
+    by someone else, or no longer in the doctor's working hours. A patient
+    keeps at most one hold per doctor per day.
+    """
+    with transaction.atomic():
+        # The index row doubles as the doctor-day lock, as in refresh_booked_slots.
+        # It is read again under the lock: the schedule may have changed since.
+        row = _lock_row(row.doctor_id, row.date)
+        if row is None or row.slot_number(slot_time) is None or row.is_booked(slot_time):
+            return None
+
+        now = timezone.now()
+        holds = SlotHold.objects.filter(doctor_id=row.doctor_id, date=row.date)
+        holds.filter(expires_at__lte=now).delete()
+        existing = holds.filter(appointment_time=slot_time).first()
+        if existing is not None and existing.user_id != user.id:
+            return None
+        holds.filter(user=user).exclude(appointment_time=slot_time).delete()
+
+        hold = existing or SlotHold(
+            doctor_id=row.doctor_id,
+            date=row.date,
+            appointment_time=slot_time,
+            user=user,
+            token=secrets.token_urlsafe(32),
+        )
+        hold.expires_at = now + timedelta(minutes=HOLD_MINUTES)
+        hold.save()
+        return hold
+
+
+def describe_day(row):
+    """
+    Compact description of one index row: unavailable days carry a 'reason',
+    working days carry the free and booked slot times.
+    """
+    day = row.date
+    entry = {'date': day.isoformat(), 'day': day.strftime('%A')}
+    if row.on_leave:
+        entry.update(available=False, reason='Doctor is on leave')
+    elif not row.is_working_day:
+        entry.update(available=False, reason=f'Doctor is not scheduled on {day.strftime("%A")}')
+    else:
+        bits = row.booked_bits
+        times = slot_times(row.start_time, row.end_time)
+        entry.update(
+            available=True,
+            working_hours={
+                'start': row.start_time.strftime('%H:%M'),
+                'end': row.end_time.strftime('%H:%M'),
+            },
+            total_slots=len(times),
+            free=[t.strftime('%H:%M') for n, t in enumerate(times) if not bits >> n & 1],
+            booked=[t.strftime('%H:%M') for n, t in enumerate(times) if bits >> n & 1],
+        )
+    return entry
+
+
+def build_slot_calendar(doctors, start, end):
+    """
+    Build the slot grid of every doctor for every day from start to end.
+
+    Returns {doctor_id: [day, ...]} with one describe_day() entry per day.
+    """
+    doctors = list(doctors)
+    rows = load_slot_index(doctors, start, end)
+    return {
+        doctor.id: [describe_day(rows[(doctor.id, day)]) for day in date_range(start, end)]
+        for doctor in doctors
+    }
+
+
+def _held_times(doctors, start, end):
+    """{(doctor_id, date): {appointment_time}} of the unexpired holds between start and end."""
+    held = defaultdict(set)
+    holds = SlotHold.objects.active().filter(
+        doctor_id__in=[doctor.id for doctor in doctors], date__range=(start, end)
+    ).values_list('doctor_id', 'date', 'appointment_time')
+    for doctor_id, day, appointment_time in holds:
+        held[(doctor_id, day)].add(appointment_time)
+    return held
+
+
+def next_available_slots(doctors, start, end, limit, not_before=None, chunk_days=7):
+    """
+    Return the `limit` earliest free slots across all doctors between start
+    and end, as (date, time, doctor) tuples ordered by date, time and name.
+
+    Days are scanned a week at a time, so the usual case (an opening within
+    the first week) touches a single chunk of index rows, and the worst case
+    is still a bounded number of queries. Booked and held slots, and slots
+    before `not_before` (a datetime, usually now), are skipped.
+    """
+    doctors = sorted(doctors, key=lambda doctor: doctor.doc_name)
+    found = []
+    chunk_start = start
+    while doctors and chunk_start <= end and len(found) < limit:
+        chunk_end = min(chunk_start + timedelta(days=chunk_days - 1), end)
+        rows = load_slot_index(doctors, chunk_start, chunk_end)
+        held = _held_times(doctors, chunk_start, chunk_end)
+        for day in date_range(chunk_start, chunk_end):
+            day_slots = []
+            for doctor in doctors:
+                row = rows[(doctor.id, day)]
+                if not row.is_working_day:
+                    continue
+                bits = row.booked_bits
+                held_times = held.get((doctor.id, day), ())
+                for number, slot_time in enumerate(slot_times(row.start_time, row.end_time)):
+                    if bits >> number & 1 or slot_time in held_times:
+                        continue
+                    if not_before and datetime.combine(day, slot_time) < not_before:
+                        continue
+                    day_slots.append((day, slot_time, doctor))
+            # Stable sort keeps doctors in name order within the same time
+            day_slots.sort(key=lambda slot: slot[1])
+            found.extend(day_slots[:limit - len(found)])
+            if len(found) >= limit:
+                break
+        chunk_start = chunk_end + timedelta(days=1)
+    return found
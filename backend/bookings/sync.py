@@ -0,0 +1,122 @@
+"""
+Delta sync feed for GET /api/sync/.
+
+Every save or delete of a booking, doctor, leave or availability appends a
+SyncChange row. A client asks once for the current cursor, then polls with
+?since=<cursor> and gets only the objects that changed since then (their
+current state, or a tombstone if they are gone) plus the next cursor.
+
+The cursor must never move past a change that is not committed yet, or the
+client skips it for good. Ids are handed out when a row is inserted, not
+when its transaction commits, so on Postgres a long transaction can commit
+an id below a cursor that was already given out. There every row records
+the id of the transaction that wrote it (txid_current()) and the cursor is
+a transaction id: a poll returns the rows of transactions older than the
+oldest one still running (the snapshot's xmin), which are all finished, in
+(txid, id) order. SQLite runs one write transaction at a time, so its ids
+commit in order and the row id is the cursor. Rows written before txid was
+recorded were given one by migration 0015.
+"""
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from doctors.models import DoctorAvailability, DoctorLeave, Doctors
+from .models import Booking, SyncChange
+
+
+MODEL_NAMES = {
+    Booking: 'booking',
+    Doctors: 'doctor',
+    DoctorLeave: 'leave',
+    DoctorAvailability: 'availability',
+}
+
+def sync_change(instance, deleted=False):
+    """Unsaved SyncChange recording a save (or delete) of `instance`."""
+    model = MODEL_NAMES[type(instance)]
+    if model == 'booking':
+        doctor_id, user_id = instance.doc_name_id, instance.user_id
+    elif model == 'doctor':
+        doctor_id, user_id = instance.pk, None
+    else:
+        doctor_id, user_id = instance.doctor_id, None
+    return SyncChange(
+        model=model, object_id=instance.pk, deleted=deleted, doctor_id=doctor_id, user_id=user_id,
+        txid=current_txid(),
+    )
+
+
+def _by_transaction():
+    return connection.vendor == 'postgresql'
+
+
+def current_txid():
+    """Value for SyncChange.txid: the writing transaction's id on Postgres."""
+    return RawSQL('txid_current()', []) if _by_transaction() else None
+
+
+def _finished_below():
+    """Every transaction with a lower id has committed or rolled back."""
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT txid_snapshot_xmin(txid_current_snapshot())')
+        return cursor.fetchone()[0]
+
+
+def latest_cursor():
+    if _by_transaction():
+        # Changes committed meanwhile by newer transactions are sent again; harmless
+        return _finished_below() - 1
+    return SyncChange.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def changes_since(since, limit, booking_scope=None):
+    """
+    The next `limit` changes after cursor `since`, reduced to the latest
+    state of each object. booking_scope is a Q on SyncChange limiting which
+    booking changes the caller may see (None: all of them).
+
+    Returns (changed, deleted, cursor, has_more) where changed and deleted map
+    each model name to a list of object ids.
+    """
+    if _by_transaction():
+        # Read before the rows, so everything below it is in their snapshot
+        finished_below = _finished_below()
+        changes = SyncChange.objects.filter(txid__gt=since, txid__lt=finished_below).order_by('txid', 'id')
+        position = 'txid'
+    else:
+        changes = SyncChange.objects.filter(id__gt=since).order_by('id')
+        position = 'id'
+    scoped = changes
+    if booking_scope is not None:
+        scoped = changes.filter(~Q(model='booking') | booking_scope)
+    rows = list(scoped.values_list(position, 'model', 'object_id', 'deleted')[:limit + 1])
+    has_more = len(rows) > limit
+
+    if not has_more:
+        cursor = rows[-1][0] if rows else since
+        if position == 'txid':
+            # Nothing else can show up below finished_below
+            cursor = max(since, finished_below - 1)
+    elif position == 'id':
+        rows = rows[:limit]
+        cursor = rows[-1][0]
+    else:
+        # A page ends between transactions, so the cursor never splits one
+        cut = rows[limit][0]
+        rows = [row for row in rows if row[0] < cut]
+        if not rows:
+            # One transaction wrote more than a page: send all of it
+            rows = list(
+                scoped.filter(txid=cut).values_list(position, 'model', 'object_id', 'deleted')
+            )
+        cursor = rows[-1][0]
+
+    latest = {}
+    for _, model, object_id, deleted in rows:
+        latest[(model, object_id)] = deleted
+    changed = {name: [] for name in MODEL_NAMES.values()}
+    removed = {name: [] for name in MODEL_NAMES.values()}
+    for (model, object_id), deleted in latest.items():
+        (removed if deleted else changed)[model].append(object_id)
+    return changed, removed, cursor, has_more
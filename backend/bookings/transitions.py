@@ -0,0 +1,94 @@
+"""
+Booking status transitions.
+
+ALLOWED_TRANSITIONS is the one place that decides which status changes are
+legal: pending and accepted bookings can move on; rejected ("Not Visited"),
+completed, cancelled and expired are final. Every status change made through the API
+goes through transition() or bulk_transition(), which also write the
+BookingEvent audit trail in the same transaction.
+"""
+from django.db import transaction
+
+from .models import Booking, BookingEvent, BookingSnapshot, SyncChange, sync_derived_data
+from .sync import current_txid
+
+
+ALLOWED_TRANSITIONS = {
+    'pending': {'accepted', 'rejected', 'completed', 'cancelled', 'expired'},
+    'accepted': {'completed', 'rejected', 'cancelled'},
+    'rejected': set(),
+    'completed': set(),
+    'cancelled': set(),
+    'expired': set(),
+}
+
+
+class InvalidTransition(Exception):
+    def __init__(self, old_status, new_status):
+        self.old_status = old_status
+        self.new_status = new_status
+        if old_status == new_status:
+            message = f'Booking is already {old_status}'
+        else:
+            message = f'Cannot change a {old_status} booking to {new_status}'
+        super().__init__(message)
+
+
+def can_transition(old_status, new_status):
+    return new_status in ALLOWED_TRANSITIONS.get(old_status, set())
+
+
+def transition(booking, new_status, actor=None):
+    """
+    Move one booking to new_status, or raise InvalidTransition.
+    Only the status column is written; the Booking signals log the event.
+    """
+    if not can_transition(booking.status, new_status):
+        raise InvalidTransition(booking.status, new_status)
+    booking.status = new_status
+    booking._actor = actor
+    booking.save(update_fields=['status'])
+
+
+def bulk_transition(queryset, ids, new_status, actor=None, publish=True):
+    """
+    Move the bookings of `queryset` with the given ids to new_status.
+
+    Returns {id: (result, old_status)} where result is 'updated', 'unchanged'
+    (already in new_status), 'invalid_transition' or 'not_found' (missing or
+    outside the queryset). Runs in one transaction: one locking SELECT, one
+    UPDATE, then the event log, sync feed, slot index and counter upkeep that
+    update() skips. publish=False skips the live events (see
+    sync_derived_data).
+    """
+    results = {pk: ('not_found', None) for pk in ids}
+    with transaction.atomic():
+        rows = queryset.filter(pk__in=ids).select_for_update().values_list(
+            'pk', 'doc_name_id', 'user_id', 'booking_date', 'appointment_time', 'status'
+        )
+        changes = []
+        for pk, *fields in rows:
+            old = BookingSnapshot(pk, *fields)
+            if old.status == new_status:
+                results[pk] = ('unchanged', old.status)
+            elif not can_transition(old.status, new_status):
+                results[pk] = ('invalid_transition', old.status)
+            else:
+                results[pk] = ('updated', old.status)
+                changes.append((pk, old))
+
+        if changes:
+            Booking.objects.filter(pk__in=[pk for pk, _ in changes]).update(status=new_status)
+            BookingEvent.objects.bulk_create([
+                BookingEvent(booking_id=pk, from_status=old.status, to_status=new_status, actor=actor)
+                for pk, old in changes
+            ])
+            SyncChange.objects.bulk_create([
+                SyncChange(
+                    model='booking', object_id=pk, doctor_id=old.doctor_id, user_id=old.user_id,
+                    txid=current_txid(),
+                )
+                for pk, old in changes
+            ])
+            sync_derived_data([(old, old._replace(status=new_status)) for _, old in changes], publish=publish)
+    return results
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-17 20:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0005_adminpermissions"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="contact",
+            index=models.Index(
+                fields=["submitted_at", "id"], name="contact_submitted_idx"
+            ),
+        ),
+    ]
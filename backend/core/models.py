@@ -26,6 +26,10 @@ class Contact(models.Model):
     
     class Meta:
         ordering = ['-submitted_at']
+        indexes = [
+            # /api/contacts/ pages on (-submitted_at, -id)
+            models.Index(fields=['submitted_at', 'id'], name='contact_submitted_idx'),
+        ]
         verbose_name = 'Contact Message'
         verbose_name_plural = 'Contact Messages'
     
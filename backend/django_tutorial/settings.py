@@ -71,12 +71,13 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # Serve static files on Render
+    'api.middleware.AsyncWhiteNoiseMiddleware',  # Serve static files on Render (async-capable WhiteNoise)
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # Add CORS middleware
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'api.middleware.PrincipalMiddleware',  # Lazy request.principal (role resolved once per request)
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -100,6 +101,8 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'django_tutorial.wsgi.application'
+# Production serves the ASGI app (gunicorn + uvicorn workers, see render.yaml)
+ASGI_APPLICATION = 'django_tutorial.asgi.application'
 
 
 # Database
@@ -110,11 +113,15 @@ db_url = os.environ.get('DATABASE_URL')
 
 # Only use dj_database_url if the URL looks like a database connection string (starts with postgres:// etc.)
 # We explicitly skip http/https to prevent crashes if the user accidentally pastes website URLs
+# Under ASGI every request runs its queries on a fresh thread, so persistent
+# connections are never reused and pile up; render.yaml sets CONN_MAX_AGE=0.
+CONN_MAX_AGE = int(os.environ.get('CONN_MAX_AGE', 600))
+
 if db_url and '://' in db_url and not db_url.startswith(('http://', 'https://')):
     DATABASES = {
         'default': dj_database_url.config(
             default=db_url,
-            conn_max_age=600,
+            conn_max_age=CONN_MAX_AGE,
             ssl_require=True if 'neon.tech' in db_url else False
         )
     }
@@ -126,6 +133,14 @@ else:
         }
     }
 
+# How live booking events reach the event streams of every worker (see
+# bookings/live.py): "postgres" (NOTIFY, across processes) or "memory"
+# (one process only; fine with SQLite, runserver and tests)
+LIVE_EVENTS_BROKER = os.environ.get(
+    'LIVE_EVENTS_BROKER',
+    'postgres' if 'postgresql' in DATABASES['default']['ENGINE'] else 'memory',
+)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
@@ -267,6 +282,16 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
 
+# Google sign-in: ID tokens are verified locally (api/google_auth.py). Their
+# audience must be one of these OAuth client IDs (comma-separated; the
+# frontend's VITE_GOOGLE_CLIENT_ID).
+GOOGLE_CLIENT_IDS = [
+    client_id.strip() for client_id in os.environ.get('GOOGLE_CLIENT_ID', '').split(',') if client_id.strip()
+]
+# Where Google's signing keys come from. api.google_auth.LocalKeyProvider
+# serves GOOGLE_JWKS instead, for tests and offline development.
+GOOGLE_KEY_PROVIDER = 'api.google_auth.GoogleKeyProvider'
+
 # CORS Settings (for React frontend)
 # Read from environment variable in production, use defaults for local development
 cors_origins = os.environ.get('CORS_ALLOWED_ORIGINS', '')
@@ -312,11 +337,16 @@ CORS_ALLOW_HEADERS = [
 # PERFORMANCE & CACHING
 # ===========================
 
-# In-memory cache (fast, no extra service needed)
+# File-based cache, shared by every gunicorn worker on the machine (a
+# LocMemCache lives inside one worker and serves stale data from the others).
+# Public catalog responses are cached here; see doctors/cache.py.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'hospital-cache',
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_LOCATION', '/tmp/hospital-cache'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 2000,
+        },
     }
 }
 
@@ -326,7 +356,52 @@ if not DEBUG:
     SECURE_CONTENT_TYPE_NOSNIFF = True
     X_FRAME_OPTIONS = 'DENY'
     # Persistent DB connections reduce connection overhead
-    # (already set via conn_max_age=600 in DATABASES)
+    # (set via CONN_MAX_AGE in DATABASES; off under ASGI)
+
+# GZip compression for API responses (not for the event streams)
+MIDDLEWARE.insert(1, 'api.middleware.GZipMiddleware')
 
-# GZip compression for API responses
-MIDDLEWARE.insert(1, 'django.middleware.gzip.GZipMiddleware')
+
+# ===========================
+# REQUEST INSTRUMENTATION
+# ===========================
+
+# Opt-in Server-Timing headers (db, serialize, view, total) on every response,
+# plus a JSON log line for N+1-looking and slow requests; see api/instrumentation.py.
+# Off by default: nothing is installed then.
+SERVER_TIMING = os.environ.get('SERVER_TIMING', 'False') == 'True'
+# Log a request when one SQL shape runs this many times...
+SERVER_TIMING_REPEAT_THRESHOLD = int(os.environ.get('SERVER_TIMING_REPEAT_THRESHOLD', 5))
+# ...or when it takes longer than this
+SERVER_TIMING_SLOW_MS = int(os.environ.get('SERVER_TIMING_SLOW_MS', 500))
+
+if SERVER_TIMING:
+    # Outermost, so the total covers every other middleware
+    MIDDLEWARE.insert(0, 'api.middleware.ServerTimingMiddleware')
+
+# Opt-in sampling profiler: stacks of 1 in PROFILING_SAMPLE_RATE requests and
+# of every request slower than PROFILING_SLOW_MS, saved as flame graph input
+# and listed for admins at /api/profiles/; see api/profiling.py.
+PROFILING = os.environ.get('PROFILING', 'False') == 'True'
+# 0 profiles only the slow requests
+PROFILING_SAMPLE_RATE = int(os.environ.get('PROFILING_SAMPLE_RATE', 1000))
+PROFILING_SLOW_MS = int(os.environ.get('PROFILING_SLOW_MS', 1000))
+PROFILING_INTERVAL_MS = int(os.environ.get('PROFILING_INTERVAL_MS', 5))
+# The newest PROFILING_KEEP profiles are kept
+PROFILING_DIR = os.environ.get('PROFILING_DIR', BASE_DIR / 'profiles')
+PROFILING_KEEP = int(os.environ.get('PROFILING_KEEP', 200))
+
+if PROFILING:
+    # Inside ServerTimingMiddleware, around everything else
+    MIDDLEWARE.insert(1 if SERVER_TIMING else 0, 'api.middleware.ProfilingMiddleware')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
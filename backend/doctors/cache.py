@@ -0,0 +1,92 @@
+"""
+Shared cache for the public catalog: departments, doctors, their weekly
+schedules and department blogs.
+
+Cached responses are keyed on a namespace version stored in the cache itself.
+Every catalog write bumps the version once its transaction commits, so all
+gunicorn workers stop reading the old entries at the same moment and those
+simply expire. This needs a cache every worker shares (the file-based cache
+in settings.CACHES), not the per-process LocMemCache.
+
+The same version doubles as the HTTP validator: catalog_fingerprint() is the
+ETag and the time of the last bump is the Last-Modified date. If the cache
+loses that time (a flush, or eviction), it is read back from the newest
+updated_at of the catalog tables.
+
+The ETag is the authority. Last-Modified is an HTTP date with one-second
+resolution, so two writes in the same second share it, and a deleted row
+leaves no updated_at behind; Django checks If-None-Match before
+If-Modified-Since, so clients that send both are always told correctly.
+"""
+import hashlib
+import time
+from datetime import date, datetime, time as dt_time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max
+
+
+VERSION_KEY = 'catalog:version'
+MODIFIED_KEY = 'catalog:modified'
+CATALOG_CACHE_TIMEOUT = 300
+
+
+def catalog_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Start from the clock, so a version evicted from the cache never
+        # comes back as a value that old entries were stored under.
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    # A fresh value rather than cache.incr: incr is a read and a write on the
+    # file-based cache, so two workers bumping at once could both write n+1
+    # and the second invalidation would be lost. Each bump here moves to a
+    # version no entry has been stored under.
+    cache.set(VERSION_KEY, time.time_ns(), timeout=None)
+    cache.set(MODIFIED_KEY, time.time(), timeout=None)
+
+
+def invalidate_catalog():
+    """Drop every cached catalog response once the current transaction commits."""
+    transaction.on_commit(bump_catalog_version)
+
+
+def catalog_fingerprint(url):
+    """
+    Identifies one catalog response. The full URL covers the host (image URLs
+    are absolute) and query string; the date covers doctors' current_status.
+    """
+    version = catalog_version()
+    return hashlib.md5(f'{version}:{date.today().isoformat()}:{url}'.encode()).hexdigest()
+
+
+def _newest_update():
+    """Unix time of the most recently saved catalog row (now if there are none)."""
+    from .models import DepartmentBlog, Departments, DoctorAvailability, Doctors
+
+    latest = [
+        model.objects.aggregate(latest=Max('updated_at'))['latest']
+        for model in (Departments, Doctors, DoctorAvailability, DepartmentBlog)
+    ]
+    latest = [value for value in latest if value is not None]
+    return max(latest).timestamp() if latest else time.time()
+
+
+def catalog_last_modified(from_database=True):
+    """
+    Unix time of the last catalog write, or midnight if that was earlier.
+    None if the cache lost it and from_database is False.
+    """
+    modified = cache.get(MODIFIED_KEY)
+    if modified is None:
+        if not from_database:
+            return None
+        modified = _newest_update()
+        cache.add(MODIFIED_KEY, modified, timeout=None)
+    midnight = datetime.combine(date.today(), dt_time.min).timestamp()
+    return max(modified, midnight)
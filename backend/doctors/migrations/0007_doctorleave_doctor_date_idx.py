@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-17 19:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("doctors", "0006_departmentblog"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="doctorleave",
+            index=models.Index(
+                fields=["doctor", "date"], name="doctorleave_doctor_date_idx"
+            ),
+        ),
+    ]
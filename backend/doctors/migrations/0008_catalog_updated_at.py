@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-17 19:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("doctors", "0007_doctorleave_doctor_date_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="departments",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name="doctoravailability",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name="doctors",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
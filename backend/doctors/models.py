@@ -1,35 +1,80 @@
+from datetime import date
+
 from django.db import models
+from django.db.models import Exists, OuterRef
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
 from django.contrib.auth.models import User
 
+from .cache import invalidate_catalog
+
 class Departments(models.Model):
     dep_name = models.CharField(max_length=100)
     dep_decription = models.TextField()
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.dep_name
 
+class DoctorsQuerySet(models.QuerySet):
+    def with_current_status(self):
+        """
+        Annotate today's leave/schedule flags so current_status needs no
+        per-doctor queries. Call it when the queryset is built, not at import
+        time, so "today" is the request's day.
+        """
+        today = date.today()
+        return self.annotate(
+            on_leave_today=Exists(DoctorLeave.objects.filter(doctor=OuterRef('pk'), date=today)),
+            scheduled_today=Exists(
+                DoctorAvailability.objects.filter(doctor=OuterRef('pk'), day=today.weekday())
+            ),
+        )
+
+
 class Doctors(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, null=True, blank=True)
     doc_name = models.CharField(max_length=255)
     doc_spec = models.CharField(max_length=255)
     dep_name = models.ForeignKey(Departments, on_delete=models.CASCADE)
     doc_image = models.ImageField(upload_to='doctors', blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = DoctorsQuerySet.as_manager()
 
     def __str__(self):
         return 'Dr ' +  self.doc_name + ' - (' + self.doc_spec + ')'
 
     @property
     def current_status(self):
-        from datetime import date
         today = date.today()
-        # Check if on leave today
-        if self.leaves.filter(date=today).exists():
+        on_leave, scheduled = self._today_flags(today)
+        if on_leave:
             return "Absent"
-        # Check if has availability today
-        if self.availabilities.filter(day=today.weekday()).exists():
+        if scheduled:
             return "Present"
         return "Not Scheduled"
 
+    def _today_flags(self, today):
+        """(on leave today, has availability today), without queries when possible."""
+        # 1. Annotations from Doctors.objects.with_current_status()
+        if hasattr(self, 'on_leave_today'):
+            return self.on_leave_today, self.scheduled_today
+
+        # 2. prefetch_related('leaves' / 'availabilities') caches
+        prefetched = getattr(self, '_prefetched_objects_cache', {})
+        if 'leaves' in prefetched:
+            on_leave = any(leave.date == today for leave in self.leaves.all())
+        else:
+            on_leave = self.leaves.filter(date=today).exists()
+        if on_leave:
+            return True, False
+        if 'availabilities' in prefetched:
+            scheduled = any(a.day == today.weekday() for a in self.availabilities.all())
+        else:
+            scheduled = self.availabilities.filter(day=today.weekday()).exists()
+        return False, scheduled
+
 class DoctorAvailability(models.Model):
     DAYS_OF_WEEK = [
         (0, 'Monday'), (1, 'Tuesday'), (2, 'Wednesday'),
@@ -39,6 +84,7 @@ class DoctorAvailability(models.Model):
     day = models.IntegerField(choices=DAYS_OF_WEEK)
     start_time = models.TimeField()
     end_time = models.TimeField()
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name_plural = "Doctor Availabilities"
@@ -52,6 +98,12 @@ class DoctorLeave(models.Model):
     date = models.DateField()
     reason = models.CharField(max_length=255, blank=True)
 
+    class Meta:
+        indexes = [
+            # Slot lookups, booking validation and leave listings filter on this pair
+            models.Index(fields=['doctor', 'date'], name='doctorleave_doctor_date_idx'),
+        ]
+
     def __str__(self):
         return f"{self.doctor.doc_name} - {self.date}"
 
@@ -71,3 +123,49 @@ class DepartmentBlog(models.Model):
 
     def __str__(self):
         return f"{self.department.dep_name} - {self.title}"
+
+
+# ===========================
+# Catalog cache invalidation
+# ===========================
+
+CATALOG_MODELS = [Departments, Doctors, DoctorAvailability, DoctorLeave, DepartmentBlog]
+
+
+def invalidate_catalog_on_change(sender, **kwargs):
+    invalidate_catalog()
+
+
+for model in CATALOG_MODELS:
+    post_save.connect(invalidate_catalog_on_change, sender=model, dispatch_uid=f'catalog_save_{model.__name__}')
+    post_delete.connect(invalidate_catalog_on_change, sender=model, dispatch_uid=f'catalog_delete_{model.__name__}')
+
+
+# The account fields doctor listings show (DoctorListSerializer)
+CATALOG_USER_FIELDS = ('username', 'email')
+
+
+def _catalog_user_state(user):
+    return tuple(getattr(user, field) for field in CATALOG_USER_FIELDS)
+
+
+@receiver(post_init, sender=User)
+def remember_catalog_user_state(sender, instance, **kwargs):
+    instance._catalog_state = _catalog_user_state(instance)
+
+
+@receiver(post_save, sender=User)
+def invalidate_catalog_on_user_change(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    """
+    Flush the catalog when a doctor's account changes a field it shows.
+    Patient signups, logins and profile edits leave it alone.
+    """
+    old_state, new_state = instance._catalog_state, _catalog_user_state(instance)
+    instance._catalog_state = new_state
+    # A new account isn't linked yet; linking it saves the Doctors row
+    if raw or created or old_state == new_state:
+        return
+    if update_fields and not set(update_fields) & set(CATALOG_USER_FIELDS):
+        return
+    if Doctors.objects.filter(user=instance).exists():
+        invalidate_catalog()
@@ -208,7 +208,8 @@ const AppointmentsList = () => {
             accepted: { bg: '#dcfce7', color: '#166534', label: 'Accepted' },
             rejected: { bg: '#fee2e2', color: '#991b1b', label: 'Not Visited' },
             completed: { bg: '#dbeafe', color: '#1e40af', label: 'Visited' },
-            cancelled: { bg: '#f1f5f9', color: '#475569', label: 'Not Visited' }
+            cancelled: { bg: '#f1f5f9', color: '#475569', label: 'Not Visited' },
+            expired: { bg: '#f1f5f9', color: '#475569', label: 'Expired' }
         };
         return styles[status] || { ...styles.pending, label: status.charAt(0).toUpperCase() + status.slice(1) };
     };
@@ -39,6 +39,7 @@ const AdminBookings = () => {
         rejected: { bg: '#fee2e2', text: '#991b1b', icon: 'times-circle' },
         completed: { bg: '#dbeafe', text: '#1e40af', icon: 'check-double' },
         cancelled: { bg: '#f1f5f9', text: '#475569', icon: 'ban' },
+        expired: { bg: '#f1f5f9', text: '#475569', icon: 'hourglass-end' },
     };
 
     const filterButtons = [
@@ -44,6 +44,7 @@ export const getStatusColor = (status) => {
         rejected: 'badge-danger',
         completed: 'badge-gray',
         cancelled: 'badge-gray',
+        expired: 'badge-gray',
     };
     return colors[status] || 'badge-gray';
 };
@@ -58,6 +59,7 @@ export const getStatusText = (status) => {
         rejected: 'Not Visited',
         completed: 'Visited',
         cancelled: 'Cancelled',
+        expired: 'Expired',
     };
     return texts[status] || status;
 };